@@ -0,0 +1,16 @@
+"""
+Обработчики сигналов blogapp: инвалидация кешей при изменении новостей.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from mysite.caching import bump_generation
+
+from .models import ArticleNews
+
+
+@receiver(post_save, sender=ArticleNews)
+@receiver(post_delete, sender=ArticleNews)
+def invalidate_articles_cache(sender, **kwargs):
+    bump_generation("articles")
@@ -5,6 +5,8 @@ from .models import ArticleNews
 class BlogSitemap(Sitemap):
     changefreq = "never"
     priority = 0.5
+    # поле для отпечатков секций в mysite.sitemaps
+    lastmod_field = "published_at"
 
     def items(self):
         return ArticleNews.objects.filter(published_at__isnull=False).order_by(
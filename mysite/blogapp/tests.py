@@ -1,3 +1,78 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone, translation
 
-# Create your tests here.
+from mysite.testing import LOCMEM_CACHES, QueryBudgetMixin, ViewBudget
+
+from .models import Article, ArticleNews, Author, Category, Tag
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LatestArticlesListFeedTestCase(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        ArticleNews.objects.create(
+            title="First news", body="Body", published_at=timezone.now()
+        )
+        with translation.override("en"):
+            self.url = reverse("blogapp:article-news-latest")
+
+    def test_feed_is_cached_until_news_change(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, "First news")
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(
+                self.url, headers={"if-none-match": response["ETag"]}
+            )
+        self.assertEqual(not_modified.status_code, 304)
+
+        ArticleNews.objects.create(
+            title="Second news", body="Body", published_at=timezone.now()
+        )
+        response = self.client.get(
+            self.url, headers={"if-none-match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Second news")
+
+
+class BlogQueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    query_budgets = [
+        ViewBudget("blogapp:article-list", 2),
+        ViewBudget("blogapp:article-detail", 2, lambda t: {"pk": t.article.pk}),
+        ViewBudget("blogapp:article-news", 1),
+        ViewBudget("blogapp:article-news-detail", 1, lambda t: {"pk": t.news.pk}),
+        ViewBudget("blogapp:article-news-latest", 1),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.article = cls.create_article(0)
+        cls.news = ArticleNews.objects.create(
+            title="Budget news", body="Body", published_at=timezone.now()
+        )
+
+    @staticmethod
+    def create_article(number):
+        # свои автор, категория и теги у каждой статьи: общие закешировались
+        # бы в одном запросе и спрятали N+1
+        article = Article.objects.create(
+            title=f"Article {number}",
+            content="Content",
+            author=Author.objects.create(name=f"Author {number}", bio="Bio"),
+            category=Category.objects.create(name=f"Category {number}"),
+        )
+        article.tags.set(
+            Tag.objects.bulk_create(Tag(name=f"tag {number}.{i}") for i in range(2))
+        )
+        return article
+
+    def add_rows(self, count):
+        start = Article.objects.count()
+        for number in range(start, start + count):
+            self.create_article(number)
+            self.article.tags.add(Tag.objects.create(name=f"extra {number}"))
+            ArticleNews.objects.create(
+                title=f"News {number}", body="Body", published_at=timezone.now()
+            )
@@ -1,6 +1,9 @@
 from django.contrib.gis.feeds import Feed
 from django.views.generic import ListView, DetailView
 from django.urls import reverse, reverse_lazy
+
+from mysite.feeds import CachedFeedMixin
+
 from .models import Article, ArticleNews
 
 
@@ -15,10 +18,11 @@ class ArticleNewsDetailView(DetailView):
     model = ArticleNews
 
 
-class LatestArticlesListFeed(Feed):
+class LatestArticlesListFeed(CachedFeedMixin, Feed):
     title = "Blog articles latest"
     description = "Updates on changes and additions blog articles"
     link = reverse_lazy("blogapp:article-news")
+    cache_groups = ("articles",)
 
     def items(self):
         return ArticleNews.objects.order_by("-published_at")[:5]
@@ -29,6 +33,9 @@ class LatestArticlesListFeed(Feed):
     def item_description(self, item: ArticleNews):
         return item.body[:200]
 
+    def item_pubdate(self, item: ArticleNews):
+        return item.published_at
+
 
 class ArticleListView(ListView):
     """
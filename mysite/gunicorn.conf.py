@@ -0,0 +1,38 @@
+"""
+Настройки Gunicorn. Файл читается автоматически из рабочего каталога.
+
+Режим задаёт переменная DJANGO_SERVER_MODE:
+
+* wsgi (по умолчанию) — синхронные воркеры и mysite.wsgi. Каждый воркер
+  обслуживает один запрос за раз, поэтому медленный клиент или ожидание
+  БД занимают весь воркер.
+* asgi — воркеры uvicorn (пакет uvicorn-worker) и mysite.asgi. Асинхронные
+  view (ProductsDataExportView, export_user_orders, /api/products/async/,
+  /api/orders/async/) ждут кеш, БД и клиента, не блокируя event loop, и
+  один воркер держит сотни соединений. Синхронные view в этом режиме
+  выполняются в пуле потоков asgiref, медленнее, чем под wsgi.
+
+Запросы асинхронного ORM к SQLite всё равно выполняются последовательно в
+одном потоке на процесс, так что число воркеров по-прежнему стоит держать
+около числа ядер. Сравнить режимы: python manage.py bench_concurrency.
+"""
+
+import multiprocessing
+from os import getenv
+
+mode = getenv("DJANGO_SERVER_MODE", "wsgi")
+
+bind = getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+timeout = int(getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = 30
+accesslog = "-"
+
+if mode == "asgi":
+    wsgi_app = "mysite.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+    # воркеров ASGI хватает по одному на ядро: конкурентность даёт event loop
+    workers = int(getenv("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+else:
+    wsgi_app = "mysite.wsgi:application"
+    worker_class = "sync"
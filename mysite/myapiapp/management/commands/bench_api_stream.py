@@ -0,0 +1,65 @@
+from time import perf_counter
+
+from django.core.management import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from myapiapp.serializers import ProductSerializer
+from myapiapp.views import ProductsListView
+from shopapp.benchmarks import PeakRSS, seed_products, temporary_database
+from shopapp.models import Product
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк потокового JSON-списка товаров (myapiapp ProductsListView).
+
+    Сравнивает потоковый ответ с прежним способом, когда весь список
+    сериализовался в память и рендерился одним куском.
+    """
+
+    help = "Benchmark streaming JSON list: time-to-first-byte and peak RSS"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            nargs="+",
+            default=[10_000, 100_000, 300_000],
+            help="Catalog sizes to benchmark",
+        )
+
+    def buffered(self):
+        data = {"products": ProductSerializer(Product.objects.all(), many=True).data}
+        return [JSONRenderer().render(data)]
+
+    def streaming(self):
+        request = APIRequestFactory().get("/api/products/")
+        return ProductsListView.as_view()(request).streaming_content
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            seeded = 0
+            for rows in sorted(options["rows"]):
+                self.stdout.write(f"Seeding {rows} products...")
+                seed_products(rows - seeded, start=seeded)
+                seeded = rows
+
+                for mode in ("streaming", "buffered"):
+                    with PeakRSS() as rss:
+                        started = perf_counter()
+                        chunks = iter(getattr(self, mode)())
+                        size = len(next(chunks))
+                        ttfb = perf_counter() - started
+                        for chunk in chunks:
+                            size += len(chunk)
+                        total = perf_counter() - started
+
+                    self.stdout.write(
+                        f"rows={rows:>9} mode={mode:<9} "
+                        f"ttfb={ttfb * 1000:9.2f} ms total={total:7.2f} s "
+                        f"size={size / 2 ** 20:8.1f} MiB "
+                        f"peak_rss_delta={rss.delta / 2 ** 20:7.1f} MiB"
+                    )
+
+        self.stdout.write(self.style.SUCCESS("Benchmark finished"))
@@ -0,0 +1,182 @@
+import asyncio
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+from importlib.util import find_spec
+from statistics import quantiles
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from shopapp.benchmarks import seed_products, temporary_database
+
+# режим -> путь, который нагружается по умолчанию
+DEFAULT_PATHS = {
+    "wsgi": "/api/products/?limit=100",
+    "asgi": "/api/products/async/?limit=100",
+}
+
+
+async def fetch(host, port, path, timeout) -> int:
+    """Один GET по новому соединению; возвращает HTTP-статус."""
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(host, port), timeout
+    )
+    try:
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+            "Connection: close\r\n\r\n".encode()
+        )
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        while await asyncio.wait_for(reader.read(2**16), timeout):
+            pass
+    finally:
+        writer.close()
+    return int(status_line.split()[1])
+
+
+async def run_load(host, port, path, concurrency, duration, timeout) -> dict:
+    """concurrency клиентов шлют запросы друг за другом в течение duration."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+    latencies = []
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        while loop.time() < deadline:
+            started = perf_counter()
+            try:
+                status = await fetch(host, port, path, timeout)
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+                status = None
+            if status == 200:
+                latencies.append(perf_counter() - started)
+            else:
+                errors += 1
+
+    started = perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = perf_counter() - started
+    percentiles = quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50": percentiles[49],
+        "p99": percentiles[98],
+    }
+
+
+def wait_for_port(host, port, process, timeout=30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f"Server exited with code {process.returncode}")
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"Server did not start on {host}:{port}")
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк конкурентности: gunicorn с sync-воркерами против ASGI-воркеров.
+
+    Для каждого режима поднимается gunicorn с gunicorn.conf.py на временной
+    БД, и асинхронный клиент держит 100-1000 одновременных соединений.
+    Печатаются RPS, медиана и p99 задержки и число ошибок (таймауты,
+    отказы в соединении, ответы не 200).
+    """
+
+    help = "Compare sync gunicorn and ASGI workers under concurrent connections"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--modes", nargs="+", choices=DEFAULT_PATHS, default=list(DEFAULT_PATHS)
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            nargs="+",
+            default=[100, 300, 1000],
+            help="Concurrent connections",
+        )
+        parser.add_argument(
+            "--duration", type=float, default=10.0, help="Seconds per level"
+        )
+        parser.add_argument("--rows", type=int, default=10_000, help="Products")
+        parser.add_argument("--workers", type=int, default=4, help="Server workers")
+        parser.add_argument(
+            "--path", help="Request path for every mode instead of the defaults"
+        )
+        parser.add_argument(
+            "--timeout", type=float, default=30.0, help="Per-request timeout"
+        )
+        parser.add_argument("--port", type=int, default=8765)
+
+    def handle(self, *args, **options):
+        if find_spec("gunicorn") is None:
+            raise CommandError("gunicorn is not installed")
+        if "asgi" in options["modes"] and find_spec("uvicorn_worker") is None:
+            raise CommandError("ASGI mode needs uvicorn-worker: run poetry install")
+        # 1000 соединений не помещаются в типичный лимит 1024 дескриптора
+        _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+        with temporary_database() as database:
+            self.stdout.write(f"Seeding {options['rows']} products...")
+            seed_products(options["rows"])
+            for mode in options["modes"]:
+                self.bench_mode(mode, database, options)
+
+        self.stdout.write(self.style.SUCCESS("Benchmark finished"))
+
+    def bench_mode(self, mode, database, options):
+        host, port = "127.0.0.1", options["port"]
+        path = options["path"] or DEFAULT_PATHS[mode]
+        env = {
+            **os.environ,
+            "DJANGO_SERVER_MODE": mode,
+            "DJANGO_DATABASE_NAME": database,
+            "GUNICORN_BIND": f"{host}:{port}",
+            "GUNICORN_WORKERS": str(options["workers"]),
+            "GUNICORN_TIMEOUT": str(int(options["timeout"]) + 5),
+        }
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn"],
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_port(host, port, server)
+            for concurrency in options["concurrency"]:
+                stats = asyncio.run(
+                    run_load(
+                        host,
+                        port,
+                        path,
+                        concurrency,
+                        options["duration"],
+                        options["timeout"],
+                    )
+                )
+                self.stdout.write(
+                    f"mode={mode} path={path} concurrency={concurrency:>5} "
+                    f"rps={stats['rps']:8.1f} "
+                    f"p50={stats['p50'] * 1000:8.1f} ms "
+                    f"p99={stats['p99'] * 1000:8.1f} ms "
+                    f"ok={stats['requests']} errors={stats['errors']}"
+                )
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
@@ -1,7 +1,9 @@
-from django.contrib.auth.models import Group
+from django.contrib.auth.models import Group, Permission
+from django.db.models import Prefetch
 from rest_framework import serializers
 
 from shopapp.models import *
+from shopapp.serializers import OrderSerializer, RenditionsField
 
 
 class GroupSerializer(serializers.ModelSerializer):
@@ -9,14 +11,20 @@ class GroupSerializer(serializers.ModelSerializer):
         model = Group
         fields = "__all__"
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """permissions отдаются списком id — загружаем их одним запросом."""
+        return queryset.prefetch_related(
+            Prefetch("permissions", queryset=Permission.objects.only("pk"))
+        )
 
-class ProductSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Product
-        fields = "__all__"
 
+class ProductSerializer(serializers.ModelSerializer):
+    discount_price = serializers.DecimalField(
+        max_digits=8, decimal_places=2, read_only=True
+    )
+    preview_renditions = RenditionsField("preview")
 
-class OrderSerializer(serializers.ModelSerializer):
     class Meta:
-        model = Order
+        model = Product
         fields = "__all__"
@@ -0,0 +1,93 @@
+"""
+Потоковая отдача больших списков в JSON.
+
+Тело ответа {"<key>":[...]} собирается по частям: строки читаются из БД
+через QuerySet.iterator() порциями, сериализуются и сразу отдаются клиенту,
+поэтому память процесса не зависит от размера таблицы. Каждый элемент
+рендерится тем же JSONRenderer, что и обычный Response, так что итоговые
+байты совпадают с прежним ответом.
+
+aserialize_chunks() и aiter_json_envelope() — то же самое на асинхронном
+ORM для async view под ASGI.
+"""
+
+from itertools import islice
+
+from rest_framework.renderers import JSONRenderer
+
+STREAM_CHUNK_SIZE = 2000
+# Сколько элементов рендерится за раз: один вызов json.dumps на порцию
+# заметно быстрее, чем на каждый элемент
+RENDER_BATCH_SIZE = 500
+
+
+def serialize_chunks(queryset, serializer_class, chunk_size=STREAM_CHUNK_SIZE):
+    """Отдаёт сериализованные объекты, обрабатывая queryset порциями."""
+    objects = queryset.iterator(chunk_size=chunk_size)
+    while chunk := list(islice(objects, chunk_size)):
+        yield from serializer_class(chunk, many=True).data
+
+
+async def aserialize_chunks(queryset, serializer_class, chunk_size=STREAM_CHUNK_SIZE):
+    """Асинхронный вариант serialize_chunks() на QuerySet.aiterator()."""
+    chunk = []
+    async for obj in queryset.aiterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) == chunk_size:
+            for item in serializer_class(chunk, many=True).data:
+                yield item
+            chunk = []
+    if chunk:
+        for item in serializer_class(chunk, many=True).data:
+            yield item
+
+
+def _envelope_head(key, renderer) -> bytes:
+    return b"{" + renderer.render(key) + b":["
+
+
+def _envelope_batch(batch, first: bool, renderer) -> bytes:
+    # [a,b] -> a,b
+    return (b"" if first else b",") + renderer.render(batch)[1:-1]
+
+
+def _envelope_tail(tail, renderer) -> bytes:
+    extra = tail() if tail else {}
+    if extra:
+        # {"next":null} -> ,"next":null}
+        return b"]," + renderer.render(extra)[1:]
+    return b"]}"
+
+
+def iter_json_envelope(key, items, tail=None, renderer=None):
+    """
+    Генерирует байты {"key":[item, ...], ...tail}.
+
+    tail — функция, возвращающая словарь дополнительных ключей; вызывается
+    после списка, когда все элементы уже отданы (например, ссылка next).
+    """
+    renderer = renderer or JSONRenderer()
+    yield _envelope_head(key, renderer)
+    items = iter(items)
+    first = True
+    while batch := list(islice(items, RENDER_BATCH_SIZE)):
+        yield _envelope_batch(batch, first, renderer)
+        first = False
+    yield _envelope_tail(tail, renderer)
+
+
+async def aiter_json_envelope(key, items, tail=None, renderer=None):
+    """Асинхронный вариант iter_json_envelope() для асинхронного items."""
+    renderer = renderer or JSONRenderer()
+    yield _envelope_head(key, renderer)
+    first = True
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) == RENDER_BATCH_SIZE:
+            yield _envelope_batch(batch, first, renderer)
+            first = False
+            batch = []
+    if batch:
+        yield _envelope_batch(batch, first, renderer)
+    yield _envelope_tail(tail, renderer)
@@ -1,3 +1,145 @@
+import json
+
+from django.contrib.auth.models import Group, Permission, User
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+
+from myapiapp.serializers import OrderSerializer, ProductSerializer
+from mysite.testing import QueryBudgetMixin, ViewBudget
+from shopapp.models import Order, Product
+
+
+class ListViewsQueryCountTestCase(QueryBudgetMixin, TestCase):
+    """Число запросов списков API не должно расти вместе с числом строк."""
+
+    small_rows = 1
+    large_rows = 11
+    query_budgets = [
+        ViewBudget("myapiapp:hello", 0),
+        ViewBudget("myapiapp:groups", 3),
+        ViewBudget("myapiapp:products", 1),
+        ViewBudget("myapiapp:products", 1, query="limit=5"),
+        ViewBudget("myapiapp:orders", 2),
+        ViewBudget("myapiapp:orders", 2, query="limit=5"),
+        ViewBudget("myapiapp:products-async", 1),
+        ViewBudget("myapiapp:orders-async", 2, query="limit=5"),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="api", password="qwerty")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", price=i) for i in range(3)
+        )
+        cls.permissions = list(Permission.objects.all()[:3])
+
+    def add_rows(self, count):
+        for i in range(count):
+            order = Order.objects.create(user=self.user, delivery_address=f"{i}")
+            order.products.set(self.products)
+            group = Group.objects.create(name=f"Group {Group.objects.count()}")
+            group.permissions.set(self.permissions)
+
+
+class StreamingListViewTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="stream", password="qwerty")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Товар {i} \u2028", description="a\r\nb", price=i)
+            for i in range(7)
+        )
+        for product in cls.products[:3]:
+            order = Order.objects.create(user=cls.user, delivery_address="Street")
+            order.products.set(cls.products[:2])
+
+    def test_stream_matches_buffered_response(self):
+        for name, key, queryset, serializer_class in (
+            ("myapiapp:products", "products", Product.objects.all(), ProductSerializer),
+            ("myapiapp:orders", "orders", Order.objects.all(), OrderSerializer),
+        ):
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name))
+                self.assertTrue(response.streaming)
+                self.assertEqual(response["Content-Type"], "application/json")
+                expected = JSONRenderer().render(
+                    {key: serializer_class(queryset, many=True).data}
+                )
+                self.assertEqual(b"".join(response.streaming_content), expected)
+
+    def get_json(self, *args, **kwargs):
+        response = self.client.get(*args, **kwargs)
+        return json.loads(b"".join(response.streaming_content))
+
+    def test_limit_and_cursor(self):
+        url = reverse("myapiapp:products")
+        pks = []
+        data = self.get_json(url, {"limit": 3})
+        while True:
+            self.assertLessEqual(len(data["products"]), 3)
+            pks.extend(product["id"] for product in data["products"])
+            if data["next"] is None:
+                break
+            data = self.get_json(data["next"])
+        self.assertEqual(pks, sorted(product.pk for product in self.products))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("myapiapp:orders"), {"cursor": "oops"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_browsable_api_is_not_streamed(self):
+        response = self.client.get(reverse("myapiapp:products"), {"format": "api"})
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.status_code, 200)
+
+
+class AsyncStreamingListViewTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="async", password="qwerty")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Товар {i}", price=i) for i in range(7)
+        )
+        for product in cls.products[:3]:
+            order = Order.objects.create(user=cls.user, delivery_address="Street")
+            order.products.set(cls.products[:2])
+        cls.expected = {
+            "products": JSONRenderer().render(
+                {"products": ProductSerializer(Product.objects.all(), many=True).data}
+            ),
+            "orders": JSONRenderer().render(
+                {"orders": OrderSerializer(Order.objects.all(), many=True).data}
+            ),
+        }
+
+    async def get_content(self, *args, **kwargs):
+        response = await self.async_client.get(*args, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        return b"".join([chunk async for chunk in response.streaming_content])
+
+    async def test_matches_sync_response(self):
+        for key in ("products", "orders"):
+            with self.subTest(key=key):
+                content = await self.get_content(reverse(f"myapiapp:{key}-async"))
+                self.assertEqual(content, self.expected[key])
+
+    async def test_cursor_pagination(self):
+        data = json.loads(
+            await self.get_content(reverse("myapiapp:products-async"), {"limit": 3})
+        )
+        pks = []
+        while True:
+            self.assertLessEqual(len(data["products"]), 3)
+            pks.extend(product["id"] for product in data["products"])
+            if data["next"] is None:
+                break
+            data = json.loads(await self.get_content(data["next"]))
+        self.assertEqual(pks, sorted(product.pk for product in self.products))
 
-# Create your tests here.
+    async def test_invalid_cursor(self):
+        response = await self.async_client.get(
+            reverse("myapiapp:orders-async"), {"cursor": "oops"}
+        )
+        self.assertEqual(response.status_code, 404)
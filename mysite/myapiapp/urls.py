@@ -1,6 +1,13 @@
 from django.urls import path, include
 
-from .views import hello_world_view, GroupsListView, ProductsListView, OrdersListView
+from .views import (
+    hello_world_view,
+    AsyncOrdersListView,
+    AsyncProductsListView,
+    GroupsListView,
+    ProductsListView,
+    OrdersListView,
+)
 
 
 app_name = "myapiapp"
@@ -10,4 +17,9 @@ urlpatterns = [
     path("groups/", GroupsListView.as_view(), name="groups"),
     path("products/", ProductsListView.as_view(), name="products"),
     path("orders/", OrdersListView.as_view(), name="orders"),
+    # асинхронные варианты для ASGI (DJANGO_SERVER_MODE=asgi, см. gunicorn.conf.py)
+    path(
+        "products/async/", AsyncProductsListView.as_view(), name="products-async"
+    ),
+    path("orders/async/", AsyncOrdersListView.as_view(), name="orders-async"),
 ]
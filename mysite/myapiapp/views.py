@@ -1,13 +1,24 @@
 from django.contrib.auth.models import Group
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
 from rest_framework import viewsets
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.request import Request
 from rest_framework.generics import GenericAPIView, ListCreateAPIView
 from rest_framework.mixins import ListModelMixin
+from rest_framework.utils.urls import replace_query_param
 
 from .serializers import GroupSerializer, ProductSerializer, OrderSerializer
+from .streaming import (
+    aiter_json_envelope,
+    aserialize_chunks,
+    iter_json_envelope,
+    serialize_chunks,
+)
 from shopapp.models import Product, Order
+from shopapp.pagination import decode_cursor, encode_cursor
 
 
 # Create your views here.
@@ -24,19 +35,167 @@ def hello_world_view(request: Request) -> Response:
 
 
 class GroupsListView(ListCreateAPIView):
-    queryset = Group.objects.all()
+    queryset = GroupSerializer.setup_eager_loading(Group.objects.all())
     serializer_class = GroupSerializer
 
 
-class ProductsListView(GenericAPIView):
-    def get(self, request: Request) -> Response:
-        products = Product.objects.all()
-        serialize = ProductSerializer(products, many=True)
-        return Response({"products": serialize.data})
+class CursorLimitMixin:
+    """Выдача порциями по pk: параметры limit и cursor, ссылка next."""
 
+    limit_query_param = "limit"
+    cursor_query_param = "cursor"
+    max_limit = 1000
 
-class OrdersListView(GenericAPIView):
-    def get(self, request: Request) -> Response:
-        orders = Order.objects.all()
-        serialize = OrderSerializer(orders, many=True)
-        return Response({"orders": serialize.data})
+    def is_limited(self, params) -> bool:
+        return self.limit_query_param in params or self.cursor_query_param in params
+
+    def get_limit(self, params) -> int:
+        try:
+            limit = int(params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.max_limit
+        return min(max(limit, 1), self.max_limit)
+
+    def limit_queryset(self, params, queryset):
+        """
+        limit + 1 объектов после курсора и сам limit.
+
+        Лишний объект не отдаётся: он только показывает, что есть следующая
+        порция.
+        """
+        limit = self.get_limit(params)
+        cursor = params.get(self.cursor_query_param)
+        if cursor:
+            data = decode_cursor(cursor)
+            if not isinstance(data, dict) or data.get("pk") is None:
+                raise NotFound("Invalid cursor")
+            queryset = queryset.filter(pk__gt=data["pk"])
+        return queryset.order_by("pk")[: limit + 1], limit
+
+    def next_link(self, url, state) -> dict:
+        if not state["more"]:
+            return {"next": None}
+        cursor = encode_cursor({"pk": state["last"]})
+        return {"next": replace_query_param(url, self.cursor_query_param, cursor)}
+
+
+class StreamingListView(CursorLimitMixin, GenericAPIView):
+    """
+    Список без пагинации в виде {"<envelope_key>": [...]}.
+
+    Для JSON ответ отдаётся потоком (см. myapiapp.streaming) и совпадает
+    байт в байт с обычным Response. Параметры limit и cursor включают
+    выдачу порциями по pk: в ответ добавляется ключ next со ссылкой на
+    следующую порцию (null на последней).
+    """
+
+    envelope_key = None
+
+    def get(self, request: Request, *args, **kwargs):
+        queryset = self.get_queryset()
+        tail = None
+        if self.is_limited(request.query_params):
+            items, tail = self.limit_items(request, queryset)
+        else:
+            items = serialize_chunks(queryset, self.get_serializer_class())
+
+        if request.accepted_renderer.format != "json" or "indent" in (
+            request.accepted_media_type or ""
+        ):
+            data = {self.envelope_key: list(items)}
+            data.update(tail() if tail else {})
+            return Response(data)
+        return StreamingHttpResponse(
+            iter_json_envelope(self.envelope_key, items, tail),
+            content_type="application/json",
+        )
+
+    def limit_items(self, request, queryset):
+        """Порция из limit объектов после курсора и функция, дающая next."""
+        queryset, limit = self.limit_queryset(request.query_params, queryset)
+        serializer_class = self.get_serializer_class()
+        state = {"last": None, "more": False}
+
+        def items():
+            for count, item in enumerate(serialize_chunks(queryset, serializer_class)):
+                if count == limit:
+                    state["more"] = True
+                    break
+                state["last"] = item["id"]
+                yield item
+
+        def tail():
+            return self.next_link(request.build_absolute_uri(), state)
+
+        return items(), tail
+
+
+class AsyncStreamingListView(CursorLimitMixin, View):
+    """
+    Асинхронный вариант StreamingListView для ASGI.
+
+    Строки читаются асинхронным ORM (QuerySet.aiterator()), а тело ответа
+    отдаётся асинхронным генератором, поэтому медленный клиент не держит
+    воркер. Отдаётся только JSON, байты совпадают с StreamingListView.
+    """
+
+    queryset = None
+    serializer_class = None
+    envelope_key = None
+
+    async def get(self, request, *args, **kwargs):
+        queryset = self.queryset.all()
+        if not self.is_limited(request.GET):
+            items = aserialize_chunks(queryset, self.serializer_class)
+            return self.stream(items)
+
+        try:
+            queryset, limit = self.limit_queryset(request.GET, queryset)
+        except NotFound as exc:
+            return JsonResponse({"detail": exc.detail}, status=exc.status_code)
+        state = {"last": None, "more": False}
+
+        async def items():
+            count = 0
+            async for item in aserialize_chunks(queryset, self.serializer_class):
+                if count == limit:
+                    state["more"] = True
+                    break
+                state["last"] = item["id"]
+                count += 1
+                yield item
+
+        def tail():
+            return self.next_link(request.build_absolute_uri(), state)
+
+        return self.stream(items(), tail)
+
+    def stream(self, items, tail=None):
+        return StreamingHttpResponse(
+            aiter_json_envelope(self.envelope_key, items, tail),
+            content_type="application/json",
+        )
+
+
+class ProductsListView(StreamingListView):
+    queryset = Product.objects.all()
+    serializer_class = ProductSerializer
+    envelope_key = "products"
+
+
+class OrdersListView(StreamingListView):
+    queryset = OrderSerializer.setup_eager_loading(Order.objects.all())
+    serializer_class = OrderSerializer
+    envelope_key = "orders"
+
+
+class AsyncProductsListView(AsyncStreamingListView):
+    queryset = Product.objects.all()
+    serializer_class = ProductSerializer
+    envelope_key = "products"
+
+
+class AsyncOrdersListView(AsyncStreamingListView):
+    queryset = OrderSerializer.setup_eager_loading(Order.objects.all())
+    serializer_class = OrderSerializer
+    envelope_key = "orders"
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class MyauthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myauth'
+
+    def ready(self):
+        from mysite.renditions import register
+
+        from .models import Profile
+
+        register(Profile, "avatar", "avatar_renditions")
@@ -15,6 +15,8 @@ class Profile(models.Model):
     avatar = models.ImageField(
         null=True, blank=True, upload_to=profile_images_directory_path
     )
+    # Уменьшенные копии avatar, заполняются mysite.renditions
+    avatar_renditions = models.JSONField(default=dict, blank=True, editable=False)
 
 
 @receiver(post_save, sender=User)
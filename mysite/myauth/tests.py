@@ -1,5 +1,16 @@
-from django.test import TestCase
+import tempfile
+from io import BytesIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import translation
+from PIL import Image
+
+from myauth.models import Profile
+from mysite.testing import LOCMEM_CACHES, QueryBudgetMixin, ViewBudget
 
 
 class GetCookieViewTestCase(TestCase):
@@ -17,3 +28,76 @@ class FooBarViewTest(TestCase):
         )
         expected_data = {"spam": "eggs", "foo": "bar"}
         self.assertJSONEqual(response.content, expected_data)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AvatarRenditionsTestCase(TestCase):
+    def test_avatar_thumb_on_about_me(self):
+        # about-me.html кеширует блок профиля
+        cache.clear()
+        user = User.objects.create_user(username="avatar", password="qwerty")
+        buffer = BytesIO()
+        Image.new("RGB", (400, 400), "blue").save(buffer, "PNG")
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root, IMAGE_RENDITION_WORKERS=0
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                user.profile.avatar = SimpleUploadedFile("me.png", buffer.getvalue())
+                user.profile.save()
+            user.profile.refresh_from_db()
+            thumb = user.profile.avatar_renditions["sizes"]["thumb"]
+            self.assertEqual((thumb["width"], thumb["height"]), (200, 200))
+
+            self.client.force_login(user)
+            with translation.override("en"):
+                url = reverse("myauth:about-me")
+            response = self.client.get(url)
+            self.assertContains(response, thumb["name"])
+
+    def test_pages_render_for_user_without_profile(self):
+        cache.clear()
+        user = User.objects.create_user(username="legacy", password="qwerty")
+        # пользователи, созданные до сигнала create_user_profile, или loaddata
+        Profile.objects.filter(user=user).delete()
+        user = User.objects.get(pk=user.pk)
+        self.client.force_login(user)
+        with translation.override("en"):
+            urls = [
+                reverse("myauth:about-me"),
+                reverse("myauth:update-about-me"),
+                reverse("myauth:user-detail", kwargs={"pk": user.pk}),
+            ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class AuthQueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    query_budgets = [
+        ViewBudget("myauth:hello", 0, query="items=2"),
+        ViewBudget("myauth:login", 2, status=302),
+        ViewBudget("myauth:about-me", 3),
+        ViewBudget("myauth:update-about-me", 4),
+        ViewBudget("myauth:register", 0),
+        ViewBudget("myauth:user-list", 1),
+        ViewBudget("myauth:user-detail", 3, lambda t: {"pk": t.other.pk}),
+        ViewBudget("myauth:user-avatar-update", 4, lambda t: {"pk": t.other.pk}),
+        ViewBudget("myauth:cookie-get", 0),
+        ViewBudget("myauth:cookie-set", 2),
+        ViewBudget("myauth:session-set", 5),
+        ViewBudget("myauth:session-get", 2),
+        ViewBudget("myauth:logout", 4, status=302),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(username="budget", password=None)
+        cls.other = User.objects.create_user(username="other", password=None)
+
+    def setUp(self) -> None:
+        self.budget_user = self.user
+
+    def add_rows(self, count):
+        start = User.objects.count()
+        for number in range(start, start + count):
+            User.objects.create_user(username=f"user-{number}", password=None)
@@ -101,7 +101,7 @@ class UserListView(ListView):
 class UserDetailView(DetailView):
     """открывает детали пользователя админу из страницы users"""
 
-    model = User
+    queryset = User.objects.select_related("profile")
     template_name = "myauth/user-detail.html"
     context_object_name = "user_obj"
 
@@ -0,0 +1,676 @@
+"""
+Двухуровневый кеш: LRU в памяти процесса (L1) перед общим кешем (L2).
+
+    CACHES = {
+        "default": {
+            "BACKEND": "mysite.cache_backends.TwoTierCache",
+            "LOCATION": "shared",  # алиас L2 в CACHES
+            "OPTIONS": {"L1_MAX_ENTRIES": 1000, "L1_TIMEOUT": 5},
+        },
+        "shared": {"BACKEND": "...FileBasedCache", "LOCATION": "..."},
+    }
+
+Чтение сначала идёт в L1, при промахе — в L2, и найденное значение
+кладётся в L1; запись идёт в оба уровня. L1 общий для всех потоков процесса
+(как у LocMemCache), хранит значения в pickle, чтобы вызывающий код не мог
+изменить закешированный объект, и ограничен числом записей
+(L1_MAX_ENTRIES) и суммарным размером (L1_MAX_BYTES).
+
+Удалить копию из L1 другого воркера нельзя, поэтому:
+
+- изменяемые данные кешируются по ключам с поколениями
+  (mysite.caching.versioned_key): после bump_generation ключ другой, и
+  старая копия в L1 больше не читается;
+- сами ключи поколений и другие служебные ключи (L1_EXCLUDE_PREFIXES) в L1
+  не попадают и всегда читаются из L2;
+- остальные ключи (cache_page и т. п.) живут в L1 не дольше L1_TIMEOUT
+  секунд: столько воркер может видеть значение, удалённое в другом.
+
+stats() — счётчики попаданий и промахов по уровням в этом процессе.
+
+ShardedDiskCache — замена FileBasedCache для L2, см. его описание.
+"""
+
+import os
+import pickle
+import shutil
+import sqlite3
+import struct
+import tempfile
+import time
+import zlib
+from collections import OrderedDict
+from hashlib import md5
+from threading import Lock, local
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from mysite.caching import GENERATION_KEY, LOCK_KEY
+
+# поколения и блокировки get_or_compute() должны быть видны всем воркерам сразу
+DEFAULT_EXCLUDE_PREFIXES = (GENERATION_KEY.split("{")[0], LOCK_KEY.split("{")[0])
+
+_MISSING = object()
+
+
+class _Store:
+    """Содержимое L1 и счётчики, общие для всех потоков процесса."""
+
+    def __init__(self):
+        self.lock = Lock()
+        # ключ -> (время истечения, pickle); порядок — от давно читавшихся
+        self.data = OrderedDict()
+        self.size = 0
+        self.counters = dict.fromkeys(
+            ("l1_hits", "l1_misses", "l2_hits", "l2_misses"), 0
+        )
+
+
+# LOCATION (алиас L2) -> _Store
+_stores = {}
+_stores_lock = Lock()
+
+
+class TwoTierCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._l2_alias = location
+        self._l1_max_entries = options.get("L1_MAX_ENTRIES", 1000)
+        self._l1_max_bytes = options.get("L1_MAX_BYTES", 64 * 2**20)
+        self._l1_timeout = options.get("L1_TIMEOUT", 5)
+        self._exclude = tuple(
+            options.get("L1_EXCLUDE_PREFIXES", DEFAULT_EXCLUDE_PREFIXES)
+        )
+        with _stores_lock:
+            self._store = _stores.setdefault(location, _Store())
+
+    @property
+    def l2(self) -> BaseCache:
+        return caches[self._l2_alias]
+
+    def stats(self) -> dict:
+        store = self._store
+        with store.lock:
+            return {
+                **store.counters,
+                "l1_entries": len(store.data),
+                "l1_bytes": store.size,
+            }
+
+    # --- L1 ---
+
+    def _bypass(self, key) -> bool:
+        return key.startswith(self._exclude)
+
+    def _l1_get(self, l1_key):
+        """pickle из L1 или None; считает попадание или промах."""
+        store = self._store
+        with store.lock:
+            entry = store.data.get(l1_key)
+            if entry is not None and entry[0] > time.time():
+                store.data.move_to_end(l1_key)
+                store.counters["l1_hits"] += 1
+                return entry[1]
+            if entry is not None:
+                self._l1_discard(l1_key)
+            store.counters["l1_misses"] += 1
+            return None
+
+    def _l1_set(self, l1_key, value, timeout=DEFAULT_TIMEOUT) -> None:
+        expires = time.time() + self._l1_timeout
+        backend_expires = self.get_backend_timeout(timeout)
+        if backend_expires is not None:
+            expires = min(expires, backend_expires)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        store = self._store
+        with store.lock:
+            self._l1_discard(l1_key)
+            if expires <= time.time() or len(pickled) > self._l1_max_bytes:
+                return
+            store.data[l1_key] = (expires, pickled)
+            store.size += len(pickled)
+            while (
+                len(store.data) > self._l1_max_entries
+                or store.size > self._l1_max_bytes
+            ):
+                _, (_, evicted) = store.data.popitem(last=False)
+                store.size -= len(evicted)
+
+    def _l1_discard(self, l1_key) -> None:
+        # вызывается под store.lock
+        entry = self._store.data.pop(l1_key, None)
+        if entry is not None:
+            self._store.size -= len(entry[1])
+
+    def _l1_delete(self, key, version) -> None:
+        l1_key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            self._l1_discard(l1_key)
+
+    def _count_l2(self, hit: bool) -> None:
+        with self._store.lock:
+            self._store.counters["l2_hits" if hit else "l2_misses"] += 1
+
+    # --- API кеша ---
+
+    def get(self, key, default=None, version=None):
+        if self._bypass(key):
+            return self.l2.get(key, default, version)
+        l1_key = self.make_and_validate_key(key, version=version)
+        pickled = self._l1_get(l1_key)
+        if pickled is not None:
+            return pickle.loads(pickled)
+        value = self.l2.get(key, _MISSING, version)
+        self._count_l2(value is not _MISSING)
+        if value is _MISSING:
+            return default
+        self._l1_set(l1_key, value)
+        return value
+
+    async def aget(self, key, default=None, version=None):
+        # попадание в L1 обслуживается без перехода в поток sync_to_async
+        if self._bypass(key):
+            return await self.l2.aget(key, default, version)
+        l1_key = self.make_and_validate_key(key, version=version)
+        pickled = self._l1_get(l1_key)
+        if pickled is not None:
+            return pickle.loads(pickled)
+        value = await self.l2.aget(key, _MISSING, version)
+        self._count_l2(value is not _MISSING)
+        if value is _MISSING:
+            return default
+        self._l1_set(l1_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            if self._bypass(key):
+                missing.append(key)
+                continue
+            pickled = self._l1_get(self.make_and_validate_key(key, version=version))
+            if pickled is None:
+                missing.append(key)
+            else:
+                found[key] = pickle.loads(pickled)
+        if missing:
+            from_l2 = self.l2.get_many(missing, version)
+            for key in missing:
+                if self._bypass(key):
+                    continue
+                self._count_l2(key in from_l2)
+                if key in from_l2:
+                    self._l1_set(
+                        self.make_and_validate_key(key, version=version),
+                        from_l2[key],
+                    )
+            found.update(from_l2)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version)
+        if not self._bypass(key):
+            self._l1_set(
+                self.make_and_validate_key(key, version=version), value, timeout
+            )
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        await self.l2.aset(key, value, timeout, version)
+        if not self._bypass(key):
+            self._l1_set(
+                self.make_and_validate_key(key, version=version), value, timeout
+            )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version)
+        if not self._bypass(key):
+            if added:
+                self._l1_set(
+                    self.make_and_validate_key(key, version=version), value, timeout
+                )
+            else:
+                # в L2 уже другое значение; копия в L1 могла устареть
+                self._l1_delete(key, version)
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version)
+        for key, value in data.items():
+            if self._bypass(key):
+                continue
+            if key in failed:
+                self._l1_delete(key, version)
+            else:
+                self._l1_set(
+                    self.make_and_validate_key(key, version=version), value, timeout
+                )
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l1_delete(key, version)
+        return self.l2.touch(key, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_delete(key, version)
+        return self.l2.incr(key, delta, version)
+
+    def delete(self, key, version=None):
+        self._l1_delete(key, version)
+        return self.l2.delete(key, version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._l1_delete(key, version)
+        self.l2.delete_many(keys, version)
+
+    def has_key(self, key, version=None):
+        if not self._bypass(key):
+            l1_key = self.make_and_validate_key(key, version=version)
+            with self._store.lock:
+                entry = self._store.data.get(l1_key)
+                if entry is not None and entry[0] > time.time():
+                    return True
+        return self.l2.has_key(key, version)
+
+    def clear(self):
+        store = self._store
+        with store.lock:
+            store.data.clear()
+            store.size = 0
+        self.l2.clear()
+
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    name TEXT PRIMARY KEY,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS counters (value INTEGER NOT NULL);
+BEGIN IMMEDIATE;
+INSERT INTO counters (value) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM counters);
+COMMIT;
+"""
+
+
+class _AccessLog:
+    """Время последнего чтения ключей, ещё не записанное в индекс."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.accessed = {}
+
+    def add(self, name) -> int:
+        with self.lock:
+            self.accessed[name] = time.time()
+            return len(self.accessed)
+
+    def drain(self) -> dict:
+        with self.lock:
+            accessed, self.accessed = self.accessed, {}
+        return accessed
+
+
+# LOCATION -> _AccessLog
+_access_logs = {}
+
+
+class ShardedDiskCache(BaseCache):
+    """
+    Файловый кеш с шардированием по каталогам и индексом в SQLite.
+
+    Значение ключа лежит в LOCATION/ab/cd/abcd....djcache (ab и cd — первые
+    байты md5 ключа), так что ни в одном каталоге не бывает больше нескольких
+    тысяч файлов. Файл начинается с заголовка: время истечения и флаг
+    сжатия; чтение индекс не трогает.
+
+    LOCATION/index.sqlite3 хранит для каждого файла время истечения и
+    последнего чтения, а число записей — отдельным счётчиком. Когда записей
+    больше MAX_ENTRIES, удаляется лишнее и ещё MAX_ENTRIES / CULL_FREQUENCY
+    (не больше CULL_BATCH) записей: сначала истёкшие, потом давно не
+    читавшиеся — два запроса по индексам, без обхода каталога, как в
+    FileBasedCache. Время чтения копится в памяти процесса и пишется в
+    индекс вместе со следующей записью.
+
+    Файлы ключей заменяются и удаляются только внутри транзакции индекса
+    (BEGIN IMMEDIATE); set() готовит временный файл до неё. Поэтому add() и
+    incr() атомарны между процессами (на них держатся bump_generation() и
+    блокировки mysite.caching), вытеснение не удалит файл, который только что
+    записал другой set(), а истёкший файл, найденный при чтении, удаляется
+    вместе со своей записью в индексе.
+
+    OPTIONS сверх стандартных:
+    COMPRESS_MIN_SIZE — pickle больше этого размера сжимается zlib
+    (по умолчанию 4 КиБ; мелкие значения дешевле не сжимать),
+    COMPRESS_LEVEL — уровень zlib (по умолчанию 6).
+    """
+
+    cache_suffix = ".djcache"
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+    # время истечения (inf — бессрочно) и флаги
+    header = struct.Struct("<dB")
+    COMPRESSED = 1
+    # столько прочитанных ключей копится до записи в индекс без set()
+    ACCESS_FLUSH_SIZE = 1000
+    # запас записей, освобождаемый одним вытеснением
+    CULL_BATCH = 1000
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._dir = os.path.abspath(location)
+        self._compress_min_size = options.get("COMPRESS_MIN_SIZE", 4096)
+        self._compress_level = options.get("COMPRESS_LEVEL", 6)
+        self._local = local()
+        with _stores_lock:
+            self._accessed = _access_logs.setdefault(self._dir, _AccessLog())
+
+    # --- индекс ---
+
+    @property
+    def _index(self) -> sqlite3.Connection:
+        # соединение на поток: экземпляр кеша вызывают и из sync_to_async
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(self._dir, 0o700, exist_ok=True)
+            connection = sqlite3.connect(
+                os.path.join(self._dir, "index.sqlite3"),
+                timeout=30,
+                isolation_level=None,
+            )
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.executescript(INDEX_SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def _write(self, callback):
+        """callback(connection) в транзакции; возвращает его результат."""
+        connection = self._index
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            accessed = self._accessed.drain()
+            if accessed:
+                connection.executemany(
+                    "UPDATE entries SET accessed = ? WHERE name = ?",
+                    [(when, name) for name, when in accessed.items()],
+                )
+            result = callback(connection)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return result
+
+    def _record(self, connection, name, expires, size) -> None:
+        exists = connection.execute(
+            "SELECT 1 FROM entries WHERE name = ?", (name,)
+        ).fetchone()
+        connection.execute(
+            "INSERT INTO entries (name, expires, accessed, size) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (name) DO UPDATE SET"
+            " expires = excluded.expires, accessed = excluded.accessed,"
+            " size = excluded.size",
+            (name, expires, time.time(), size),
+        )
+        if not exists:
+            connection.execute("UPDATE counters SET value = value + 1")
+
+    def _forget(self, connection, names) -> int:
+        removed = 0
+        for name in names:
+            removed += connection.execute(
+                "DELETE FROM entries WHERE name = ?", (name,)
+            ).rowcount
+        if removed:
+            connection.execute("UPDATE counters SET value = value - ?", (removed,))
+        return removed
+
+    def _cull(self, connection) -> None:
+        """Вытесняет лишние записи и их файлы (в транзакции индекса)."""
+        count = connection.execute("SELECT value FROM counters").fetchone()[0]
+        if count <= self._max_entries:
+            return []
+        if self._cull_frequency == 0:
+            to_remove = count
+        else:
+            # Вытеснение дешёвое, поэтому с запасом не в треть кеша, как у
+            # FileBasedCache, а не больше CULL_BATCH: иначе один set() на
+            # большом кеше удаляет сотни тысяч файлов
+            to_remove = count - self._max_entries + min(
+                self._max_entries // self._cull_frequency, self.CULL_BATCH
+            )
+        names = [
+            row[0]
+            for row in connection.execute(
+                "SELECT name FROM entries WHERE expires < ? ORDER BY expires LIMIT ?",
+                (time.time(), to_remove),
+            )
+        ]
+        if len(names) < to_remove:
+            names += [
+                row[0]
+                for row in connection.execute(
+                    "SELECT name FROM entries WHERE expires >= ?"
+                    " ORDER BY accessed LIMIT ?",
+                    (time.time(), to_remove - len(names)),
+                )
+            ]
+        self._forget(connection, names)
+        for name in names:
+            self._unlink(name)
+
+    # --- файлы ---
+
+    def _name(self, key, version) -> str:
+        key = self.make_and_validate_key(key, version=version)
+        return md5(key.encode(), usedforsecurity=False).hexdigest()
+
+    def _path(self, name) -> str:
+        return os.path.join(self._dir, name[:2], name[2:4], name + self.cache_suffix)
+
+    def _load(self, name):
+        """(время истечения, флаги, тело) или None, если файла нет."""
+        try:
+            with open(self._path(name), "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        try:
+            expires, flags = self.header.unpack_from(data)
+        except struct.error:
+            return None
+        return expires, flags, data[self.header.size :]
+
+    def _read(self, name, connection=None):
+        """
+        Как _load(), но None и для истёкшего файла; его файл и запись в
+        индексе удаляются в транзакции connection или в своей.
+        """
+        entry = self._load(name)
+        if entry is None or entry[0] >= time.time():
+            return entry
+        if connection is None:
+            self._write(lambda connection: self._expire(connection, name))
+        else:
+            self._expire(connection, name)
+        return None
+
+    def _expire(self, connection, name) -> None:
+        # под блокировкой индекса: файл мог уже заменить другой set()
+        entry = self._load(name)
+        if entry is None or entry[0] < time.time():
+            self._unlink(name)
+            self._forget(connection, [name])
+
+    def _decode(self, flags, body):
+        if flags & self.COMPRESSED:
+            body = zlib.decompress(body)
+        return pickle.loads(body)
+
+    def _encode(self, value, expires) -> bytes:
+        body = pickle.dumps(value, self.pickle_protocol)
+        flags = 0
+        if len(body) >= self._compress_min_size:
+            body = zlib.compress(body, self._compress_level)
+            flags |= self.COMPRESSED
+        return self.header.pack(expires, flags) + body
+
+    def _expires(self, timeout) -> float:
+        expires = self.get_backend_timeout(timeout)
+        return float("inf") if expires is None else expires
+
+    def _unlink(self, name) -> None:
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+    # --- API кеша ---
+
+    def get(self, key, default=None, version=None):
+        name = self._name(key, version)
+        entry = self._read(name)
+        if entry is None:
+            return default
+        if self._accessed.add(name) >= self.ACCESS_FLUSH_SIZE:
+            self._write(lambda connection: None)
+        return self._decode(entry[1], entry[2])
+
+    def _stage(self, name, content) -> str:
+        """Пишет content во временный файл рядом с файлом ключа."""
+        directory = os.path.dirname(self._path(name))
+        os.makedirs(directory, 0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with open(fd, "wb") as file:
+                file.write(content)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    def _store(self, connection, name, tmp_path, expires, size) -> None:
+        """Ставит файл из _stage() на место ключа (в транзакции индекса)."""
+        os.replace(tmp_path, self._path(name))
+        self._record(connection, name, expires, size)
+        self._cull(connection)
+
+    def _write_staged(self, name, content, callback):
+        # дорогая запись файла — до блокировки индекса, под ней только rename
+        tmp_path = self._stage(name, content)
+        try:
+            return self._write(lambda connection: callback(connection, tmp_path))
+        finally:
+            # после os.replace() файла уже нет; остаётся, если ключ не записан
+            self._discard(tmp_path)
+
+    @staticmethod
+    def _discard(path) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        name = self._name(key, version)
+        expires = self._expires(timeout)
+        content = self._encode(value, expires)
+
+        def store(connection, tmp_path):
+            self._store(connection, name, tmp_path, expires, len(content))
+
+        self._write_staged(name, content, store)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        name = self._name(key, version)
+        expires = self._expires(timeout)
+        content = self._encode(value, expires)
+
+        def add(connection, tmp_path):
+            # проверка и запись под блокировкой индекса: другой процесс
+            # не вставит тот же ключ между ними
+            if self._read(name, connection) is not None:
+                return False
+            self._store(connection, name, tmp_path, expires, len(content))
+            return True
+
+        return self._write_staged(name, content, add)
+
+    def incr(self, key, delta=1, version=None):
+        name = self._name(key, version)
+
+        def incr(connection):
+            entry = self._read(name, connection)
+            if entry is None:
+                raise ValueError("Key '%s' not found" % key)
+            expires, flags, body = entry
+            value = self._decode(flags, body) + delta
+            content = self._encode(value, expires)
+            tmp_path = self._stage(name, content)
+            try:
+                self._store(connection, name, tmp_path, expires, len(content))
+            finally:
+                self._discard(tmp_path)
+            return value
+
+        return self._write(incr)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        name = self._name(key, version)
+        expires = self._expires(timeout)
+
+        def touch(connection):
+            if self._read(name, connection) is None:
+                return False
+            with open(self._path(name), "r+b") as file:
+                file.write(struct.pack("<d", expires))
+            connection.execute(
+                "UPDATE entries SET expires = ? WHERE name = ?", (expires, name)
+            )
+            return True
+
+        return self._write(touch)
+
+    def delete(self, key, version=None):
+        name = self._name(key, version)
+
+        def delete(connection):
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                deleted = False
+            else:
+                deleted = True
+            self._forget(connection, [name])
+            return deleted
+
+        return self._write(delete)
+
+    def has_key(self, key, version=None):
+        return self._read(self._name(key, version)) is not None
+
+    def clear(self):
+        def reset(connection):
+            connection.execute("DELETE FROM entries")
+            connection.execute("UPDATE counters SET value = 0")
+
+        self._write(reset)
+        self._accessed.drain()
+        for shard in os.listdir(self._dir):
+            path = os.path.join(self._dir, shard)
+            if len(shard) == 2 and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def close(self, **kwargs):
+        # соединение с индексом живёт, пока жив поток: открывать его на
+        # каждый запрос дороже, чем держать
+        pass
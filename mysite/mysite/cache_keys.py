@@ -0,0 +1,112 @@
+"""
+Канонические ключи кеша для списков DRF.
+
+Ключ по сырому URL дробит кеш: ?ordering=price&search=x и
+?search=x&ordering=price, метки вроде utm_source и префиксы языка
+i18n_patterns дают разные ключи для одного и того же ответа.
+api_cache_key_parts() строит части ключа (для mysite.caching.get_or_compute)
+только из того, от чего зависят данные ответа:
+
+- параметров запроса, которые view объявляет сама — фильтры
+  filter_backends (filterset, search, ordering) и параметры пагинатора, —
+  отсортированных по имени; остальные параметры отбрасываются;
+- языка и класса аутентификации (аноним или способ входа), а не
+  конкретного пользователя;
+- схемы и домена: ссылки next/previous в ответе абсолютные.
+
+Путь в ключ не входит — его заменяет имя view и действия. Порядок значений
+одного параметра сохраняется: для ?name=a&name=b фильтр берёт последнее.
+Ответ для кеша считается внутри canonical_request(): ссылки next/previous
+строятся по канонической строке запроса, а не по URL первого запросившего,
+и не разносят его метки другим клиентам.
+"""
+
+from contextlib import contextmanager
+from urllib.parse import urlencode
+
+from django.http import QueryDict
+from django.utils import translation
+
+# Объявленные параметры по классу view: filterset и пагинатор не меняются
+_declared_params = {}
+
+
+def _filterset_params(filterset_class):
+    for name, filter_ in filterset_class.base_filters.items():
+        yield name
+        # RangeFilter и подобные читают name_min/name_max и т. п.
+        for suffix in getattr(filter_.field.widget, "suffixes", ()):
+            yield f"{name}_{suffix}" if suffix else name
+
+
+def _component_params(component, view):
+    # django-filter больше не описывает параметры для схемы сам
+    get_filterset_class = getattr(component, "get_filterset_class", None)
+    if get_filterset_class is not None:
+        filterset_class = get_filterset_class(view, view.get_queryset())
+        return _filterset_params(filterset_class) if filterset_class else ()
+    return (
+        parameter["name"]
+        for parameter in component.get_schema_operation_parameters(view)
+    )
+
+
+def declared_query_params(view) -> frozenset:
+    """Имена параметров запроса, которые понимают фильтры и пагинатор view."""
+    view_class = type(view)
+    names = _declared_params.get(view_class)
+    if names is None:
+        components = [backend() for backend in view.filter_backends]
+        if view.paginator is not None:
+            components.append(view.paginator)
+        names = frozenset(
+            name
+            for component in components
+            for name in _component_params(component, view)
+        )
+        _declared_params[view_class] = names
+    return names
+
+
+def canonical_query(request, view) -> str:
+    """Строка запроса из объявленных параметров, отсортированных по имени."""
+    declared = declared_query_params(view)
+    params = request.query_params
+    return urlencode(
+        [
+            (name, value)
+            for name in sorted(params)
+            if name in declared
+            for value in params.getlist(name)
+        ]
+    )
+
+
+@contextmanager
+def canonical_request(request, view):
+    """На время блока заменяет строку запроса request на canonical_query()."""
+    http_request = request._request
+    saved = http_request.GET, http_request.META.get("QUERY_STRING", "")
+    query = canonical_query(request, view)
+    http_request.GET = QueryDict(query)
+    http_request.META["QUERY_STRING"] = query
+    try:
+        yield request
+    finally:
+        http_request.GET, http_request.META["QUERY_STRING"] = saved
+
+
+def authentication_name(request) -> str:
+    authenticator = request.successful_authenticator
+    return type(authenticator).__name__ if authenticator else "anonymous"
+
+
+def api_cache_key_parts(request, view) -> tuple:
+    """Части ключа кеша для ответа view на request (см. описание модуля)."""
+    return (
+        f"{view.basename}-{view.action}",
+        request.build_absolute_uri("/"),
+        translation.get_language(),
+        authentication_name(request),
+        canonical_query(request, view),
+    )
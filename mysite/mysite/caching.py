@@ -0,0 +1,248 @@
+"""
+Кеширование с поколениями (generation keys).
+
+У каждой группы данных ("products", "orders", ...) есть счётчик поколения.
+Ключи кеша строятся с текущими поколениями своих групп, поэтому запись в
+модель инвалидирует все связанные ключи одним cache.incr(), без поиска и
+удаления самих ключей. Старые значения просто перестают читаться и
+вытесняются кешем по TTL.
+
+Для асинхронных view есть aget_generation() и aversioned_key() на
+асинхронном API кеша.
+
+get_or_compute() и aget_or_compute() защищают дорогие значения от
+«набега» (cache stampede): когда значение устарело, пересчитывает его один
+запрос, а остальные в это время отдают прежнее.
+"""
+
+import asyncio
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, cache, caches
+
+GENERATION_KEY = "generation:{group}"
+LOCK_KEY = "lock:{key}"
+
+# Сколько секунд пересчёт может держать блокировку
+LOCK_TIMEOUT = 30
+# Как часто ждущий запрос проверяет, не готово ли значение
+LOCK_POLL_INTERVAL = 0.05
+# beta из XFetch: чем больше, тем раньше до истечения TTL начинается пересчёт
+EARLY_REFRESH_BETA = 1.0
+
+
+def _initial_generation() -> int:
+    # Если ключ поколения вытеснен, нельзя начинать заново с 1:
+    # старые ключи с тем же номером ещё могут лежать в кеше.
+    return int(time.time() * 1000)
+
+
+def get_generation(group: str) -> int:
+    """Текущее поколение группы; при отсутствии создаёт его."""
+    key = GENERATION_KEY.format(group=group)
+    generation = cache.get(key)
+    if generation is None:
+        # add() не перезапишет значение, если другой процесс успел его создать
+        cache.add(key, _initial_generation(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+async def aget_generation(group: str) -> int:
+    """Асинхронный вариант get_generation()."""
+    key = GENERATION_KEY.format(group=group)
+    generation = await cache.aget(key)
+    if generation is None:
+        await cache.aadd(key, _initial_generation(), timeout=None)
+        generation = await cache.aget(key)
+    return generation
+
+
+def bump_generation(*groups: str) -> None:
+    """Инвалидирует все ключи указанных групп."""
+    for group in groups:
+        key = GENERATION_KEY.format(group=group)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_generation(), timeout=None)
+
+
+def versioned_key(name: str, groups, *parts) -> str:
+    """
+    Ключ кеша, зависящий от поколений groups.
+
+    Например, versioned_key("products-export", ["products"]) даёт
+    "products-export:1700000000000" и меняется после bump_generation("products").
+    """
+    return ":".join([name, _version(groups), *map(str, parts)])
+
+
+async def aversioned_key(name: str, groups, *parts) -> str:
+    """Асинхронный вариант versioned_key()."""
+    return ":".join([name, await _aversion(groups), *map(str, parts)])
+
+
+def _version(groups) -> str:
+    return ".".join(str(get_generation(group)) for group in groups)
+
+
+async def _aversion(groups) -> str:
+    return ".".join([str(await aget_generation(group)) for group in groups])
+
+
+# --- защита от набега ---
+#
+# Значение лежит под ключом без поколений, "swr:<name>:<parts>", вместе со
+# своей версией (поколениями groups на момент расчёта), сроком свежести и
+# временем расчёта: (value, version, fresh_until, cost). Поэтому после
+# bump_generation или истечения TTL прежнее значение ещё есть, и его можно
+# отдать, пока другой запрос считает новое.
+
+
+def _stable_key(name: str, parts) -> str:
+    return ":".join(["swr", name, *map(str, parts)])
+
+
+def _is_fresh(entry, version: str, beta: float) -> bool:
+    if entry is None or entry[1] != version:
+        return False
+    _, _, fresh_until, cost = entry
+    # XFetch: пересчитать заранее с вероятностью, растущей к концу TTL;
+    # дорогие значения (большой cost) начинают обновляться раньше
+    return time.time() - cost * beta * math.log(1 - random.random()) < fresh_until
+
+
+def _entry(value, version: str, started: float, timeout) -> tuple:
+    finished = time.time()
+    return (value, version, finished + timeout, finished - started)
+
+
+def shared_cache():
+    """
+    Общий для всех воркеров уровень кеша по умолчанию (L2 у TwoTierCache).
+
+    L1 в TwoTierCache может держать прежнее значение ещё L1_TIMEOUT секунд
+    после того, как другой воркер записал новое в L2.
+    """
+    return getattr(cache, "l2", cache)
+
+
+def fragment_cache():
+    """Кеш, в который пишет тег {% cache %}: template_fragments или default."""
+    try:
+        return caches["template_fragments"]
+    except InvalidCacheBackendError:
+        return caches["default"]
+
+
+def _timeouts(timeout, stale_timeout):
+    timeout = settings.CACHE_LONG_TIMEOUT if timeout is None else timeout
+    if stale_timeout is None:
+        stale_timeout = settings.CACHE_STALE_TIMEOUT
+    return timeout, timeout + stale_timeout
+
+
+def get_or_compute(
+    name: str,
+    groups,
+    compute,
+    *parts,
+    timeout=None,
+    stale_timeout=None,
+    beta=EARLY_REFRESH_BETA,
+):
+    """
+    Значение compute() из кеша с single-flight пересчётом.
+
+    Свежее значение (той же версии groups и моложе timeout) отдаётся
+    сразу. Иначе пересчитывает только запрос, взявший блокировку
+    (cache.add); остальные отдают прежнее значение — устаревшее после
+    записи в groups или не старше stale_timeout после истечения TTL.
+    Если прежнего значения нет, они ждут результата до LOCK_TIMEOUT
+    секунд и только потом считают сами.
+
+    timeout по умолчанию — CACHE_LONG_TIMEOUT, stale_timeout —
+    CACHE_STALE_TIMEOUT. Блокировка на бэкендах без атомарного add()
+    (файловые кеши) приблизительная: изредка значение пересчитают двое.
+    """
+    timeout, stored_timeout = _timeouts(timeout, stale_timeout)
+    key = _stable_key(name, parts)
+    version = _version(groups)
+    entry = cache.get(key)
+    if _is_fresh(entry, version, beta):
+        return entry[0]
+    if entry is not None:
+        fresher = shared_cache().get(key)
+        if _is_fresh(fresher, version, beta):
+            return fresher[0]
+
+    def recompute():
+        started = time.time()
+        value = compute()
+        cache.set(key, _entry(value, version, started, timeout), stored_timeout)
+        return value
+
+    lock_key = LOCK_KEY.format(key=key)
+    if cache.add(lock_key, version, LOCK_TIMEOUT):
+        try:
+            return recompute()
+        finally:
+            cache.delete(lock_key)
+    if entry is not None:
+        return entry[0]
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline and cache.has_key(lock_key):
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = shared_cache().get(key)
+        if entry is not None and entry[1] == version:
+            return entry[0]
+    # пересчёт не удался или занял больше LOCK_TIMEOUT
+    return recompute()
+
+
+async def aget_or_compute(
+    name: str,
+    groups,
+    compute,
+    *parts,
+    timeout=None,
+    stale_timeout=None,
+    beta=EARLY_REFRESH_BETA,
+):
+    """Асинхронный вариант get_or_compute(); compute — корутинная функция."""
+    timeout, stored_timeout = _timeouts(timeout, stale_timeout)
+    key = _stable_key(name, parts)
+    version = await _aversion(groups)
+    entry = await cache.aget(key)
+    if _is_fresh(entry, version, beta):
+        return entry[0]
+    if entry is not None:
+        fresher = await shared_cache().aget(key)
+        if _is_fresh(fresher, version, beta):
+            return fresher[0]
+
+    async def recompute():
+        started = time.time()
+        value = await compute()
+        await cache.aset(key, _entry(value, version, started, timeout), stored_timeout)
+        return value
+
+    lock_key = LOCK_KEY.format(key=key)
+    if await cache.aadd(lock_key, version, LOCK_TIMEOUT):
+        try:
+            return await recompute()
+        finally:
+            await cache.adelete(lock_key)
+    if entry is not None:
+        return entry[0]
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline and await cache.ahas_key(lock_key):
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        entry = await shared_cache().aget(key)
+        if entry is not None and entry[1] == version:
+            return entry[0]
+    return await recompute()
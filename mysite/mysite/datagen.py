@@ -0,0 +1,291 @@
+"""
+Генератор синтетических данных для магазина, блога и пользователей.
+
+Строки создаются порциями через bulk_create с явными pk, поэтому связи
+(заказы -> пользователи и товары, статьи -> теги) строятся без обращений
+к БД, а сигналы на каждую строку (create_user_profile, пересчёт итогов,
+инвалидация кешей) не вызываются: профили, итоги заказов и поколения кеша
+заполняются отдельно, по одному запросу на порцию.
+
+Каждая порция получает свой генератор случайных чисел из (seed, таблица,
+номер порции), так что при одинаковом seed и одинаковом начальном
+состоянии БД данные совпадают независимо от числа процессов.
+"""
+
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from multiprocessing import get_context
+
+from django.contrib.auth.models import User
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from blogapp.models import Article, ArticleNews, Author, Category, Tag
+from myauth.models import Profile
+from shopapp.models import Order, Product
+from shopapp.totals import refresh_order_totals
+
+ADJECTIVES = ["Compact", "Smart", "Classic", "Wireless", "Premium", "Eco", "Pro"]
+NOUNS = ["Laptop", "Phone", "Chair", "Lamp", "Kettle", "Backpack", "Monitor"]
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua"
+).split()
+FIRST_NAMES = ["Ivan", "Maria", "Alexey", "Olga", "Dmitry", "Anna", "Sergey"]
+LAST_NAMES = ["Ivanov", "Petrova", "Smirnov", "Kuznetsova", "Popov", "Sokolova"]
+
+# Ссылки между таблицами: pk пользователей, товаров и тегов. Заполняются
+# в родительском процессе до запуска пула и наследуются воркерами при fork.
+_ids = {}
+
+
+def batch_rng(seed, table: str, batch: int) -> random.Random:
+    return random.Random(f"{seed}:{table}:{batch}")
+
+
+def sentence(rng, words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=words)).capitalize()
+
+
+def skewed_choice(rng, items):
+    """Элемент items, первые встречаются чаще: несколько «хитов продаж»."""
+    return items[int(len(items) * rng.random() ** 3)]
+
+
+def create_users(rng, start: int, count: int, options) -> None:
+    users = []
+    profiles = []
+    for pk in range(start, start + count):
+        users.append(
+            User(
+                pk=pk,
+                username=f"gen-{pk}",
+                email=f"gen-{pk}@example.com",
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=rng.choice(LAST_NAMES),
+                password=options["password_hash"],
+            )
+        )
+        # post_save не вызывается, профиль создаётся здесь же
+        profiles.append(
+            Profile(
+                user_id=pk,
+                bio=sentence(rng, rng.randint(0, 12)),
+                agreement_accepted=rng.random() < 0.9,
+            )
+        )
+    User.objects.bulk_create(users)
+    Profile.objects.bulk_create(profiles)
+
+
+def create_products(rng, start: int, count: int, options) -> None:
+    Product.objects.bulk_create(
+        Product(
+            pk=pk,
+            name=f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {pk}",
+            description=sentence(rng, rng.randint(5, 30)),
+            price=Decimal(rng.randint(100, 500_000)) / 100,
+            discount=rng.choice((0, 0, 0, 5, 10, 15, 20, 30, 50)),
+            archived=rng.random() < 0.05,
+        )
+        for pk in range(start, start + count)
+    )
+
+
+def create_orders(rng, start: int, count: int, options) -> None:
+    users = _ids["users"]
+    products = _ids["products"]
+    mean_fanout = options["products_per_order"]
+    orders = []
+    links = []
+    for pk in range(start, start + count):
+        orders.append(
+            Order(
+                pk=pk,
+                user_id=rng.choice(users),
+                delivery_address=f"{rng.randint(1, 200)} {rng.choice(WORDS)} st.",
+                promocode=rng.choice(("", "", "", "SALE10", "WELCOME")),
+            )
+        )
+        # 1 + экспоненциальный хвост: большинство заказов небольшие
+        fanout = 1 + int(rng.expovariate(1 / max(mean_fanout - 1, 0.1)))
+        fanout = min(fanout, len(products), 50)
+        chosen = set()
+        while len(chosen) < fanout:
+            chosen.add(skewed_choice(rng, products))
+        links.extend(
+            Order.products.through(order_id=pk, product_id=product_id)
+            for product_id in chosen
+        )
+    Order.objects.bulk_create(orders)
+    Order.products.through.objects.bulk_create(links)
+    refresh_order_totals(Order.objects.filter(pk__gte=start, pk__lt=start + count))
+
+
+def create_articles(rng, start: int, count: int, options) -> None:
+    authors, categories, tags = _ids["authors"], _ids["categories"], _ids["tags"]
+    articles = []
+    links = []
+    for pk in range(start, start + count):
+        articles.append(
+            Article(
+                pk=pk,
+                title=sentence(rng, rng.randint(3, 8))[:200],
+                content="\n\n".join(
+                    sentence(rng, rng.randint(20, 60))
+                    for _ in range(rng.randint(1, 5))
+                ),
+                author_id=rng.choice(authors),
+                category_id=rng.choice(categories),
+            )
+        )
+        for tag_id in rng.sample(tags, min(rng.randint(0, 3), len(tags))):
+            links.append(Article.tags.through(article_id=pk, tag_id=tag_id))
+    Article.objects.bulk_create(articles)
+    Article.tags.through.objects.bulk_create(links)
+
+
+def create_news(rng, start: int, count: int, options) -> None:
+    now = timezone.now()
+    ArticleNews.objects.bulk_create(
+        ArticleNews(
+            pk=pk,
+            title=sentence(rng, rng.randint(3, 8))[:100],
+            body=sentence(rng, rng.randint(20, 80)),
+            # часть новостей — черновики без даты публикации
+            published_at=(
+                now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+                if rng.random() < 0.9
+                else None
+            ),
+        )
+        for pk in range(start, start + count)
+    )
+
+
+# Таблица -> (модель, функция порции); порядок важен из-за внешних ключей
+TABLES = {
+    "users": (User, create_users),
+    "products": (Product, create_products),
+    "orders": (Order, create_orders),
+    "articles": (Article, create_articles),
+    "news": (ArticleNews, create_news),
+}
+
+
+def tune_connection() -> None:
+    """
+    Настройки записи для SQLite.
+
+    synchronous = OFF: сгенерированные данные не жалко потерять при сбое ОС.
+    SQLite пускает одного писателя за раз, а порция почти всё время уходит
+    на сам INSERT, поэтому процессы здесь только ждут очереди (busy_timeout):
+    --processes ускоряет генерацию на серверных БД, не на SQLite.
+    BEGIN IMMEDIATE берёт блокировку записи сразу: в DEFERRED-транзакциях
+    два писателя могут упереться друг в друга, и SQLite сразу вернёт
+    "database is locked", не дожидаясь busy_timeout.
+    """
+    # внутри чужой транзакции (например, в тестах) PRAGMA менять нельзя
+    if connection.vendor == "sqlite" and not connection.in_atomic_block:
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous = OFF")
+            cursor.execute("PRAGMA busy_timeout = 600000")
+        # то же, что OPTIONS["transaction_mode"], но только для этого соединения
+        connection.transaction_mode = "IMMEDIATE"
+
+
+def run_batch(table: str, batch: int, start: int, count: int, options) -> int:
+    """Создаёт одну порцию строк table; вызывается в воркере или inline."""
+    try:
+        tune_connection()
+        create = TABLES[table][1]
+        with transaction.atomic():
+            create(batch_rng(options["seed"], table, batch), start, count, options)
+        return count
+    finally:
+        if options["processes"] > 1:
+            connections.close_all()
+
+
+def next_pk(model) -> int:
+    return (model.objects.aggregate(value=Max("pk"))["value"] or 0) + 1
+
+
+def ensure_blog_dictionaries() -> None:
+    """Авторы, категории и теги: их немного, создаются один раз."""
+    if not Author.objects.exists():
+        Author.objects.bulk_create(
+            Author(name=f"{first} {last}", bio=sentence(random.Random(i), 10))
+            for i, (first, last) in enumerate(zip(FIRST_NAMES, LAST_NAMES))
+        )
+    if not Category.objects.exists():
+        Category.objects.bulk_create(
+            Category(name=name) for name in ("News", "Python", "Django", "Tips")
+        )
+    if not Tag.objects.exists():
+        Tag.objects.bulk_create(Tag(name=word) for word in WORDS[:12])
+
+
+def all_pks(model) -> list:
+    return list(model.objects.order_by("pk").values_list("pk", flat=True))
+
+
+def load_ids(table: str) -> None:
+    if table == "orders":
+        _ids["users"] = all_pks(User)
+        _ids["products"] = all_pks(Product)
+        if not _ids["users"] or not _ids["products"]:
+            raise ValueError("Orders need existing or generated users and products")
+    if table == "articles":
+        _ids["authors"] = all_pks(Author)
+        _ids["categories"] = all_pks(Category)
+        _ids["tags"] = all_pks(Tag)
+
+
+def generate(counts: dict, options: dict, progress=None) -> dict:
+    """
+    Создаёт counts[table] строк для каждой таблицы из TABLES.
+
+    options: seed, batch_size, processes, products_per_order, password_hash.
+    progress(table, done, total) вызывается после каждой порции.
+    Возвращает {table: создано строк}.
+    """
+    if counts.get("articles"):
+        ensure_blog_dictionaries()
+    created = {}
+    for table, (model, _) in TABLES.items():
+        total = counts.get(table, 0)
+        if not total:
+            continue
+        load_ids(table)
+        start = next_pk(model)
+        batch_size = options["batch_size"]
+        batches = [
+            (table, number, start + offset, min(batch_size, total - offset), options)
+            for number, offset in enumerate(range(0, total, batch_size))
+        ]
+        done = 0
+        for count in map_batches(batches, options["processes"]):
+            done += count
+            if progress:
+                progress(table, done, total)
+        created[table] = done
+    return created
+
+
+def map_batches(batches, processes: int):
+    if processes <= 1:
+        for args in batches:
+            yield run_batch(*args)
+        return
+    # Процессы создаются fork'ом: открытые соединения наследовать нельзя
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=processes, mp_context=get_context("fork")
+    ) as pool:
+        futures = [pool.submit(run_batch, *args) for args in batches]
+        for future in futures:
+            yield future.result()
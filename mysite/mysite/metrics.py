@@ -0,0 +1,270 @@
+"""
+Метрики запросов: время, SQL, кеш и размер ответа одной JSON-строкой в лог.
+
+RequestMetricsMiddleware ставится первой в MIDDLEWARE и на каждый запрос
+собирает:
+
+    {"view": "shopapp:products-export", "method": "GET", "path": "...",
+     "status": 200, "duration_ms": 12.3, "sql_count": 2, "sql_ms": 1.1,
+     "cache_hits": 1, "cache_misses": 0, "response_bytes": 5120}
+
+Строка пишется в логгер mysite.metrics (форматтер JsonFormatter) для доли
+REQUEST_METRICS_SAMPLE_RATE запросов и для всех запросов медленнее
+REQUEST_METRICS_SLOW_MS (уровень WARNING). Вывод в stdout подхватывает
+драйвер логов Docker/Loki.
+
+Счётчики живут в contextvar, поэтому работают и в async view: asgiref
+переносит контекст в потоки sync_to_async. SQL считается обёрткой
+execute_wrapper на каждом соединении, кеш — обёрткой над get() и aget()
+классов бэкендов из CACHES (у Django для кеша нет хуков). Считается только
+внешний вызов: промах L1 в TwoTierCache, ушедший в L2 из того же CACHES,
+не попадает в счётчики дважды. При
+REQUEST_METRICS_ENABLED = False middleware отключается через
+MiddlewareNotUsed и ничего не устанавливает.
+
+Тело потокового ответа (StreamingHttpResponse, FileResponse) производится
+уже после выхода из middleware, поэтому чанки отдаются с активными
+счётчиками запроса, а строка пишется при закрытии ответа — когда известны
+полное время, запросы генератора и число отданных байт.
+"""
+
+import json
+import logging
+import random
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import wraps
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.module_loading import import_string
+
+log = logging.getLogger(__name__)
+
+_current = ContextVar("request_metrics", default=None)
+# Внутри get() другого бэкенда: вложенные вызовы не считаются
+_in_cache_get = ContextVar("in_cache_get", default=False)
+_MISSING = object()
+
+
+class RequestMetrics:
+    __slots__ = ("sql_count", "sql_time", "cache_hits", "cache_misses")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+def sql_timer(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_count += 1
+        metrics.sql_time += perf_counter() - started
+
+
+def install_sql_timer(sender=None, connection=None, **kwargs) -> None:
+    # В начало списка: connection.execute_wrapper() снимает свою обёртку
+    # через pop(), и она должна оставаться последней
+    if sql_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, sql_timer)
+
+
+def instrument_cache_backends() -> None:
+    """Оборачивает get() и aget() классов бэкендов из CACHES подсчётом попаданий."""
+    for config in settings.CACHES.values():
+        backend_class = import_string(config["BACKEND"])
+        if getattr(backend_class.get, "request_metrics", False):
+            continue
+        backend_class.get = _counting_get(backend_class.get)
+        backend_class.aget = _counting_aget(backend_class.aget)
+
+
+def _count_cache_lookup(metrics, value, default):
+    if value is _MISSING:
+        metrics.cache_misses += 1
+        return default
+    metrics.cache_hits += 1
+    return value
+
+
+def _counting_get(original):
+    @wraps(original)
+    def get(self, key, default=None, version=None):
+        metrics = _current.get()
+        if metrics is None or _in_cache_get.get():
+            return original(self, key, default, version)
+        token = _in_cache_get.set(True)
+        try:
+            value = original(self, key, _MISSING, version)
+        finally:
+            _in_cache_get.reset(token)
+        return _count_cache_lookup(metrics, value, default)
+
+    get.request_metrics = True
+    return get
+
+
+def _counting_aget(original):
+    @wraps(original)
+    async def aget(self, key, default=None, version=None):
+        metrics = _current.get()
+        if metrics is None or _in_cache_get.get():
+            return await original(self, key, default, version)
+        token = _in_cache_get.set(True)
+        try:
+            value = await original(self, key, _MISSING, version)
+        finally:
+            _in_cache_get.reset(token)
+        return _count_cache_lookup(metrics, value, default)
+
+    aget.request_metrics = True
+    return aget
+
+
+def _measured(content, metrics, count):
+    # каждый чанк производится со счётчиками запроса, которому он отдаётся
+    iterator = iter(content)
+    while True:
+        token = _current.set(metrics)
+        try:
+            chunk = next(iterator, _MISSING)
+        finally:
+            _current.reset(token)
+        if chunk is _MISSING:
+            return
+        count(chunk)
+        yield chunk
+
+
+async def _ameasured(content, metrics, count):
+    iterator = aiter(content)
+    while True:
+        token = _current.set(metrics)
+        try:
+            chunk = await anext(iterator, _MISSING)
+        finally:
+            _current.reset(token)
+        if chunk is _MISSING:
+            return
+        count(chunk)
+        yield chunk
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись лога одной JSON-строкой; поля из extra={"metrics": {...}}."""
+
+    def format(self, record):
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update(getattr(record, "metrics", {}))
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.REQUEST_METRICS_SAMPLE_RATE
+        self.slow_seconds = settings.REQUEST_METRICS_SLOW_MS / 1000
+        connection_created.connect(install_sql_timer, dispatch_uid=__name__)
+        for connection in connections.all(initialized_only=True):
+            install_sql_timer(connection=connection)
+        instrument_cache_backends()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    def finish(self, request, response, metrics, started):
+        """Пишет отчёт сразу или, для потокового ответа, при его закрытии."""
+        if not response.streaming:
+            self.report(request, response, metrics, perf_counter() - started)
+            return response
+        sent = 0
+        reported = False
+
+        def count(chunk):
+            nonlocal sent
+            sent += len(chunk)
+
+        def close(original=response.close):
+            nonlocal reported
+            try:
+                original()
+            finally:
+                if not reported:
+                    reported = True
+                    duration = perf_counter() - started
+                    self.report(request, response, metrics, duration, sent)
+
+        content = response.streaming_content
+        if response.is_async:
+            response.streaming_content = _ameasured(content, metrics, count)
+        else:
+            response.streaming_content = _measured(content, metrics, count)
+        response.close = close
+        return response
+
+    def report(self, request, response, metrics, duration, size=None) -> None:
+        slow = duration >= self.slow_seconds
+        if not slow and random.random() >= self.sample_rate:
+            return
+        match = request.resolver_match
+        data = {
+            "view": (match.view_name or match._func_path) if match else None,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 2),
+            "sql_count": metrics.sql_count,
+            "sql_ms": round(metrics.sql_time * 1000, 2),
+            "cache_hits": metrics.cache_hits,
+            "cache_misses": metrics.cache_misses,
+            "response_bytes": len(response.content) if size is None else size,
+            "slow": slow,
+        }
+        if slow:
+            log.warning("slow request", extra={"metrics": data})
+        else:
+            log.info("request", extra={"metrics": data})
@@ -0,0 +1,219 @@
+"""
+Производные изображения (renditions): уменьшенные и перекодированные копии
+загруженных картинок.
+
+Оригинал по-прежнему сохраняется в запросе, а копии строятся после коммита
+транзакции в пуле потоков, поэтому загрузка не ждёт Pillow. Результат
+записывается в JSONField модели:
+
+    {"source": "<имя оригинала>",
+     "sizes": {"thumb": {"name": "...", "width": 200, "height": 150}, ...}}
+
+Размеры задаёт settings.IMAGE_RENDITIONS. Модели подключаются через
+register() в AppConfig.ready(); шаблоны берут нужный размер тегом
+{% rendition %}, сериализаторы — через rendition_urls().
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models.signals import post_save
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+log = logging.getLogger(__name__)
+
+# Отправляется после записи новых копий: sender — модель, pk — объект
+renditions_ready = Signal()
+
+# (label модели, поле изображения) -> поле с копиями
+_registry = {}
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_RENDITION_WORKERS,
+                thread_name_prefix="renditions",
+            )
+    return _executor
+
+
+def rendition_name(source: str, label: str) -> str:
+    """products/1/preview/a.jpg -> products/1/preview/renditions/a_thumb.webp"""
+    directory, filename = os.path.split(source)
+    stem = os.path.splitext(filename)[0]
+    extension = settings.IMAGE_RENDITION_FORMAT.lower()
+    return f"{directory}/renditions/{stem}_{label}.{extension}"
+
+
+def render_images(file, sizes: dict) -> dict:
+    """
+    Строит копии изображения file для всех размеров sizes.
+
+    Возвращает {label: (байты, ширина, высота)}. Файл декодируется один раз,
+    копии уменьшаются от большей к меньшей с сохранением пропорций.
+    """
+    result = {}
+    with Image.open(file) as original:
+        # JPEG можно декодировать сразу в уменьшенном масштабе
+        original.draft("RGB", max(sizes.values()))
+        image = ImageOps.exif_transpose(original)
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        has_alpha = has_alpha and settings.IMAGE_RENDITION_FORMAT != "JPEG"
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        by_size = sorted(sizes.items(), key=lambda item: item[1], reverse=True)
+        for label, size in by_size:
+            image.thumbnail(size, Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            image.save(
+                buffer,
+                settings.IMAGE_RENDITION_FORMAT,
+                quality=settings.IMAGE_RENDITION_QUALITY,
+            )
+            result[label] = (buffer.getvalue(), *image.size)
+    return result
+
+
+def build_renditions(model_label: str, pk, image_field: str) -> None:
+    """Строит и сохраняет копии изображения image_field объекта pk."""
+    renditions_field = _registry[(model_label, image_field)]
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).only("pk", image_field, renditions_field)
+    instance = instance.first()
+    field_file = getattr(instance, image_field, None)
+    if not field_file:
+        return
+
+    source = field_file.name
+    storage = field_file.storage
+    with field_file.open("rb") as file:
+        images = render_images(file, settings.IMAGE_RENDITIONS)
+    sizes = {}
+    for label, (content, width, height) in images.items():
+        name = storage.save(rendition_name(source, label), ContentFile(content))
+        sizes[label] = {"name": name, "width": width, "height": height}
+
+    # Если изображение успели заменить, копии устарели: их построит новая задача
+    updated = model.objects.filter(pk=pk, **{image_field: source}).update(
+        **{renditions_field: {"source": source, "sizes": sizes}}
+    )
+    if updated:
+        delete_renditions(storage, getattr(instance, renditions_field))
+        renditions_ready.send(sender=model, pk=pk)
+    else:
+        delete_renditions(storage, {"sizes": sizes})
+
+
+def delete_renditions(storage, data) -> None:
+    for size in (data or {}).get("sizes", {}).values():
+        storage.delete(size["name"])
+
+
+def _run(model_label, pk, image_field):
+    try:
+        build_renditions(model_label, pk, image_field)
+    except Exception:
+        log.exception("Failed to build renditions for %s #%s", model_label, pk)
+    finally:
+        # соединения с БД у потоков пула свои, держать их открытыми незачем
+        connections.close_all()
+
+
+def schedule_renditions(instance, image_field: str) -> None:
+    """
+    Ставит построение копий в пул после коммита текущей транзакции.
+
+    При IMAGE_RENDITION_WORKERS = 0 копии строятся сразу в этом потоке
+    (удобно в тестах и management-командах).
+    """
+    args = (instance._meta.label, instance.pk, image_field)
+
+    def submit():
+        if settings.IMAGE_RENDITION_WORKERS:
+            get_executor().submit(_run, *args)
+        else:
+            build_renditions(*args)
+
+    transaction.on_commit(submit)
+
+
+def register(model, image_field: str, renditions_field: str) -> None:
+    """Подключает модель: копии строятся при каждой смене image_field."""
+    _registry[(model._meta.label, image_field)] = renditions_field
+
+    def handler(sender, instance, raw=False, **kwargs):
+        if raw:
+            return
+        field_file = getattr(instance, image_field)
+        data = getattr(instance, renditions_field) or {}
+        if field_file and data.get("source") != field_file.name:
+            schedule_renditions(instance, image_field)
+        elif not field_file and data:
+            # изображение удалили из формы: копии больше не нужны
+            sender.objects.filter(pk=instance.pk).update(**{renditions_field: {}})
+            setattr(instance, renditions_field, {})
+            delete_renditions(field_file.storage, data)
+
+    post_save.connect(
+        handler,
+        sender=model,
+        weak=False,
+        dispatch_uid=f"renditions:{model._meta.label}.{image_field}",
+    )
+
+
+def get_rendition(instance, image_field: str, label: str):
+    """
+    Копия размера label: {"url", "width", "height"} или None без изображения.
+
+    Пока копии не построены, отдаётся оригинал с размерами из
+    IMAGE_RENDITIONS, чтобы вёрстка не прыгала. Пустой instance (шаблон
+    подставляет "" вместо отсутствующего user.profile) тоже даёт None.
+    """
+    field_file = getattr(instance, image_field, None) if instance else None
+    if not field_file:
+        return None
+    renditions_field = _registry[(instance._meta.label, image_field)]
+    data = getattr(instance, renditions_field) or {}
+    size = data.get("sizes", {}).get(label)
+    if size is None or data.get("source") != field_file.name:
+        width, height = settings.IMAGE_RENDITIONS[label]
+        return {"url": field_file.url, "width": width, "height": height}
+    return {
+        "url": field_file.storage.url(size["name"]),
+        "width": size["width"],
+        "height": size["height"],
+    }
+
+
+def rendition_urls(instance, image_field: str, request=None) -> dict:
+    """Все построенные копии для API: {label: {"url", "width", "height"}}."""
+    field_file = getattr(instance, image_field)
+    renditions_field = _registry[(instance._meta.label, image_field)]
+    data = getattr(instance, renditions_field) or {}
+    if not field_file or data.get("source") != field_file.name:
+        return {}
+    result = {}
+    for label, size in data.get("sizes", {}).items():
+        url = field_file.storage.url(size["name"])
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        result[label] = {
+            "url": url,
+            "width": size["width"],
+            "height": size["height"],
+        }
+    return result
@@ -77,6 +77,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # первой: время запроса включает все остальные middleware
+    "mysite.metrics.RequestMetricsMiddleware",
     # "django.middleware.cache.UpdateCacheMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
@@ -105,6 +107,9 @@ TEMPLATES = [
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
             ],
+            "libraries": {
+                "renditions": "mysite.templatetags.renditions",
+            },
         },
     },
 ]
@@ -117,19 +122,44 @@ WSGI_APPLICATION = "mysite.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": DATABASE_DIR / "db.sqlite3",
+        "NAME": getenv("DJANGO_DATABASE_NAME", DATABASE_DIR / "db.sqlite3"),
     }
 }
 
+# default — LRU в памяти процесса перед общим файловым кешем "shared"
+# (mysite.cache_backends: TwoTierCache и ShardedDiskCache)
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "BACKEND": "mysite.cache_backends.TwoTierCache",
+        "LOCATION": "shared",
+        "OPTIONS": {
+            # фрагменты списков ({% cache %} на каждый товар и заказ) —
+            # тысячи мелких ключей на страницу
+            "L1_MAX_ENTRIES": 20_000,
+            "L1_MAX_BYTES": 64 * 1024 * 1024,
+            # сколько секунд воркер может видеть ключ без поколения,
+            # удалённый или перезаписанный в другом воркере
+            "L1_TIMEOUT": 5,
+        },
+    },
+    "shared": {
+        "BACKEND": "mysite.cache_backends.ShardedDiskCache",
         "LOCATION": "/var/tmp/django_cache",
-    }
+        # вытеснение идёт по индексу и не зависит от числа записей
+        "OPTIONS": {"MAX_ENTRIES": 200_000},
+    },
 }
 
 CACHE_MIDDLEWARE_SECONDS = 200
 
+# TTL для кешей с поколениями (mysite.caching): они инвалидируются при записи,
+# поэтому могут жить долго
+CACHE_LONG_TIMEOUT = 60 * 60 * 24
+
+# Сколько секунд после истечения TTL get_or_compute() (mysite.caching) ещё
+# отдаёт прежнее значение, пока его пересчитывает другой запрос
+CACHE_STALE_TIMEOUT = 60 * 5
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -178,6 +208,22 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "uploads"
 
+# Sitemap, собранный в файлы командой build_sitemaps (mysite.sitemaps)
+SITEMAP_ROOT = BASE_DIR / "sitemaps"
+SITEMAP_SECTION_SIZE = 10_000
+SITEMAP_BASE_URL = getenv("DJANGO_SITEMAP_BASE_URL", "http://127.0.0.1:8000")
+
+# Уменьшенные копии загруженных изображений (mysite.renditions):
+# имя размера -> вписать в (ширина, высота)
+IMAGE_RENDITIONS = {
+    "thumb": (200, 200),
+    "medium": (500, 500),
+}
+IMAGE_RENDITION_FORMAT = "WEBP"
+IMAGE_RENDITION_QUALITY = 80
+# 0 — строить копии синхронно после коммита, без пула потоков
+IMAGE_RENDITION_WORKERS = int(getenv("DJANGO_IMAGE_RENDITION_WORKERS", "2"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
@@ -201,6 +247,12 @@ SPECTACULAR_SETTINGS = {
     "SERVE_INCLUDE_SCHEMA": False,
 }
 
+# Метрики запросов (mysite.metrics): JSON-строка в лог mysite.metrics на
+# долю SAMPLE_RATE запросов и на каждый запрос дольше SLOW_MS
+REQUEST_METRICS_ENABLED = getenv("DJANGO_REQUEST_METRICS", "0") == "1"
+REQUEST_METRICS_SAMPLE_RATE = float(getenv("DJANGO_REQUEST_METRICS_SAMPLE_RATE", "0.1"))
+REQUEST_METRICS_SLOW_MS = float(getenv("DJANGO_REQUEST_METRICS_SLOW_MS", "500"))
+
 LOGFILE_NAME = BASE_DIR / "log.txt"
 LOGFILE_SIZE = 5 * 1024 * 1024
 LOGFILE_COUNT = 3
@@ -212,6 +264,9 @@ LOGGING = {
         "verbose": {
             "format": "%(name)s %(levelname)s %(asctime)s %(module)s %(message)s ",
         },
+        "json": {
+            "()": "mysite.metrics.JsonFormatter",
+        },
     },
     "handlers": {
         "console": {
@@ -225,8 +280,22 @@ LOGGING = {
             "backupCount": LOGFILE_COUNT,
             "formatter": "verbose",
         },
+        "metrics": {
+            "class": "logging.StreamHandler",
+            "stream": "ext://sys.stdout",
+            "formatter": "json",
+        },
     },
     "root": {"handlers": ["console", "logfile"], "level": "DEBUG"},
+    "loggers": {
+        "mysite.metrics": {
+            "handlers": ["metrics"],
+            "level": "INFO",
+            "propagate": False,
+        },
+        # Pillow пишет в DEBUG каждый чанк декодируемого изображения
+        "PIL": {"level": "INFO"},
+    },
 }
 
 LOGLEVEL = os.getenv("LOGLEVEL", "INFO")
@@ -1,3 +1,27 @@
+"""
+Sitemap сайта: индекс и секции фиксированного размера, собранные в файлы.
+
+Каждая секция — диапазон pk шириной SITEMAP_SECTION_SIZE одной карты из
+sitemaps, поэтому удаление или добавление строки меняет только свою секцию.
+Команда build_sitemaps считает отпечатки всех секций одним GROUP BY на
+карту (число строк, сумма pk, последний lastmod) и перезаписывает только
+файлы секций, у которых отпечаток изменился. Запросы краулеров
+обслуживаются чтением готовых файлов без обращений к БД.
+"""
+
+import json
+import os
+from datetime import datetime
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.sitemaps.views import SitemapIndexItem, sitemap
+from django.db.models import Count, F, Max, Sum
+from django.http import FileResponse, Http404
+from django.template.loader import render_to_string
+from django.utils import timezone, translation
+
 from blogapp.sitemap import BlogSitemap
 from shopapp.sitemap import ProductSitemap
 
@@ -5,3 +29,157 @@ sitemaps = {
     "blog": BlogSitemap,
     "shopapp": ProductSitemap,
 }
+
+INDEX_FILE = "sitemap.xml"
+MANIFEST_FILE = "manifest.json"
+
+
+def section_file(name: str, bucket: int) -> str:
+    return f"sitemap-{name}-{bucket}.xml"
+
+
+def section_fingerprints(site) -> dict:
+    """
+    {номер секции: отпечаток} для карты site одним запросом.
+
+    Отпечаток меняется при добавлении, удалении или скрытии строки (count,
+    сумма pk) и при сдвиге её lastmod_field вперёд.
+    """
+    size = settings.SITEMAP_SECTION_SIZE
+    rows = (
+        site.items()
+        .order_by()
+        .annotate(bucket=F("pk") / size)
+        .values("bucket")
+        .annotate(
+            count=Count("pk"),
+            pk_sum=Sum("pk"),
+            lastmod=Max(site.lastmod_field),
+        )
+    )
+    return {
+        row["bucket"]: [
+            row["count"],
+            row["pk_sum"],
+            row["lastmod"].isoformat() if row["lastmod"] else None,
+        ]
+        for row in rows
+    }
+
+
+def _write(path, content: str) -> None:
+    # запись через временный файл: краулер не увидит наполовину записанный XML
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as file:
+        file.write(content)
+    os.replace(tmp, path)
+
+
+def _site_for(base_url: str):
+    parts = urlsplit(base_url)
+    return parts.scheme or "https", SimpleNamespace(
+        domain=parts.netloc, name=parts.netloc
+    )
+
+
+def render_section(site, bucket: int, protocol, domain_site):
+    """XML секции bucket и её последний lastmod."""
+    size = settings.SITEMAP_SECTION_SIZE
+    items = site.items().filter(pk__gte=bucket * size, pk__lt=(bucket + 1) * size)
+    # get_urls() берёт строки из items(): подменяем их строками секции
+    site.items = lambda: items
+    urls = site.get_urls(site=domain_site, protocol=protocol)
+    lastmod = max((url["lastmod"] for url in urls if url["lastmod"]), default=None)
+    return render_to_string("sitemap.xml", {"urlset": urls}), lastmod
+
+
+def build_sitemaps(root=None, base_url=None, force: bool = False) -> dict:
+    """
+    Пересобирает изменившиеся секции и индекс в каталоге root.
+
+    Возвращает статистику {"written", "unchanged", "removed"}.
+    """
+    root = root or settings.SITEMAP_ROOT
+    base_url = (base_url or settings.SITEMAP_BASE_URL).rstrip("/")
+    os.makedirs(root, exist_ok=True)
+    manifest_path = os.path.join(root, MANIFEST_FILE)
+    try:
+        with open(manifest_path, encoding="utf-8") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        manifest = {}
+    old_sections = manifest.get("sections", {})
+    if force or manifest.get("section_size") != settings.SITEMAP_SECTION_SIZE:
+        old_sections = {}
+
+    protocol, domain_site = _site_for(base_url)
+    stats = {"written": 0, "unchanged": 0, "removed": 0}
+    sections = {}
+    with translation.override(settings.LANGUAGE_CODE):
+        for name, site_class in sitemaps.items():
+            for bucket, fingerprint in sorted(
+                section_fingerprints(site_class()).items()
+            ):
+                filename = section_file(name, bucket)
+                old = old_sections.get(filename)
+                if old and old["fingerprint"] == fingerprint:
+                    sections[filename] = old
+                    stats["unchanged"] += 1
+                    continue
+                xml, lastmod = render_section(
+                    site_class(), bucket, protocol, domain_site
+                )
+                _write(os.path.join(root, filename), xml)
+                sections[filename] = {
+                    "fingerprint": fingerprint,
+                    "lastmod": lastmod.isoformat() if lastmod else None,
+                }
+                stats["written"] += 1
+
+    for filename in set(old_sections) - set(sections):
+        try:
+            os.remove(os.path.join(root, filename))
+        except FileNotFoundError:
+            pass
+        stats["removed"] += 1
+
+    index = [
+        SitemapIndexItem(
+            f"{base_url}/{filename}",
+            section["lastmod"] and datetime.fromisoformat(section["lastmod"]),
+        )
+        for filename, section in sorted(sections.items())
+    ]
+    _write(
+        os.path.join(root, INDEX_FILE),
+        render_to_string("sitemap_index.xml", {"sitemaps": index}),
+    )
+    manifest = {
+        "section_size": settings.SITEMAP_SECTION_SIZE,
+        "generated_at": timezone.now().isoformat(),
+        "sections": sections,
+    }
+    _write(manifest_path, json.dumps(manifest, indent=2))
+    return stats
+
+
+def _serve(filename: str):
+    path = os.path.join(settings.SITEMAP_ROOT, filename)
+    if not os.path.isfile(path):
+        return None
+    return FileResponse(open(path, "rb"), content_type="application/xml")
+
+
+def sitemap_index(request):
+    """Готовый индекс; пока build_sitemaps ни разу не запускался — старый sitemap."""
+    response = _serve(INDEX_FILE)
+    if response is None:
+        return sitemap(request, sitemaps=sitemaps)
+    return response
+
+
+def sitemap_section(request, name: str, bucket: int):
+    response = _serve(section_file(name, bucket))
+    if response is None:
+        raise Http404("No such sitemap section")
+    return response
@@ -0,0 +1,14 @@
+from django import template
+
+from mysite.renditions import get_rendition
+
+register = template.Library()
+
+
+@register.simple_tag
+def rendition(instance, image_field, label):
+    """
+    {% rendition product "preview" "thumb" as preview %} — уменьшенная копия
+    изображения: словарь url/width/height или None, если изображения нет.
+    """
+    return get_rendition(instance, image_field, label)
@@ -0,0 +1,99 @@
+"""
+Бюджеты SQL-запросов для view: защита от N+1 в тестах.
+
+QueryBudgetMixin подмешивается к TestCase приложения. Подкласс объявляет
+query_budgets — список ViewBudget для каждого URL — и add_rows(count),
+который добавляет count строк всех видов, что выводят эти view.
+test_query_budgets открывает каждый URL на малом наборе данных, доращивает
+его до большого и открывает снова: число запросов не должно меняться
+вместе с числом строк и не должно превышать объявленный бюджет.
+
+Кеш перед каждым запросом очищается, так что меряется холодный путь;
+весь класс работает на LocMemCache (LOCMEM_CACHES), а не на общем кеше
+сайта. Тем же словарём через override_settings(CACHES=LOCMEM_CACHES)
+пользуются тесты приложений, которые чистят кеш.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import translation
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+@dataclass(frozen=True)
+class ViewBudget:
+    """Бюджет одного URL: не больше budget SQL-запросов на запрос."""
+
+    name: str
+    budget: int
+    # test -> kwargs для reverse(), когда URL ссылается на объект
+    kwargs: Optional[Callable] = None
+    query: str = ""
+    status: int = 200
+
+    def url(self, test) -> str:
+        with translation.override("en"):
+            url = reverse(self.name, kwargs=self.kwargs(test) if self.kwargs else None)
+        return f"{url}?{self.query}" if self.query else url
+
+
+async def _aconsume(content) -> None:
+    async for _ in content:
+        pass
+
+
+class QueryBudgetMixin:
+    query_budgets = ()
+    small_rows = 2
+    large_rows = 12
+    # пользователь, от имени которого открываются страницы (None — аноним)
+    budget_user = None
+
+    @classmethod
+    def setUpClass(cls):
+        # до super(): setUpTestData и сигналы моделей уже пишут в кеш
+        cls.enterClassContext(override_settings(CACHES=LOCMEM_CACHES))
+        super().setUpClass()
+
+    def add_rows(self, count: int) -> None:
+        raise NotImplementedError
+
+    def count_view_queries(self, view: ViewBudget) -> int:
+        cache.clear()
+        url = view.url(self)
+        # вход перед каждым запросом: logout и подобные view сбрасывают сессию
+        if self.budget_user is not None:
+            self.client.force_login(self.budget_user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+            if response.streaming and response.is_async:
+                async_to_sync(_aconsume)(response.streaming_content)
+            elif response.streaming:
+                for _ in response.streaming_content:
+                    pass
+        self.assertEqual(response.status_code, view.status, url)
+        return len(context.captured_queries)
+
+    def test_query_budgets(self):
+        self.add_rows(self.small_rows)
+        small = [self.count_view_queries(view) for view in self.query_budgets]
+        self.add_rows(self.large_rows - self.small_rows)
+        for view, expected in zip(self.query_budgets, small):
+            with self.subTest(view=view.name, query=view.query):
+                count = self.count_view_queries(view)
+                self.assertEqual(
+                    count, expected, f"{view.name}: queries grow with row count"
+                )
+                self.assertLessEqual(
+                    count, view.budget, f"{view.name}: over the query budget"
+                )
@@ -25,16 +25,15 @@ from drf_spectacular.views import (
     SpectacularRedocView,
     SpectacularSwaggerView,
 )
-from django.contrib.sitemaps.views import sitemap
-from .sitemaps import sitemaps
+from .sitemaps import sitemap_index, sitemap_section
 
 urlpatterns = [
     path("api/", include("myapiapp.urls")),
+    path("sitemap.xml", sitemap_index, name="django.contrib.sitemaps.views"),
     path(
-        "sitemap.xml",
-        sitemap,
-        {"sitemaps": sitemaps},
-        name="django.contrib.sitemaps.views",
+        "sitemap-<slug:name>-<int:bucket>.xml",
+        sitemap_section,
+        name="sitemap-section",
     ),
 ]
 
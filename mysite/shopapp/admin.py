@@ -1,14 +1,19 @@
-import csv
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import connections
 from django.db.models import QuerySet
+from django.db.models.functions import Now
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import render, redirect
 from django.urls import path
 
-from .command import save_csv_products
-from .models import Product, Order, ProductImage
+from mysite.caching import bump_generation
+
+from .command import save_csv_orders, save_csv_products
+from .jobs import enqueue, store_upload
+from .models import Job, Product, Order, ProductImage
 from .admin_mixins import ExportAsCSVMixin
 from .forms import CSVImportForm
+from .search import fts_available, search_products
 
 
 class OrderInline(admin.TabularInline):
@@ -23,14 +28,58 @@ class ProductInline(admin.StackedInline):
 def mark_archived(
     modeladmin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet
 ):
-    queryset.update(archived=True)
+    queryset.update(archived=True, updated_at=Now())
+    # update() не шлёт post_save, поэтому кеши товаров сбрасываем явно
+    bump_generation("products")
 
 
 @admin.action(description="Unarchive products")
 def mark_unarchived(
     modeladmin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet
 ):
-    queryset.update(archived=False)
+    queryset.update(archived=False, updated_at=Now())
+    bump_generation("products")
+
+
+def message_import_report(
+    modeladmin: admin.ModelAdmin, request: HttpRequest, report, noun: str
+):
+    """Показывает итоги импорта CSV и первые ошибки строк в админке."""
+    modeladmin.message_user(
+        request,
+        f"Imported {report.created} of {report.rows} {noun} "
+        f"in {report.elapsed:.1f} s.",
+    )
+    problems = report.errors + report.warnings
+    for problem in problems[:10]:
+        modeladmin.message_user(
+            request,
+            f"Line {problem['line']}: {problem['errors']}",
+            messages.WARNING,
+        )
+    if len(problems) > 10:
+        modeladmin.message_user(
+            request,
+            f"...and {len(problems) - 10} more problems.",
+            messages.WARNING,
+        )
+
+
+def import_csv_in_background(
+    modeladmin: admin.ModelAdmin, request: HttpRequest, form, kind: str
+):
+    """Ставит импорт в очередь runworker вместо выполнения в запросе."""
+    job = enqueue(
+        kind,
+        {
+            "file": store_upload(form.cleaned_data["csv_file"]),
+            "encoding": request.encoding,
+        },
+        user=request.user,
+    )
+    modeladmin.message_user(
+        request, f"Import queued as job #{job.pk}; it runs in the runworker command."
+    )
 
 
 @admin.register(Product)
@@ -78,6 +127,13 @@ class ProductAdmin(admin.ModelAdmin, ExportAsCSVMixin):
         ),
     ]
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск в админке через FTS5-индекс вместо LIKE по всем строкам."""
+        terms = search_term.split()
+        if not terms or not fts_available(connections[queryset.db]):
+            return super().get_search_results(request, queryset, search_term)
+        return search_products(queryset, terms), False
+
     def description_short(self, obj: Product) -> str:
         if len(obj.description) < 48:
             return obj.description
@@ -93,8 +149,13 @@ class ProductAdmin(admin.ModelAdmin, ExportAsCSVMixin):
             context = {"form": form}
             return render(request, "admin/csv_form.html", context, status=400)
 
-        save_csv_products(file=form.files["csv_file"].file, encoding=request.encoding)
-        self.message_user(request, "Successfully imported products.")
+        if form.cleaned_data["run_in_background"]:
+            import_csv_in_background(self, request, form, "import_products_csv")
+            return redirect("..")
+        report = save_csv_products(
+            file=form.files["csv_file"].file, encoding=request.encoding
+        )
+        message_import_report(self, request, report, "products")
         return redirect("..")
 
     def get_urls(self):
@@ -116,7 +177,14 @@ class ProductInline(admin.StackedInline):
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     change_list_template = "admin/orders_changelist.html"
-    list_display = ("delivery_address", "promocode", "created_at", "user_verbose")
+    list_display = (
+        "delivery_address",
+        "promocode",
+        "created_at",
+        "user_verbose",
+        "products_count",
+        "total",
+    )
 
     def get_queryset(self, request):
         return Order.objects.select_related("user").prefetch_related("products")
@@ -136,34 +204,13 @@ class OrderAdmin(admin.ModelAdmin):
             context = {"form": form, "title": "Error importing orders in form"}
             return render(request, "admin/csv_form.html", context, status=400)
 
-        csv_file = form.cleaned_data["csv_file"]
-        decoded_file = csv_file.read().decode("utf-8").splitlines()
-        reader = csv.DictReader(decoded_file)
-
-        created_count = 0
-        for row in reader:
-            # ожидаем, что CSV содержит поля: user_id, delivery_address, promocode, product_ids
-            user_id = row.get("user_id")
-            delivery_address = row.get("delivery_address", "")
-            promocode = row.get("promocode", "")
-            product_ids = row.get("product_ids", "")
-
-            order = Order.objects.create(
-                user_id=user_id,
-                delivery_address=delivery_address,
-                promocode=promocode,
-            )
-
-            if product_ids:
-                ids = [
-                    int(pid.strip()) for pid in product_ids.split(",") if pid.strip()
-                ]
-                products = Product.objects.filter(id__in=ids)
-                order.products.set(products)
-
-            created_count += 1
-
-        self.message_user(request, f"Success import {created_count} orders.")
+        if form.cleaned_data["run_in_background"]:
+            import_csv_in_background(self, request, form, "import_orders_csv")
+            return redirect("..")
+        report = save_csv_orders(
+            file=form.files["csv_file"].file, encoding=request.encoding
+        )
+        message_import_report(self, request, report, "orders")
         return redirect("..")
 
     def get_urls(self):
@@ -172,3 +219,14 @@ class OrderAdmin(admin.ModelAdmin):
             path("import-orders-csv/", self.import_csv, name="import_orders_csv"),
         ]
         return new_urls + urls
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("pk", "kind", "status", "progress", "attempts", "created_at")
+    list_filter = ("status", "kind")
+    readonly_fields = [field.name for field in Job._meta.fields]
+
+    def has_add_permission(self, request):
+        # задачи создаются только кодом через shopapp.jobs.enqueue
+        return False
@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class ShopappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shopapp'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from mysite.renditions import register
+
+        from . import signals  # noqa: F401
+        from .models import Product, ProductImage
+        from .search import ensure_fts_triggers
+
+        post_migrate.connect(ensure_fts_triggers, sender=self)
+        register(Product, "preview", "preview_renditions")
+        register(ProductImage, "image", "renditions")
@@ -0,0 +1,177 @@
+"""Вспомогательные функции для management-команд с бенчмарками магазина."""
+
+import os
+import resource
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils.module_loading import import_string
+
+from mysite.cache_backends import ShardedDiskCache, TwoTierCache
+
+from .models import Order, Product
+from .totals import refresh_order_totals
+
+
+def temporary_caches_settings(directory) -> dict:
+    """
+    CACHES с теми же бэкендами, но без общего с сайтом хранилища.
+
+    Дисковые кеши переезжают в directory, TwoTierCache и кеши в памяти
+    процесса остаются как есть, внешние серверы заменяются LocMemCache.
+    """
+    temporary = {}
+    for alias, config in settings.CACHES.items():
+        backend = import_string(config["BACKEND"])
+        if issubclass(backend, (FileBasedCache, ShardedDiskCache)):
+            config = {**config, "LOCATION": os.path.join(directory, alias)}
+        elif not issubclass(backend, (TwoTierCache, LocMemCache, DummyCache)):
+            config = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        temporary[alias] = config
+    return temporary
+
+
+def _clear_caches() -> None:
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+@contextmanager
+def temporary_database():
+    """
+    Переключает соединение на временную файловую SQLite БД с миграциями,
+    а кеши — на временный каталог (temporary_caches_settings).
+
+    Бенчмарки создают сотни тысяч строк, поэтому рабочая БД не трогается,
+    а временная удаляется при выходе из контекста. Кеш тоже свой: иначе
+    поколения и значения из временной БД (товары, истории заказов) попали
+    бы в общий кеш сайта.
+    """
+    old_name = connection.settings_dict["NAME"]
+    fd, path = tempfile.mkstemp(prefix="bench-", suffix=".sqlite3")
+    os.close(fd)
+    cache_directory = tempfile.mkdtemp(prefix="bench-cache-")
+    connection.settings_dict.setdefault("TEST", {})["NAME"] = path
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with override_settings(CACHES=temporary_caches_settings(cache_directory)):
+            # L1 TwoTierCache и LocMemCache живут в памяти процесса
+            # и могут хранить значения из рабочей БД
+            _clear_caches()
+            try:
+                yield path
+            finally:
+                _clear_caches()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(cache_directory, ignore_errors=True)
+
+
+def current_rss() -> int:
+    """Текущий resident set size процесса в байтах."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Не Linux: доступен только пиковый RSS (в КиБ на Linux/BSD)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakRSS:
+    """
+    Замеряет пиковый прирост RSS за время блока.
+
+    RSS опрашивается в фоновом потоке каждые interval секунд, поэтому
+    подходит для кода, в который нельзя встроить свои замеры.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.delta = 0
+
+    def __enter__(self):
+        self.baseline = self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+        self.delta = self.peak - self.baseline
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+
+def seed_products(count: int, start: int = 0, batch_size: int = 5000) -> None:
+    """Быстро создаёт count товаров через bulk_create порциями по batch_size."""
+    for offset in range(start, start + count, batch_size):
+        Product.objects.bulk_create(
+            Product(
+                name=f"Product {i}",
+                description=f"Benchmark product number {i}",
+                price=Decimal(i % 10_000) + Decimal("0.99"),
+                discount=i % 50,
+            )
+            for i in range(offset, min(offset + batch_size, start + count))
+        )
+
+
+def seed_users(count: int, prefix: str = "bench") -> list:
+    """Создаёт count пользователей без пароля (вход только через force_login)."""
+    return User.objects.bulk_create(
+        User(username=f"{prefix}-{i}", password="!") for i in range(count)
+    )
+
+
+def seed_orders(
+    count: int, users, rng, products_per_order: int = 3, batch_size: int = 5000
+) -> None:
+    """
+    Создаёт count заказов случайных users со случайными товарами.
+
+    Заказы и строки связи вставляются bulk_create порциями, итоги заказов
+    пересчитываются одним UPDATE на порцию.
+    """
+    product_ids = list(Product.objects.values_list("pk", flat=True))
+    Through = Order.products.through
+    for offset in range(0, count, batch_size):
+        orders = Order.objects.bulk_create(
+            Order(user=rng.choice(users), delivery_address=f"Street {i}")
+            for i in range(offset, min(offset + batch_size, count))
+        )
+        Through.objects.bulk_create(
+            Through(order_id=order.pk, product_id=product_id)
+            for order in orders
+            for product_id in rng.sample(
+                product_ids, min(products_per_order, len(product_ids))
+            )
+        )
+        refresh_order_totals(Order.objects.filter(pk__in=[o.pk for o in orders]))
+
+
+class Timer:
+    """Контекстный менеджер для замера времени выполнения блока."""
+
+    def __enter__(self):
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = perf_counter() - self.started
@@ -1,14 +1,280 @@
-from csv import DictReader
+from csv import DictReader, writer as csv_writer
 from io import TextIOWrapper
+from time import perf_counter
 
-from .models import Product
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import transaction
 
+from mysite.caching import bump_generation
 
-def save_csv_products(file, encoding):
-    csv_file = TextIOWrapper(file, encoding)
+from .models import Order, Product
+from .order_history import HISTORY_GROUP
+from .totals import refresh_order_totals
+
+
+PRODUCT_CSV_FIELDS = ("name", "description", "price", "discount")
+PRODUCT_CSV_IMPORT_FIELDS = {*PRODUCT_CSV_FIELDS, "archived"}
+# Без этих колонок каждая строка создала бы товар с пустым значением
+PRODUCT_CSV_REQUIRED_FIELDS = {"name"}
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: write() возвращает строку, а не пишет её."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv_products(queryset, fields=PRODUCT_CSV_FIELDS, chunk_size=2000):
+    """
+    Генерирует CSV с товарами из queryset порциями по chunk_size строк.
+
+    Заголовок отдаётся сразу, строки читаются из БД через values_list().iterator(),
+    поэтому в памяти одновременно находится не больше одной порции.
+    """
+    writer = csv_writer(Echo())
+    yield writer.writerow(fields)
+
+    lines = []
+    for row in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        lines.append(writer.writerow(row))
+        if len(lines) >= chunk_size:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+class ImportReport:
+    """Итоги импорта CSV: число строк, созданных объектов, ошибки по строкам."""
+
+    def __init__(self, max_errors=1000):
+        self.max_errors = max_errors
+        self.rows = 0
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.warnings = []
+        self.elapsed = 0.0
+
+    def add_error(self, line, errors):
+        """Запоминает ошибку строки; сохраняется не больше max_errors штук."""
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "errors": errors})
+
+    def add_warning(self, line, errors):
+        """Запоминает проблему строки, которая всё же была импортирована."""
+        if len(self.warnings) < self.max_errors:
+            self.warnings.append({"line": line, "errors": errors})
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "failed": self.failed,
+            "errors": self.errors,
+            "warnings": self.warnings,
+            "elapsed": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+        }
+
+
+def clean_csv_row(model, row):
+    """
+    Приводит и проверяет значения строки CSV через поля модели.
+
+    Пустое значение у поля с default заменяется значением по умолчанию.
+    Возвращает (kwargs для модели, словарь ошибок по полям).
+    """
+    values, errors = {}, {}
+    for name, raw in row.items():
+        if name is None:
+            # DictReader складывает лишние значения под ключ None
+            errors["row"] = ["Row has more values than the header."]
+            continue
+        field = model._meta.get_field(name)
+        if raw in ("", None) and field.has_default():
+            values[name] = field.get_default()
+            continue
+        try:
+            values[name] = field.clean(raw, None)
+        except ValidationError as exc:
+            errors[name] = exc.messages
+    return values, errors
+
+
+def save_csv_products(
+    file, encoding, batch_size=1000, max_errors=1000, progress=None
+):
+    """
+    Импортирует товары из CSV-файла и возвращает ImportReport.
+
+    Файл читается потоково, каждая строка проверяется полями модели Product,
+    корректные строки вставляются пачками по batch_size, каждая пачка в своей
+    транзакции. Ошибочные строки пропускаются и попадают в отчёт с номером строки.
+    Заголовок с неизвестными колонками или без обязательных отклоняется целиком;
+    пустой файл даёт пустой отчёт. progress(report) вызывается после каждой пачки.
+    """
+    started = perf_counter()
+    report = ImportReport(max_errors=max_errors)
+    csv_file = TextIOWrapper(file, encoding or "utf-8", newline="")
     reader = DictReader(csv_file)
 
-    products = [Product(**row) for row in reader]
+    header = set(reader.fieldnames or ())
+    unknown = header - PRODUCT_CSV_IMPORT_FIELDS
+    # в файле без единой строки нечего проверять
+    missing = PRODUCT_CSV_REQUIRED_FIELDS - header if header else set()
+    messages = []
+    if unknown:
+        messages.append(f"Unknown columns: {', '.join(sorted(unknown))}")
+    if missing:
+        messages.append(f"Missing columns: {', '.join(sorted(missing))}")
+    if messages:
+        report.add_error(1, {"header": messages})
+        report.elapsed = perf_counter() - started
+        return report
+
+    batch = []
+    for row in reader:
+        report.rows += 1
+        values, errors = clean_csv_row(Product, row)
+        if errors:
+            report.add_error(reader.line_num, errors)
+            continue
+        batch.append(Product(**values))
+        if len(batch) >= batch_size:
+            report.created += _insert_products(batch, batch_size)
+            batch = []
+            if progress:
+                progress(report)
+    if batch:
+        report.created += _insert_products(batch, batch_size)
+    if report.created:
+        # bulk_create не шлёт post_save
+        bump_generation("products")
+
+    report.elapsed = perf_counter() - started
+    return report
+
+
+def _insert_products(products, batch_size):
+    with transaction.atomic():
+        Product.objects.bulk_create(products, batch_size=batch_size)
+    return len(products)
+
+
+# Ограничение на число параметров в одном запросе для SQLite
+ID_LOOKUP_CHUNK = 900
+
+
+def _existing_ids(model, ids):
+    """Возвращает множество pk из ids, которые есть в БД, за len(ids)/900 запросов."""
+    ids = list(ids)
+    found = set()
+    for start in range(0, len(ids), ID_LOOKUP_CHUNK):
+        chunk = ids[start : start + ID_LOOKUP_CHUNK]
+        queryset = model.objects.filter(pk__in=chunk).order_by()
+        found.update(queryset.values_list("pk", flat=True))
+    return found
+
+
+def _parse_ids(value):
+    """'1, 2,3' -> [1, 2, 3] без повторов; ValueError при нечисловых значениях."""
+    ids = [int(part) for part in value.split(",") if part.strip()]
+    return list(dict.fromkeys(ids))
+
+
+def save_csv_orders(file, encoding, batch_size=1000, max_errors=1000, progress=None):
+    """
+    Импортирует заказы из CSV и возвращает ImportReport.
+
+    Ожидаемые колонки: user_id, delivery_address, promocode, product_ids
+    (id товаров через запятую). Строки обрабатываются пачками по batch_size:
+    на пачку приходится несколько запросов для проверки id пользователей и
+    товаров, один bulk_create заказов и один bulk_create строк Order.products.
+    Заказ с неизвестным пользователем пропускается, неизвестные товары
+    отбрасываются и попадают в warnings отчёта. progress(report) вызывается
+    после каждой пачки.
+    """
+    started = perf_counter()
+    report = ImportReport(max_errors=max_errors)
+    csv_file = TextIOWrapper(file, encoding or "utf-8", newline="")
+    reader = DictReader(csv_file)
+
+    batch = []
+    for row in reader:
+        report.rows += 1
+        values, errors = clean_csv_row(
+            Order,
+            {
+                "delivery_address": row.get("delivery_address") or "",
+                "promocode": row.get("promocode") or "",
+            },
+        )
+        try:
+            user_id = int(row.get("user_id") or "")
+        except ValueError:
+            errors["user_id"] = ["Enter a whole number."]
+        try:
+            product_ids = _parse_ids(row.get("product_ids") or "")
+        except ValueError:
+            errors["product_ids"] = ["Enter comma separated whole numbers."]
+        if errors:
+            report.add_error(reader.line_num, errors)
+            continue
+
+        batch.append((reader.line_num, user_id, values, product_ids))
+        if len(batch) >= batch_size:
+            _insert_orders(batch, report)
+            batch = []
+            if progress:
+                progress(report)
+    if batch:
+        _insert_orders(batch, report)
+    if report.created:
+        # снимки истории заказов перестраиваются при следующем обращении
+        bump_generation("orders", HISTORY_GROUP)
+
+    report.elapsed = perf_counter() - started
+    return report
+
+
+def _insert_orders(batch, report):
+    users = _existing_ids(User, {user_id for _, user_id, _, _ in batch})
+    products = _existing_ids(
+        Product, {pk for _, _, _, product_ids in batch for pk in product_ids}
+    )
+
+    orders, order_products = [], []
+    for line, user_id, values, product_ids in batch:
+        if user_id not in users:
+            report.add_error(line, {"user_id": [f"Unknown user id {user_id}."]})
+            continue
+        unknown = [pk for pk in product_ids if pk not in products]
+        if unknown:
+            message = f"Unknown product ids: {', '.join(map(str, unknown))}."
+            report.add_warning(line, {"product_ids": [message]})
+        orders.append(Order(user_id=user_id, **values))
+        order_products.append([pk for pk in product_ids if pk in products])
 
-    Product.objects.bulk_create(products)
-    return products
+    through = Order.products.through
+    with transaction.atomic():
+        Order.objects.bulk_create(orders)
+        through.objects.bulk_create(
+            through(order_id=order.pk, product_id=product_id)
+            for order, product_ids in zip(orders, order_products)
+            for product_id in product_ids
+        )
+        # bulk_create строк M2M не шлёт m2m_changed, итоги считаем сами;
+        # у заказов без товаров остаются нули по умолчанию
+        pks = [order.pk for order, ids in zip(orders, order_products) if ids]
+        for start in range(0, len(pks), ID_LOOKUP_CHUNK):
+            chunk = pks[start : start + ID_LOOKUP_CHUNK]
+            refresh_order_totals(Order.objects.filter(pk__in=chunk))
+    report.created += len(orders)
@@ -0,0 +1,24 @@
+from django.db import models
+from django_filters import NumberFilter
+from django_filters.rest_framework import FilterSet
+
+from .models import Product
+
+
+class ProductFilter(FilterSet):
+    """Фильтры API товаров, включая диапазон цены со скидкой."""
+
+    class Meta:
+        model = Product
+        fields = {
+            "name": ["exact"],
+            "description": ["exact"],
+            "price": ["exact"],
+            "discount": ["exact"],
+            "archived": ["exact"],
+            "discount_price": ["exact", "gte", "lte"],
+        }
+        # django-filter не знает GeneratedField; discount_price — число
+        filter_overrides = {
+            models.GeneratedField: {"filter_class": NumberFilter},
+        }
@@ -45,3 +45,7 @@ class OrderForm(forms.ModelForm):
 
 class CSVImportForm(forms.Form):
     csv_file = forms.FileField()
+    run_in_background = forms.BooleanField(
+        required=False,
+        help_text="Import with the runworker command instead of this request",
+    )
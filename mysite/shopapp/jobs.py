@@ -0,0 +1,273 @@
+"""
+Фоновые задачи на таблице shopapp.Job без внешнего брокера.
+
+Запрос ставит задачу в очередь через enqueue() и сразу отвечает 202,
+а команда runworker забирает задачи из БД и выполняет их обработчики
+в пуле потоков или процессов. Обработчик регистрируется декоратором
+@job_handler("kind") и получает JobContext: payload и report_progress().
+"""
+
+import logging
+import os
+import socket
+import tempfile
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .command import iter_csv_products, save_csv_orders, save_csv_products
+from .models import Job, Product
+
+log = logging.getLogger(__name__)
+
+# kind -> (обработчик, число попыток по умолчанию)
+HANDLERS = {}
+
+# Задержка перед повтором: RETRY_DELAY * 2 ** (попытка - 1)
+RETRY_DELAY = timedelta(seconds=10)
+# Задача в статусе running без heartbeat дольше этого срока считается
+# брошенной (воркер убит) и возвращается в очередь
+STALE_AFTER = timedelta(minutes=10)
+# Прогресс пишется в БД не чаще, чем раз в столько секунд
+PROGRESS_INTERVAL = 1.0
+
+
+def job_handler(kind: str, max_attempts: int = 3):
+    """Регистрирует функцию handler(context) как обработчик задач kind."""
+
+    def decorator(func):
+        HANDLERS[kind] = (func, max_attempts)
+        return func
+
+    return decorator
+
+
+def enqueue(kind: str, payload=None, user=None, max_attempts=None) -> Job:
+    """Ставит задачу в очередь; воркер начнёт её после коммита транзакции."""
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    return Job.objects.create(
+        kind=kind,
+        payload=payload or {},
+        created_by=user if user and user.is_authenticated else None,
+        max_attempts=max_attempts or HANDLERS[kind][1],
+    )
+
+
+def store_upload(file, prefix: str = "jobs") -> str:
+    """Сохраняет загруженный файл для задачи, возвращает имя в хранилище."""
+    name = f"{prefix}/{uuid.uuid4().hex}-{os.path.basename(file.name)}"
+    return default_storage.save(name, file)
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobContext:
+    """То, что получает обработчик: задача, payload и отчёт о прогрессе."""
+
+    def __init__(self, job: Job):
+        self.job = job
+        self.payload = job.payload
+        self._reported_at = None
+
+    def report_progress(self, percent) -> None:
+        """Сохраняет прогресс 0-100 и heartbeat (не чаще PROGRESS_INTERVAL)."""
+        now = timezone.now()
+        if self._reported_at and (
+            (now - self._reported_at).total_seconds() < PROGRESS_INTERVAL
+        ):
+            return
+        self._reported_at = now
+        percent = max(0, min(int(percent), 100))
+        Job.objects.filter(pk=self.job.pk).update(progress=percent, heartbeat_at=now)
+
+
+def _release(queryset, describe, now) -> int:
+    """
+    Завершает оборванные запуски задач queryset (status=running).
+
+    Оборванный запуск считается попыткой: задача, исчерпавшая max_attempts,
+    не перезапускается, а завершается со статусом failed и текстом
+    describe(job). Так импорт CSV (max_attempts=1) не повторяется после
+    убитого воркера. Возвращает число задач, вернувшихся в очередь.
+    """
+    for job in queryset.filter(attempts__gte=F("max_attempts") - 1):
+        # условие по heartbeat_at: задачу не завершит воркер, который ожил
+        failed = Job.objects.filter(
+            pk=job.pk, status=Job.Status.RUNNING, heartbeat_at=job.heartbeat_at
+        ).update(
+            status=Job.Status.FAILED,
+            attempts=F("attempts") + 1,
+            error=describe(job),
+            finished_at=now,
+        )
+        if failed:
+            log.warning("Job %s (%s) abandoned by %s", job.pk, job.kind, job.worker)
+            cleanup(job)
+    return queryset.filter(attempts__lt=F("max_attempts") - 1).update(
+        status=Job.Status.QUEUED,
+        attempts=F("attempts") + 1,
+        run_after=now,
+        worker="",
+    )
+
+
+def requeue_stale(now=None) -> int:
+    """
+    Возвращает в очередь задачи, воркер которых перестал слать heartbeat.
+
+    Задачи, исчерпавшие попытки, завершаются (см. _release). Возвращает
+    число задач, вернувшихся в очередь.
+    """
+    now = now or timezone.now()
+    stale = Job.objects.filter(
+        status=Job.Status.RUNNING, heartbeat_at__lt=now - STALE_AFTER
+    )
+    return _release(
+        stale, lambda job: f"Worker {job.worker} stopped sending heartbeats", now
+    )
+
+
+def release_crashed(job: Job, error: str) -> str:
+    """
+    Освобождает задачу, чей запуск оборвался вместе с процессом пула.
+
+    Так же, как requeue_stale(), но сразу, без ожидания STALE_AFTER.
+    Задачу, которую процесс успел завершить, не трогает. Возвращает её статус.
+    """
+    running = Job.objects.filter(
+        pk=job.pk, status=Job.Status.RUNNING, worker=job.worker
+    )
+    _release(running, lambda job: error, timezone.now())
+    return Job.objects.values_list("status", flat=True).get(pk=job.pk)
+
+
+def claim_next(worker: str):
+    """
+    Атомарно забирает следующую готовую задачу или возвращает None.
+
+    Задачу захватывает тот воркер, чей UPDATE ... WHERE status='queued'
+    изменил строку; остальные пробуют следующую. Так работает и на SQLite,
+    где нет SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    now = timezone.now()
+    candidates = Job.objects.filter(
+        status=Job.Status.QUEUED, run_after__lte=now
+    ).order_by("run_after", "id")
+    for pk in candidates.values_list("pk", flat=True)[:10]:
+        claimed = Job.objects.filter(pk=pk, status=Job.Status.QUEUED).update(
+            status=Job.Status.RUNNING,
+            worker=worker,
+            started_at=now,
+            heartbeat_at=now,
+            progress=0,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def run_job(job_id) -> str:
+    """Выполняет захваченную задачу и сохраняет итог; возвращает новый статус."""
+    job = Job.objects.get(pk=job_id)
+    handler, _ = HANDLERS.get(job.kind, (None, None))
+    attempts = job.attempts + 1
+    try:
+        if handler is None:
+            raise LookupError(f"No handler for job kind {job.kind!r}")
+        result = handler(JobContext(job))
+    except Exception:
+        log.exception("Job %s (%s) failed", job.pk, job.kind)
+        error = traceback.format_exc()
+        if attempts < job.max_attempts and handler is not None:
+            status = Job.Status.QUEUED
+            run_after = timezone.now() + RETRY_DELAY * 2 ** (attempts - 1)
+            Job.objects.filter(pk=job.pk).update(
+                status=status, attempts=attempts, error=error, run_after=run_after
+            )
+            return status
+        status = Job.Status.FAILED
+        Job.objects.filter(pk=job.pk).update(
+            status=status,
+            attempts=attempts,
+            error=error,
+            finished_at=timezone.now(),
+        )
+        cleanup(job)
+        return status
+
+    status = Job.Status.SUCCEEDED
+    Job.objects.filter(pk=job.pk).update(
+        status=status,
+        attempts=attempts,
+        progress=100,
+        result=result,
+        error="",
+        finished_at=timezone.now(),
+    )
+    cleanup(job)
+    return status
+
+
+def cleanup(job: Job) -> None:
+    """Удаляет загруженный для задачи файл, когда он больше не нужен."""
+    name = job.payload.get("file")
+    if name:
+        transaction.on_commit(lambda: default_storage.delete(name))
+
+
+def _import_csv(context: JobContext, save_csv):
+    name = context.payload["file"]
+    size = default_storage.size(name) or 1
+    with default_storage.open(name, "rb") as stored:
+        file = stored.file
+
+        def progress(report):
+            context.report_progress(file.tell() * 100 / size)
+
+        report = save_csv(
+            file, encoding=context.payload.get("encoding"), progress=progress
+        )
+    return report.as_dict()
+
+
+# Импорт не повторяется: уже вставленные пачки при повторе задублировались бы
+@job_handler("import_products_csv", max_attempts=1)
+def import_products_csv(context: JobContext):
+    """payload: {"file": имя в хранилище, "encoding": кодировка}"""
+    return _import_csv(context, save_csv_products)
+
+
+@job_handler("import_orders_csv", max_attempts=1)
+def import_orders_csv(context: JobContext):
+    """payload: {"file": имя в хранилище, "encoding": кодировка}"""
+    return _import_csv(context, save_csv_orders)
+
+
+@job_handler("export_products_csv")
+def export_products_csv(context: JobContext):
+    """
+    Выгружает все товары в CSV-файл хранилища; результат — его имя и URL.
+
+    Ставится в очередь из GET /api/products/download_csv/?background=true.
+    """
+    queryset = Product.objects.order_by("pk")
+    total = queryset.count() or 1
+    done = 0
+    name = f"exports/products-{context.job.pk}.csv"
+    with tempfile.TemporaryFile("w+b") as file:
+        for chunk in iter_csv_products(queryset):
+            file.write(chunk.encode())
+            done += chunk.count("\n")
+            context.report_progress(done * 100 / total)
+        file.seek(0)
+        name = default_storage.save(name, File(file))
+    return {"file": name, "url": default_storage.url(name)}
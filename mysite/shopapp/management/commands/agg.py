@@ -1,5 +1,4 @@
 from django.core.management import BaseCommand
-from django.db.models import Avg, Max, Min, Count, Sum
 
 from shopapp.models import Product, Order
 
@@ -20,10 +19,9 @@ class Command(BaseCommand):
         # )
         # print(result)
 
-        orders = Order.objects.annotate(
-            total=Sum("products__price", default=0),
-            products_count=Count("products"),
-        )
+        # total и products_count хранятся в заказе (shopapp.totals),
+        # агрегация с JOIN по товарам больше не нужна
+        orders = Order.objects.only("id", "total", "products_count")
         for order in orders:
             print(
                 f"Order #{order.id}",
@@ -0,0 +1,91 @@
+from csv import DictWriter
+from time import perf_counter
+
+from django.core.management import BaseCommand
+from django.http import HttpResponse
+from rest_framework.test import APIRequestFactory
+
+from shopapp.benchmarks import current_rss, seed_products, temporary_database
+from shopapp.command import PRODUCT_CSV_FIELDS
+from shopapp.models import Product
+from shopapp.views import ProductViewSet
+
+
+def buffered_download_csv(queryset):
+    """Прежний download_csv: HttpResponse, собранный из объектов модели."""
+    response = HttpResponse(content_type="text/csv")
+    response["Content-Disposition"] = "attachment; filename=products-export.csv"
+    fields = list(PRODUCT_CSV_FIELDS)
+    writer = DictWriter(response, fieldnames=fields)
+    writer.writeheader()
+    for product in queryset.only(*fields):
+        writer.writerow({field: getattr(product, field) for field in fields})
+    return response
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк потокового CSV-экспорта товаров (ProductViewSet.download_csv).
+
+    Для каждого размера каталога замеряет время до первого байта, общее время
+    и прирост RSS двух реализаций: streaming — текущий download_csv,
+    buffered — прежний (buffered_download_csv), который читал весь queryset
+    объектами модели и отдавал ответ, только собрав его целиком.
+    """
+
+    help = (
+        "Benchmark CSV export: the streaming download_csv against the previous "
+        "buffered HttpResponse implementation (time-to-first-byte, peak RSS)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            nargs="+",
+            default=[10_000, 100_000, 1_000_000],
+            help="Catalog sizes to benchmark",
+        )
+
+    def handle(self, *args, **options):
+        view = ProductViewSet.as_view({"get": "download_csv"})
+        factory = APIRequestFactory()
+
+        with temporary_database():
+            seeded = 0
+            for rows in sorted(options["rows"]):
+                self.stdout.write(f"Seeding {rows} products...")
+                seed_products(rows - seeded, start=seeded)
+                seeded = rows
+
+                for mode in ("streaming", "buffered"):
+                    request = factory.get("/shop/api/products/download_csv/")
+                    rss_before = current_rss()
+                    peak = rss_before
+                    size = 0
+
+                    started = perf_counter()
+                    if mode == "streaming":
+                        response = view(request)
+                        for chunk in response.streaming_content:
+                            if not size:
+                                ttfb = perf_counter() - started
+                            size += len(chunk)
+                            peak = max(peak, current_rss())
+                    else:
+                        # клиент получает первый байт, когда собрано всё тело
+                        response = buffered_download_csv(Product.objects.all())
+                        ttfb = perf_counter() - started
+                        size = len(response.content)
+                        peak = max(peak, current_rss())
+                    del response
+                    total = perf_counter() - started
+
+                    self.stdout.write(
+                        f"rows={rows:>9} mode={mode:<9} "
+                        f"ttfb={ttfb * 1000:8.2f} ms total={total:7.2f} s "
+                        f"size={size / 2 ** 20:8.1f} MiB "
+                        f"peak_rss_delta={(peak - rss_before) / 2 ** 20:7.1f} MiB"
+                    )
+
+        self.stdout.write(self.style.SUCCESS("Benchmark finished"))
@@ -0,0 +1,53 @@
+import csv
+import tempfile
+
+from django.core.management import BaseCommand
+
+from shopapp.benchmarks import PeakRSS, temporary_database
+from shopapp.command import save_csv_products
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк импорта товаров из CSV (save_csv_products).
+
+    Генерирует файл на rows строк (каждая invalid_every-я строка с ошибкой),
+    импортирует его во временную БД и выводит скорость, прирост RSS и число ошибок.
+    """
+
+    help = "Benchmark batched CSV product import on a generated file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--invalid-every", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        invalid_every = options["invalid_every"]
+
+        with tempfile.TemporaryFile("w+b") as file:
+            self.stdout.write(f"Generating CSV with {rows} rows...")
+            text = open(file.fileno(), "w", encoding="utf-8", newline="", closefd=False)
+            writer = csv.writer(text)
+            writer.writerow(["name", "description", "price", "discount"])
+            for i in range(rows):
+                price = "not-a-price" if invalid_every and i % invalid_every == 0 else i
+                writer.writerow(
+                    [f"Product {i}", f"Imported product {i}", price, i % 50]
+                )
+            text.flush()
+            file.seek(0)
+
+            with temporary_database(), PeakRSS() as rss:
+                report = save_csv_products(
+                    file, encoding="utf-8", batch_size=options["batch_size"]
+                )
+
+        self.stdout.write(
+            f"rows={report.rows} created={report.created} failed={report.failed} "
+            f"elapsed={report.elapsed:.2f} s "
+            f"rate={report.rows_per_second:,.0f} rows/s "
+            f"peak_rss_delta={rss.delta / 2 ** 20:.1f} MiB"
+        )
+        self.stdout.write(self.style.SUCCESS("Benchmark finished"))
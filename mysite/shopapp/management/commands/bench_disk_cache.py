@@ -0,0 +1,141 @@
+import os
+import random
+import shutil
+import tempfile
+from time import perf_counter
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import BaseCommand
+
+from mysite.cache_backends import ShardedDiskCache
+
+BACKENDS = {
+    "filebased": FileBasedCache,
+    "sharded": ShardedDiskCache,
+}
+
+FILL_BATCH = 10_000
+
+
+def directory_size(path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк файловых кешей: FileBasedCache против ShardedDiskCache.
+
+    Для каждого бэкенда в пустом каталоге:
+
+    1. кеш заполняется до --keys записей (MAX_ENTRIES = --keys); печатается
+       скорость set() по ходу заполнения — у FileBasedCache каждый set()
+       перечисляет весь каталог, поэтому заполнение ограничено --time-limit;
+    2. --overflow записей сверх лимита: каждая запись вызывает вытеснение;
+    3. --reads чтений случайных ключей;
+    4. запись и чтение выгрузки на --export-rows товаров и её размер на
+       диске (как product_data_cache_key).
+    """
+
+    help = "Compare FileBasedCache and ShardedDiskCache at a large key count"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS)
+        )
+        parser.add_argument("--keys", type=int, default=1_000_000)
+        parser.add_argument("--value-size", type=int, default=200, help="Bytes")
+        parser.add_argument("--overflow", type=int, default=1000)
+        parser.add_argument("--reads", type=int, default=100_000)
+        parser.add_argument("--export-rows", type=int, default=10_000)
+        parser.add_argument(
+            "--time-limit",
+            type=float,
+            default=600.0,
+            help="Seconds to spend filling one backend",
+        )
+        parser.add_argument(
+            "--directory", help="Parent directory for the cache (default: temp)"
+        )
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        for name in options["backends"]:
+            directory = tempfile.mkdtemp(
+                prefix=f"bench-{name}-", dir=options["directory"]
+            )
+            try:
+                self.bench(name, directory, options)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+        self.stdout.write(self.style.SUCCESS("Benchmark finished"))
+
+    def bench(self, name, directory, options):
+        rng = random.Random(options["seed"])
+        cache = BACKENDS[name](
+            directory, {"TIMEOUT": None, "OPTIONS": {"MAX_ENTRIES": options["keys"]}}
+        )
+        value = rng.randbytes(options["value_size"])
+
+        started = perf_counter()
+        filled = 0
+        while filled < options["keys"]:
+            batch_started = perf_counter()
+            batch = min(FILL_BATCH, options["keys"] - filled)
+            for i in range(filled, filled + batch):
+                cache.set(f"key-{i}", value)
+            filled += batch
+            now = perf_counter()
+            self.stdout.write(
+                f"{name}: {filled:>9} keys, "
+                f"{batch / (now - batch_started):>9.0f} sets/s at this size"
+            )
+            if now - started > options["time_limit"]:
+                self.stdout.write(f"{name}: time limit reached at {filled} keys")
+                break
+        fill_time = perf_counter() - started
+
+        started = perf_counter()
+        for i in range(filled, filled + options["overflow"]):
+            cache.set(f"key-{i}", value)
+        overflow_time = perf_counter() - started
+
+        keys = [f"key-{rng.randrange(filled)}" for _ in range(options["reads"])]
+        started = perf_counter()
+        hits = sum(1 for key in keys if cache.get(key) is not None)
+        read_time = perf_counter() - started
+
+        export = [
+            {"pk": i, "name": f"Product {i}", "price": f"{i}.00", "archived": False}
+            for i in range(options["export_rows"])
+        ]
+        export_dir = os.path.join(directory, "export")
+        export_cache = BACKENDS[name](export_dir, {"TIMEOUT": None})
+        started = perf_counter()
+        export_cache.set("product_data_cache_key", export)
+        export_set = perf_counter() - started
+        started = perf_counter()
+        export_cache.get("product_data_cache_key")
+        export_get = perf_counter() - started
+        export_size = directory_size(export_dir) - sum(
+            os.path.getsize(os.path.join(export_dir, file))
+            for file in os.listdir(export_dir)
+            if file.startswith("index.sqlite3")
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{name}: fill {filled} keys in {fill_time:.1f} s "
+                f"({filled / fill_time:.0f} sets/s); "
+                f"{options['overflow']} sets over the limit "
+                f"{overflow_time / options['overflow'] * 1000:.2f} ms/set; "
+                f"reads {options['reads'] / read_time:.0f} gets/s "
+                f"({hits} hits); "
+                f"export {options['export_rows']} rows: "
+                f"set {export_set * 1000:.1f} ms, get {export_get * 1000:.1f} ms, "
+                f"{export_size / 1024:.0f} KiB on disk"
+            )
+        )
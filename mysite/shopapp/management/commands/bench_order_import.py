@@ -0,0 +1,89 @@
+import csv
+import random
+import tempfile
+from io import TextIOWrapper
+
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand
+
+from shopapp.benchmarks import Timer, seed_products, temporary_database
+from shopapp.command import save_csv_orders
+from shopapp.models import Order, Product
+
+
+def legacy_import(file, encoding):
+    """Прежний построчный импорт из OrderAdmin.import_csv — для сравнения."""
+    for row in csv.DictReader(TextIOWrapper(file, encoding, newline="")):
+        order = Order.objects.create(
+            user_id=row["user_id"],
+            delivery_address=row["delivery_address"],
+            promocode=row["promocode"],
+        )
+        ids = [int(pid) for pid in row["product_ids"].split(",") if pid.strip()]
+        order.products.set(Product.objects.filter(id__in=ids))
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк импорта заказов из CSV: пакетный save_csv_orders против
+    прежнего построчного импорта из OrderAdmin.
+    """
+
+    help = "Benchmark set-based order CSV import against the per-row import"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50_000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--products", type=int, default=10_000)
+        parser.add_argument(
+            "--legacy-rows",
+            type=int,
+            default=5000,
+            help="Rows for the per-row import (it is much slower)",
+        )
+
+    def handle(self, *args, **options):
+        rnd = random.Random(0)
+        with temporary_database():
+            User.objects.bulk_create(
+                User(username=f"bench-user-{i}") for i in range(options["users"])
+            )
+            seed_products(options["products"])
+            user_ids = list(User.objects.values_list("pk", flat=True))
+            product_ids = list(Product.objects.values_list("pk", flat=True))
+
+            def make_file(rows):
+                file = tempfile.TemporaryFile("w+b")
+                text = TextIOWrapper(file, "utf-8", newline="", write_through=True)
+                writer = csv.writer(text)
+                writer.writerow(
+                    ["user_id", "delivery_address", "promocode", "product_ids"]
+                )
+                for i in range(rows):
+                    products = rnd.sample(product_ids, rnd.randint(1, 5))
+                    writer.writerow(
+                        [
+                            rnd.choice(user_ids),
+                            f"Street {i}",
+                            "",
+                            ",".join(map(str, products)),
+                        ]
+                    )
+                text.detach()
+                file.seek(0)
+                return file
+
+            for name, rows, run in (
+                ("set-based", options["rows"], save_csv_orders),
+                ("per-row", options["legacy_rows"], legacy_import),
+            ):
+                if not rows:
+                    continue
+                with make_file(rows) as file, Timer() as timer:
+                    run(file, encoding="utf-8")
+                self.stdout.write(
+                    f"{name:<10} rows={rows:>7} elapsed={timer.elapsed:7.2f} s "
+                    f"rate={rows / timer.elapsed:10,.0f} orders/s"
+                )
+
+        self.stdout.write(self.style.SUCCESS("Benchmark finished"))
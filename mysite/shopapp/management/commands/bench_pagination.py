@@ -0,0 +1,71 @@
+from django.core.management import BaseCommand
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from shopapp.benchmarks import Timer, seed_products, temporary_database
+from shopapp.models import Product
+from shopapp.pagination import KeysetPagination, encode_cursor
+from shopapp.views import ProductViewSet
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк глубоких страниц списка товаров: PageNumberPagination
+    (COUNT + OFFSET) против KeysetPagination на одной и той же глубине.
+    """
+
+    help = "Benchmark deep-page latency of page-number vs keyset pagination"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument(
+            "--depths",
+            type=float,
+            nargs="+",
+            default=[0.0, 0.1, 0.5, 0.99],
+            help="Page positions as a fraction of the table",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def paginate(self, paginator, params):
+        request = Request(APIRequestFactory().get("/shop/api/products/", params))
+        view = ProductViewSet(action="list", request=request, format_kwarg=None)
+        queryset = view.filter_queryset(view.get_queryset())
+        return paginator.paginate_queryset(queryset, request, view)
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        with temporary_database():
+            self.stdout.write(f"Seeding {rows} products...")
+            seed_products(rows)
+            page_size = KeysetPagination.page_size
+            ordering = ("price", "pk")
+
+            for depth in options["depths"]:
+                offset = int((rows - page_size) * depth)
+                page = offset // page_size + 1
+                cursor = ""
+                if offset:
+                    boundary = Product.objects.order_by(*ordering)[offset - 1 : offset]
+                    price, pk = boundary.values_list(*ordering).get()
+                    cursor = encode_cursor({"v": [price, pk]})
+
+                results = {}
+                for name, paginator_class, params in (
+                    ("page", PageNumberPagination, {"page": page}),
+                    ("keyset", KeysetPagination, {"cursor": cursor}),
+                ):
+                    with Timer() as timer:
+                        for _ in range(options["repeat"]):
+                            self.paginate(
+                                paginator_class(), {"ordering": "price", **params}
+                            )
+                    results[name] = timer.elapsed / options["repeat"] * 1000
+
+                self.stdout.write(
+                    f"offset={offset:>9} page={results['page']:9.2f} ms "
+                    f"keyset={results['keyset']:7.2f} ms"
+                )
+
+        self.stdout.write(self.style.SUCCESS("Benchmark finished"))
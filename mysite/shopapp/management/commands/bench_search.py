@@ -0,0 +1,51 @@
+from django.core.management import BaseCommand
+from django.db.models import Q
+
+from shopapp.benchmarks import Timer, seed_products, temporary_database
+from shopapp.models import Product
+from shopapp.search import search_products
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк поиска товаров: LIKE '%term%' (icontains, как у SearchFilter)
+    против FTS5-индекса на каталогах разного размера.
+    """
+
+    help = "Benchmark product search: icontains scan vs FTS5 index"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+        )
+        parser.add_argument("--term", default="42424")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        terms = options["term"].split()
+        like = Q()
+        for term in terms:
+            like &= Q(name__icontains=term) | Q(description__icontains=term)
+
+        with temporary_database():
+            seeded = 0
+            for rows in sorted(options["rows"]):
+                seed_products(rows - seeded, start=seeded)
+                seeded = rows
+
+                results = {}
+                for name, make_queryset in (
+                    ("like", lambda: Product.objects.filter(like)[:10]),
+                    ("fts", lambda: search_products(Product.objects.all(), terms)[:10]),
+                ):
+                    with Timer() as timer:
+                        for _ in range(options["repeat"]):
+                            found = len(list(make_queryset()))
+                    results[name] = timer.elapsed / options["repeat"] * 1000
+
+                self.stdout.write(
+                    f"rows={rows:>9} found={found:>3} "
+                    f"like={results['like']:9.2f} ms fts={results['fts']:7.2f} ms"
+                )
+
+        self.stdout.write(self.style.SUCCESS("Benchmark finished"))
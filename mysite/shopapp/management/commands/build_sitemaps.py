@@ -0,0 +1,34 @@
+from django.core.management import BaseCommand
+
+from mysite.sitemaps import build_sitemaps
+
+
+class Command(BaseCommand):
+    """
+    Собирает sitemap в файлы SITEMAP_ROOT (см. mysite.sitemaps).
+
+    Перезаписываются только секции, в которых что-то поменялось, поэтому
+    команду можно запускать по расписанию хоть каждые несколько минут.
+    """
+
+    help = "Build the sitemap index and rewrite changed sitemap sections"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Rewrite every section ignoring the manifest",
+        )
+        parser.add_argument(
+            "--base-url",
+            help="Scheme and host for URLs in the sitemap (SITEMAP_BASE_URL)",
+        )
+
+    def handle(self, *args, **options):
+        stats = build_sitemaps(base_url=options["base_url"], force=options["force"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Sections written: {written}, unchanged: {unchanged},"
+                " removed: {removed}".format(**stats)
+            )
+        )
@@ -2,14 +2,24 @@ from typing import Sequence
 
 from django.core.management import BaseCommand
 from django.contrib.auth.models import User
+from django.db.models.functions import Now
 
-from shopapp.models import Product
+from mysite.caching import bump_generation
+from shopapp.models import Order, Product
+from shopapp.order_history import HISTORY_GROUP
+from shopapp.totals import refresh_order_totals
 
 
 class Command(BaseCommand):
     def handle(self, *args, **options):
         self.stdout.write("Start demo bulk actions")
-        result = Product.objects.filter(name__contains="Smartphone").update(discount=10)
+        products = Product.objects.filter(name__contains="Smartphone")
+        result = products.update(discount=10, updated_at=Now())
+        # update() не шлёт сигналы: заказы, итоги и кеши обновляем явно
+        orders = Order.objects.filter(products__in=products)
+        orders.update(updated_at=Now())
+        refresh_order_totals(orders)
+        bump_generation("products", "orders", HISTORY_GROUP)
         print(result)
         # info = [
         #     ("Smartphone 1", 199),
@@ -0,0 +1,80 @@
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError
+
+from mysite.caching import bump_generation
+from mysite.datagen import TABLES, generate
+from shopapp.order_history import HISTORY_GROUP
+
+
+class Command(BaseCommand):
+    """
+    Генерирует синтетические данные масштаба продакшена (см. mysite.datagen).
+
+    В отличие от create_products, create_order и команд blogapp строки
+    вставляются порциями bulk_create без сигналов на каждую строку.
+    Одинаковый --seed на одинаковой исходной БД даёт одинаковые данные,
+    --processes распределяет порции по процессам.
+    """
+
+    help = "Generate deterministic synthetic users, products, orders and articles"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=0)
+        parser.add_argument("--products", type=int, default=0)
+        parser.add_argument("--orders", type=int, default=0)
+        parser.add_argument("--articles", type=int, default=0)
+        parser.add_argument("--news", type=int, default=0)
+        parser.add_argument(
+            "--products-per-order",
+            type=float,
+            default=3.0,
+            help="Mean number of products in an order",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed")
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Worker processes for batches (1 = in this process)",
+        )
+        parser.add_argument(
+            "--password",
+            help="Password for generated users (unusable when omitted)",
+        )
+
+    def handle(self, *args, **options):
+        counts = {table: options[table] for table in TABLES}
+        if not any(counts.values()):
+            raise CommandError(
+                "Nothing to generate: pass --users, --products, --orders, "
+                "--articles or --news"
+            )
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        self.verbosity = options["verbosity"]
+        generate_options = {
+            "seed": options["seed"],
+            "batch_size": options["batch_size"],
+            "processes": options["processes"],
+            "products_per_order": options["products_per_order"],
+            # один хеш на всех: хешировать пароль на каждую строку очень долго
+            "password_hash": make_password(options["password"]),
+        }
+        started = perf_counter()
+        try:
+            created = generate(counts, generate_options, progress=self.progress)
+        except ValueError as exc:
+            raise CommandError(exc)
+        bump_generation("products", "orders", "articles", HISTORY_GROUP)
+
+        elapsed = perf_counter() - started
+        summary = ", ".join(f"{table}={count}" for table, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f"Created {summary} in {elapsed:.1f} s"))
+
+    def progress(self, table, done, total):
+        if self.verbosity > 1 or done == total:
+            self.stdout.write(f"{table}: {done}/{total}")
@@ -0,0 +1,337 @@
+import json
+import random
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+from statistics import mean, quantiles
+from time import perf_counter
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone as django_timezone
+from django.utils import translation
+
+from blogapp.models import ArticleNews
+from shopapp.benchmarks import (
+    seed_orders,
+    seed_products,
+    seed_users,
+    temporary_database,
+)
+from shopapp.models import Order, Product
+
+# Смесь запросов: имя -> (вес, функция (rng, данные) -> URL)
+SCENARIOS = {
+    "product-list": (10, lambda rng, d: reverse("shopapp:products_list")),
+    "product-detail": (
+        20,
+        lambda rng, d: reverse(
+            "shopapp:product_details", kwargs={"pk": rng.choice(d["products"])}
+        ),
+    ),
+    "api-product-list": (
+        12,
+        lambda rng, d: f"{reverse('shopapp:product-list')}?page={rng.randint(1, 20)}",
+    ),
+    "api-product-filter": (
+        8,
+        lambda rng, d: f"{reverse('shopapp:product-list')}"
+        f"?discount_price__gte={rng.randint(0, 9000)}&ordering=discount_price",
+    ),
+    "api-product-search": (
+        8,
+        lambda rng, d: f"{reverse('shopapp:product-list')}"
+        f"?search=Product+{rng.randint(0, len(d['products']))}",
+    ),
+    "api-products-stream": (
+        4,
+        lambda rng, d: f"{reverse('myapiapp:products')}?limit=100",
+    ),
+    "csv-export": (1, lambda rng, d: reverse("shopapp:product-download-csv")),
+    "products-export": (3, lambda rng, d: reverse("shopapp:products-export")),
+    "order-list": (8, lambda rng, d: reverse("shopapp:order_list")),
+    "order-detail": (
+        10,
+        lambda rng, d: reverse(
+            "shopapp:order_details", kwargs={"pk": rng.choice(d["orders"])}
+        ),
+    ),
+    "user-orders-export": (
+        4,
+        lambda rng, d: reverse(
+            "shopapp:export_user_orders", kwargs={"user_id": rng.choice(d["users"])}
+        ),
+    ),
+    "product-feed": (6, lambda rng, d: reverse("shopapp:latest-product-feed")),
+    "blog-feed": (3, lambda rng, d: reverse("blogapp:article-news-latest")),
+}
+
+
+class QueryCounter:
+    """execute_wrapper, считающий SQL-запросы соединения текущего потока."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def cache_tier_stats():
+    """Счётчики уровней TwoTierCache (mysite.cache_backends) или None."""
+    stats = getattr(cache, "stats", None)
+    return stats() if stats else None
+
+
+def percentile(values, p: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return quantiles(values, n=100, method="inclusive")[p - 1]
+
+
+def parse_mix(items) -> dict:
+    """["product-detail=50", "csv-export=0"] -> веса поверх SCENARIOS."""
+    weights = {name: weight for name, (weight, _) in SCENARIOS.items()}
+    for item in items or ():
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS or not weight.isdigit():
+            raise CommandError(
+                f"Bad --mix item {item!r}, expected one of "
+                f"{', '.join(SCENARIOS)} as name=weight"
+            )
+        weights[name] = int(weight)
+    weights = {name: weight for name, weight in weights.items() if weight}
+    if not weights:
+        raise CommandError("Every scenario has zero weight")
+    return weights
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный тест магазина сквозь весь стек Django.
+
+    На временной БД создаётся набор данных (--products, --orders, ...), и
+    --clients потоков, каждый со своим тестовым клиентом и соединением с БД,
+    выполняют --requests запросов из взвешенной смеси SCENARIOS: страницы
+    товаров и заказов, API со списком, фильтром и поиском, выгрузки CSV и
+    JSON, RSS-ленты. Для каждого сценария печатаются пропускная способность,
+    p50/p95/p99 задержки и число SQL-запросов на запрос; --output сохраняет
+    результат в JSON, --compare сравнивает с сохранённым ранее прогоном.
+
+    Запросы выполняются в этом процессе, без сети и HTTP-сервера: результат
+    показывает стоимость кода приложения, БД и кеша. Поведение серверов под
+    сотнями соединений меряет bench_concurrency.
+    """
+
+    help = "Replay a weighted request mix against a seeded database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=10_000)
+        parser.add_argument("--orders", type=int, default=5_000)
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--articles", type=int, default=200)
+        parser.add_argument("--clients", type=int, default=8, help="Threads")
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=100,
+            help="Requests executed before measuring (fill caches)",
+        )
+        parser.add_argument(
+            "--mix",
+            nargs="+",
+            metavar="NAME=WEIGHT",
+            help="Override scenario weights; 0 disables a scenario",
+        )
+        parser.add_argument("--seed", type=int, default=42, help="Random seed")
+        parser.add_argument("--output", help="Save results to this JSON file")
+        parser.add_argument("--compare", help="Compare with a saved JSON result")
+
+    def handle(self, *args, **options):
+        weights = parse_mix(options["mix"])
+        rng = random.Random(options["seed"])
+        # temporary_database() подменяет и кеш: общий кеш сайта не трогается
+        with temporary_database(), translation.override("en"):
+            data = self.seed(rng, options)
+            self.run_requests(
+                rng, weights, data, options["warmup"], options["clients"]
+            )
+            tiers_before = cache_tier_stats()
+            started = perf_counter()
+            samples = self.run_requests(
+                rng, weights, data, options["requests"], options["clients"]
+            )
+            elapsed = perf_counter() - started
+            tiers_after = cache_tier_stats()
+        result = self.summarize(samples, elapsed, weights, options)
+        if tiers_before is not None:
+            result["cache_tiers"] = {
+                key: tiers_after[key] - tiers_before[key] for key in tiers_before
+            }
+        self.report(result)
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as file:
+                self.compare(json.load(file), result)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(result, file, indent=2)
+            self.stdout.write(f"Saved results to {options['output']}")
+
+    def seed(self, rng, options) -> dict:
+        self.stdout.write("Seeding the database...")
+        seed_products(options["products"])
+        users = seed_users(options["users"])
+        seed_orders(options["orders"], users, rng)
+        now = django_timezone.now()
+        ArticleNews.objects.bulk_create(
+            ArticleNews(title=f"News {i}", body=f"Body {i}", published_at=now)
+            for i in range(options["articles"])
+        )
+        admin = User.objects.create_superuser("loadtest", password=None)
+        return {
+            "admin": admin,
+            "products": list(Product.objects.values_list("pk", flat=True)),
+            "orders": list(Order.objects.values_list("pk", flat=True)) or [0],
+            "users": [user.pk for user in users] or [admin.pk],
+        }
+
+    def run_requests(self, rng, weights, data, total, clients) -> list:
+        """Выполняет total запросов в clients потоках; возвращает замеры."""
+        names = rng.choices(list(weights), weights=list(weights.values()), k=total)
+        plan = [(name, SCENARIOS[name][1](rng, data)) for name in names]
+        samples = []
+        lock = threading.Lock()
+        language = translation.get_language()
+
+        def worker(requests):
+            client = Client(SERVER_NAME="localhost")
+            client.force_login(data["admin"])
+            counter = QueryCounter()
+            measured = []
+            try:
+                with translation.override(language):
+                    with connection.execute_wrapper(counter):
+                        for name, url in requests:
+                            counter.count = 0
+                            started = perf_counter()
+                            response = client.get(url)
+                            if response.streaming:
+                                for _ in response.streaming_content:
+                                    pass
+                            elapsed = perf_counter() - started
+                            measured.append(
+                                (name, elapsed, counter.count, response.status_code)
+                            )
+            finally:
+                connections.close_all()
+            with lock:
+                samples.extend(measured)
+
+        threads = [
+            threading.Thread(target=worker, args=(plan[i::clients],))
+            for i in range(clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples
+
+    def summarize(self, samples, elapsed, weights, options) -> dict:
+        by_name = defaultdict(list)
+        for sample in samples:
+            by_name[sample[0]].append(sample)
+
+        def stats(rows):
+            latencies = [row[1] * 1000 for row in rows]
+            queries = [row[2] for row in rows]
+            return {
+                "requests": len(rows),
+                "errors": sum(1 for row in rows if row[3] >= 400),
+                "rps": len(rows) / elapsed if elapsed else 0.0,
+                "p50_ms": percentile(latencies, 50),
+                "p95_ms": percentile(latencies, 95),
+                "p99_ms": percentile(latencies, 99),
+                "queries_mean": mean(queries) if queries else 0.0,
+                "queries_max": max(queries, default=0),
+            }
+
+        return {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "cache": settings.CACHES["default"]["BACKEND"],
+            "options": {
+                key: options[key]
+                for key in (
+                    "products",
+                    "orders",
+                    "users",
+                    "articles",
+                    "clients",
+                    "requests",
+                    "warmup",
+                    "seed",
+                )
+            },
+            "weights": weights,
+            "duration_s": elapsed,
+            "total": stats(samples),
+            "scenarios": {name: stats(rows) for name, rows in sorted(by_name.items())},
+        }
+
+    def report(self, result):
+        header = (
+            f"{'scenario':<22}{'reqs':>7}{'err':>5}{'rps':>9}"
+            f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'sql':>7}{'sql max':>8}"
+        )
+        self.stdout.write(header)
+        rows = [*result["scenarios"].items(), ("TOTAL", result["total"])]
+        for name, stats in rows:
+            self.stdout.write(
+                f"{name:<22}{stats['requests']:>7}{stats['errors']:>5}"
+                f"{stats['rps']:>9.1f}{stats['p50_ms']:>9.1f}"
+                f"{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+                f"{stats['queries_mean']:>7.1f}{stats['queries_max']:>8}"
+            )
+        tiers = result.get("cache_tiers")
+        if tiers:
+            self.stdout.write(
+                f"cache L1 hits {tiers['l1_hits']} misses {tiers['l1_misses']}, "
+                f"L2 hits {tiers['l2_hits']} misses {tiers['l2_misses']}"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result['total']['requests']} requests in "
+                f"{result['duration_s']:.2f} s"
+            )
+        )
+
+    def compare(self, before, after):
+        """Печатает изменение p95 и числа запросов по сценариям."""
+        self.stdout.write(f"Compared with run from {before['created_at']}:")
+        rows = [*after["scenarios"].items(), ("TOTAL", after["total"])]
+        for name, stats in rows:
+            old = (
+                before["total"] if name == "TOTAL" else before["scenarios"].get(name)
+            )
+            if not old:
+                continue
+            change = (
+                (stats["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100
+                if old["p95_ms"]
+                else 0.0
+            )
+            self.stdout.write(
+                f"{name:<22} p95 {old['p95_ms']:8.1f} -> {stats['p95_ms']:8.1f} ms "
+                f"({change:+6.1f}%)  sql {old['queries_mean']:6.1f} -> "
+                f"{stats['queries_mean']:6.1f}"
+            )
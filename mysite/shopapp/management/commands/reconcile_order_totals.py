@@ -0,0 +1,42 @@
+from django.core.management import BaseCommand
+
+from mysite.caching import bump_generation
+from shopapp.models import Order
+from shopapp.order_history import HISTORY_GROUP
+from shopapp.totals import refresh_order_totals, stale_order_totals
+
+
+class Command(BaseCommand):
+    """
+    Сверяет сохранённые итоги заказов с товарами и исправляет расхождения.
+
+    Сигналы не видят изменений в обход ORM-модели (QuerySet.update() цен,
+    правки в БД напрямую), поэтому команду стоит запускать по расписанию.
+    """
+
+    help = "Recalculate stale order totals (products_count, total, discounted_total)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report stale orders without fixing them",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recalculate every order without comparing first",
+        )
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            fixed = refresh_order_totals(Order.objects.all())
+        else:
+            stale = stale_order_totals().count()
+            self.stdout.write(f"Stale orders: {stale}")
+            if options["dry_run"] or not stale:
+                return
+            fixed = refresh_order_totals(stale_order_totals())
+        if fixed:
+            bump_generation("orders", HISTORY_GROUP)
+        self.stdout.write(self.style.SUCCESS(f"Recalculated orders: {fixed}"))
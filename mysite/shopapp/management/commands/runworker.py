@@ -0,0 +1,184 @@
+import multiprocessing
+import signal
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management import BaseCommand
+from django.db import connections
+
+from shopapp.jobs import (
+    claim_next,
+    release_crashed,
+    requeue_stale,
+    run_job,
+    worker_name,
+)
+
+# Как часто искать задачи, брошенные убитыми воркерами (секунды)
+REQUEUE_INTERVAL = 60
+
+
+def _run_in_pool(job_id):
+    try:
+        return run_job(job_id)
+    finally:
+        # у каждого потока и процесса пула своё соединение с БД
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    """
+    Воркер фоновых задач shopapp.Job.
+
+    Главный цикл захватывает готовые задачи из БД и отдаёт их пулу потоков
+    (по умолчанию) или процессов, держа в работе не больше --workers задач.
+    С --workers 0 задачи выполняются по одной в текущем потоке.
+
+    Задача, чей запуск оборвался вместе с процессом пула, сразу
+    освобождается (release_crashed), а сломанный пул процессов заменяется
+    новым. Раз в REQUEUE_INTERVAL в очередь возвращаются задачи других
+    воркеров, переставших слать heartbeat.
+    """
+
+    help = "Run background jobs from the shopapp job table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=2, help="Jobs executed concurrently"
+        )
+        parser.add_argument(
+            "--processes",
+            action="store_true",
+            help="Use a process pool instead of threads (for CPU-bound jobs)",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to sleep when the queue is empty",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit when there are no ready jobs left",
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        handlers = {
+            signum: signal.signal(signum, self.stop)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            self.work(options)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+    def work(self, options):
+        self.name = worker_name()
+        self.verbosity = options["verbosity"]
+
+        self.requeued_at = None
+
+        workers = options["workers"]
+        if workers <= 0:
+            self.run_inline(options)
+            return
+        self.run_pool(workers, options)
+        self.stdout.write(self.style.SUCCESS("Worker stopped"))
+
+    def make_pool(self, workers, options):
+        if options["processes"]:
+            # Процессы создаются fork'ом: открытые соединения наследовать нельзя
+            connections.close_all()
+            return ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("fork")
+            )
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+
+    def requeue_abandoned(self):
+        """Не чаще раза в REQUEUE_INTERVAL возвращает в очередь брошенные задачи."""
+        now = time.monotonic()
+        if self.requeued_at is not None and now - self.requeued_at < REQUEUE_INTERVAL:
+            return
+        self.requeued_at = now
+        requeued = requeue_stale()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale jobs")
+
+    def stop(self, signum, frame):
+        self.stdout.write("Finishing running jobs...")
+        self.stopping = True
+
+    def run_inline(self, options):
+        while not self.stopping:
+            self.requeue_abandoned()
+            job = claim_next(self.name)
+            if job is None:
+                if options["burst"]:
+                    return
+                time.sleep(options["poll_interval"])
+                continue
+            self.report(job, run_job(job.pk))
+
+    def run_pool(self, workers, options):
+        pool = self.make_pool(workers, options)
+        running = {}
+        try:
+            while True:
+                self.requeue_abandoned()
+                while not self.stopping and len(running) < workers:
+                    job = claim_next(self.name)
+                    if job is None:
+                        break
+                    try:
+                        future = pool.submit(_run_in_pool, job.pk)
+                    except BrokenProcessPool:
+                        # пул сломался после последнего wait(): задача не начата
+                        pool.shutdown(wait=False)
+                        pool = self.make_pool(workers, options)
+                        future = pool.submit(_run_in_pool, job.pk)
+                    running[future] = job
+                if not running:
+                    if self.stopping or options["burst"]:
+                        return
+                    time.sleep(options["poll_interval"])
+                    continue
+                done, _ = wait(
+                    running,
+                    timeout=options["poll_interval"],
+                    return_when=FIRST_COMPLETED,
+                )
+                if not self.collect(done, running):
+                    continue
+                # упавший процесс ломает весь пул: остальные запуски оборваны тоже
+                self.collect(wait(running).done, running)
+                pool.shutdown(wait=False)
+                pool = self.make_pool(workers, options)
+        finally:
+            pool.shutdown(wait=True)
+
+    def collect(self, done, running) -> bool:
+        """Отчитывается о завершённых запусках; True, если пул процессов сломан."""
+        broken = False
+        for future in done:
+            job = running.pop(future)
+            try:
+                status = future.result()
+            except Exception as exc:
+                broken = broken or isinstance(exc, BrokenProcessPool)
+                status = release_crashed(job, f"Worker {self.name} crashed: {exc!r}")
+                status = f"crashed ({exc!r}), now {status}"
+            self.report(job, status)
+        return broken
+
+    def report(self, job, status):
+        if self.verbosity:
+            self.stdout.write(f"Job #{job.pk} {job.kind}: {status}")
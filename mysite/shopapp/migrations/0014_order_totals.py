@@ -0,0 +1,70 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:07
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+
+def fill_order_totals(apps, schema_editor):
+    # Выражения скопированы из shopapp.totals на момент миграции:
+    # историческая модель не должна зависеть от будущих полей Product
+    Order = apps.get_model("shopapp", "Order")
+    through = Order.products.through
+    money = models.DecimalField(max_digits=12, decimal_places=2)
+
+    def aggregate(expression, output_field):
+        rows = (
+            through.objects.filter(order_id=OuterRef("pk"))
+            .order_by()
+            .values("order_id")
+            .annotate(value=expression)
+            .values("value")
+        )
+        return Coalesce(
+            Subquery(rows, output_field=output_field),
+            Value(0),
+            output_field=output_field,
+        )
+
+    discounted_price = Round(
+        F("product__price") * (100 - F("product__discount")) / 100, 2
+    )
+    Order.objects.update(
+        products_count=aggregate(Count("product_id"), models.IntegerField()),
+        total=aggregate(Round(Sum("product__price"), 2), money),
+        discounted_total=aggregate(
+            Round(Sum(discounted_price), 2, output_field=money), money
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopapp', '0013_product_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='discounted_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='Discounted total'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='products_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Products count'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='Total'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['total', 'id'], name='shopapp_ord_total_59db89_idx'),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
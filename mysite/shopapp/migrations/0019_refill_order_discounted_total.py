@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+
+def refill_discounted_total(apps, schema_editor):
+    # 0014 считала цену со скидкой как price * (100 - discount) / 100: для
+    # целых цен SQLite делил нацело. Пересчёт по генерируемому discount_price
+    # (0015), как в shopapp.totals на момент миграции
+    Order = apps.get_model("shopapp", "Order")
+    money = models.DecimalField(max_digits=12, decimal_places=2)
+    rows = (
+        Order.products.through.objects.filter(order_id=OuterRef("pk"))
+        .order_by()
+        .values("order_id")
+        .annotate(value=Round(Sum("product__discount_price"), 2))
+        .values("value")
+    )
+    Order.objects.update(
+        discounted_total=Coalesce(
+            Subquery(rows, output_field=money), Value(0), output_field=money
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopapp', '0018_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(refill_discounted_total, migrations.RunPython.noop),
+    ]
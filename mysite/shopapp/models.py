@@ -1,8 +1,13 @@
 import os
+from decimal import Decimal
+
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Round
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
@@ -24,10 +29,18 @@ class Product(models.Model):
         ordering = ["name", "price"]
         verbose_name = _("Product")
         verbose_name_plural = _("Products")
+        # Составные индексы (поле, id) для keyset-пагинации по ordering_fields API
+        indexes = [
+            models.Index(fields=["price", "id"]),
+            models.Index(fields=["discount", "id"]),
+            models.Index(fields=["discount_price", "id"]),
+        ]
 
     name = models.CharField(db_index=True, max_length=100, verbose_name=_("Name"))
+    # Поиск по description идёт через FTS5-индекс (shopapp.search), B-tree индекс
+    # для LIKE '%...%' бесполезен и только замедлял запись
     description = models.TextField(
-        db_index=True, null=False, blank=True, verbose_name=_("Description")
+        null=False, blank=True, verbose_name=_("Description")
     )
     price = models.DecimalField(
         default=0,
@@ -41,7 +54,18 @@ class Product(models.Model):
         verbose_name=_("Discount"),
         validators=[MinValueValidator(0), MaxValueValidator(100)],
     )
+    # Цена со скидкой считается самой БД при записи price/discount.
+    # Умножение на 0.01 вместо деления на 100: в SQLite целые делятся нацело
+    discount_price = models.GeneratedField(
+        expression=Round(F("price") * (100 - F("discount")) * Decimal("0.01"), 2),
+        output_field=models.DecimalField(max_digits=8, decimal_places=2),
+        db_persist=True,
+        verbose_name=_("Discount price"),
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created at"))
+    # Версия для кеша фрагментов шаблонов; сигналы сдвигают её и при
+    # изменении изображений и их копий (shopapp.signals)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated at"))
     archived = models.BooleanField(default=False, verbose_name=_("Archived"))
     preview = models.ImageField(
         null=True,
@@ -49,6 +73,8 @@ class Product(models.Model):
         upload_to=product_preview_directory_path,
         verbose_name=_("Preview"),
     )
+    # Уменьшенные копии preview, заполняются mysite.renditions
+    preview_renditions = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return f"Product(pk={self.pk}, name={self.name!r})"
@@ -74,6 +100,7 @@ class ProductImage(models.Model):
     description = models.CharField(
         max_length=200, blank=True, verbose_name=_("Description")
     )
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return f"ProductImage(pk={self.pk}, product={self.product_id})"
@@ -83,6 +110,11 @@ class Order(models.Model):
     class Meta:
         verbose_name = _("Order")
         verbose_name_plural = _("Orders")
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["promocode", "id"]),
+            models.Index(fields=["total", "id"]),
+        ]
 
     delivery_address = models.TextField(
         null=True, blank=True, verbose_name=_("Delivery address")
@@ -91,6 +123,8 @@ class Order(models.Model):
         max_length=20, null=False, blank=True, verbose_name=_("Promo code")
     )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created at"))
+    # Сдвигается и при изменении products (shopapp.signals)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated at"))
     user = models.ForeignKey(User, on_delete=models.PROTECT, verbose_name=_("User"))
     products = models.ManyToManyField(
         Product, related_name="orders", verbose_name=_("Products")
@@ -98,6 +132,86 @@ class Order(models.Model):
     receipt = models.FileField(
         null=True, blank=True, upload_to="orders/receipts", verbose_name=_("Receipt")
     )
+    # Денормализованные итоги по products, пересчитываются shopapp.totals
+    products_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name=_("Products count")
+    )
+    total = models.DecimalField(
+        default=0,
+        max_digits=12,
+        decimal_places=2,
+        editable=False,
+        verbose_name=_("Total"),
+    )
+    discounted_total = models.DecimalField(
+        default=0,
+        max_digits=12,
+        decimal_places=2,
+        editable=False,
+        verbose_name=_("Discounted total"),
+    )
 
     def __str__(self):
         return f"Order(pk={self.pk}, user={self.user.username!r})"
+
+
+class Job(models.Model):
+    """
+    Фоновая задача, выполняемая командой runworker (см. shopapp.jobs).
+
+    kind — имя обработчика, payload — его аргументы. Неудачная попытка
+    возвращает задачу в очередь с задержкой, пока не исчерпан max_attempts.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", _("Queued")
+        RUNNING = "running", _("Running")
+        SUCCEEDED = "succeeded", _("Succeeded")
+        FAILED = "failed", _("Failed")
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        verbose_name = _("Job")
+        verbose_name_plural = _("Jobs")
+        indexes = [
+            # выбор следующей задачи воркером
+            models.Index(fields=["status", "run_after", "id"]),
+        ]
+
+    kind = models.CharField(max_length=100, verbose_name=_("Kind"))
+    payload = models.JSONField(default=dict, blank=True, verbose_name=_("Payload"))
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.QUEUED,
+        verbose_name=_("Status"),
+    )
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name=_("Progress"))
+    result = models.JSONField(null=True, blank=True, verbose_name=_("Result"))
+    error = models.TextField(blank=True, verbose_name=_("Error"))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_("Attempts"))
+    max_attempts = models.PositiveSmallIntegerField(
+        default=3, verbose_name=_("Max attempts")
+    )
+    created_by = models.ForeignKey(
+        User,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        verbose_name=_("Created by"),
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created at"))
+    run_after = models.DateTimeField(default=timezone.now, verbose_name=_("Run after"))
+    started_at = models.DateTimeField(
+        null=True, blank=True, verbose_name=_("Started at")
+    )
+    heartbeat_at = models.DateTimeField(
+        null=True, blank=True, verbose_name=_("Heartbeat at")
+    )
+    finished_at = models.DateTimeField(
+        null=True, blank=True, verbose_name=_("Finished at")
+    )
+    worker = models.CharField(max_length=100, blank=True, verbose_name=_("Worker"))
+
+    def __str__(self):
+        return f"Job(pk={self.pk}, kind={self.kind!r}, status={self.status})"
@@ -0,0 +1,178 @@
+"""
+Снимок истории заказов пользователя — готовый ответ export_user_orders.
+
+Документ (список заказов пользователя по возрастанию pk с итогами и
+товарами) лежит в общем кеше под ключом ORDER_HISTORY_KEY без срока жизни
+и обновляется при записи, а не при чтении: сигналы (shopapp.signals) после
+фиксации транзакции вызывают refresh_order_history(), и она заменяет в
+документах владельцев только записи изменённых заказов. Чтение — один
+get_many() из кеша без запросов к БД.
+
+Документ пишется мимо L1 TwoTierCache (mysite.caching.shared_cache), чтобы
+изменение сразу видели все воркеры. Рядом с историей хранится поколение
+группы HISTORY_GROUP: массовые операции (импорт CSV, генератор данных,
+reconcile_order_totals) не трогают документы по одному, а вызывают
+bump_generation(HISTORY_GROUP), после чего каждый документ строится заново
+при первом чтении или записи.
+"""
+
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from operator import itemgetter
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from mysite.caching import (
+    GENERATION_KEY,
+    LOCK_KEY,
+    LOCK_POLL_INTERVAL,
+    LOCK_TIMEOUT,
+    get_generation,
+    shared_cache,
+)
+
+from .models import Order, Product
+
+ORDER_HISTORY_KEY = "order-history:{user_id}"
+HISTORY_GROUP = "order-history"
+
+
+def _entry(order) -> dict:
+    return {
+        "id": order.pk,
+        "delivery_address": order.delivery_address,
+        "promocode": order.promocode,
+        "created_at": order.created_at.isoformat(),
+        "products_count": order.products_count,
+        "total": str(order.total),
+        "discounted_total": str(order.discounted_total),
+        "products": [
+            {
+                "id": product.pk,
+                "name": product.name,
+                "price": str(product.price),
+                "discount_price": str(product.discount_price),
+            }
+            for product in order.products.all()
+        ],
+    }
+
+
+def _orders():
+    products = Product.objects.order_by("pk").only("name", "price", "discount_price")
+    return Order.objects.order_by("pk").prefetch_related(
+        Prefetch("products", queryset=products)
+    )
+
+
+def build_order_history(user_id: int) -> Optional[list]:
+    """История заказов из БД; None, если такого пользователя нет."""
+    history = [_entry(order) for order in _orders().filter(user_id=user_id)]
+    if not history and not User.objects.filter(pk=user_id).exists():
+        return None
+    return history
+
+
+def _load(user_id: int):
+    # документ и поколение одним обращением к кешу
+    key = ORDER_HISTORY_KEY.format(user_id=user_id)
+    generation_key = GENERATION_KEY.format(group=HISTORY_GROUP)
+    found = shared_cache().get_many([key, generation_key])
+    generation = found.get(generation_key)
+    if generation is None:
+        generation = get_generation(HISTORY_GROUP)
+    document = found.get(key)
+    if document is None or document[0] != generation:
+        return None, generation
+    return document[1], generation
+
+
+def _store(user_id: int, generation: int, history: list) -> None:
+    key = ORDER_HISTORY_KEY.format(user_id=user_id)
+    shared_cache().set(key, (generation, history), None)
+
+
+def get_order_history(user_id: int) -> Optional[list]:
+    """История заказов пользователя из кеша; None, если его нет."""
+    history, generation = _load(user_id)
+    if history is not None:
+        return history
+    history = build_order_history(user_id)
+    if history is None:
+        return None
+    # Сборка могла прочитать БД до фиксации чужой записи. Под блокировкой
+    # писателей документ сохраняется, только если писатель не успел
+    # положить свой; занятая блокировка — писатель сохранит сам
+    with _locked(user_id, wait=False) as acquired:
+        if acquired:
+            current, generation = _load(user_id)
+            if current is None:
+                _store(user_id, generation, history)
+            else:
+                history = current
+    return history
+
+
+async def aget_order_history(user_id: int) -> Optional[list]:
+    """Асинхронный вариант get_order_history()."""
+    return await sync_to_async(get_order_history)(user_id)
+
+
+@contextmanager
+def _locked(user_id: int, wait: bool = True):
+    """
+    Блокировка документа пользователя на атомарном cache.add(); отдаёт,
+    взята ли она. Два писателя, одновременно дописывающие документ,
+    потеряли бы изменения друг друга. С wait=False не ждёт; после
+    LOCK_TIMEOUT ожидания блокировка считается брошенной.
+    """
+    lock_key = LOCK_KEY.format(key=ORDER_HISTORY_KEY.format(user_id=user_id))
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    acquired = cache.add(lock_key, True, LOCK_TIMEOUT)
+    while wait and not acquired and time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        acquired = cache.add(lock_key, True, LOCK_TIMEOUT)
+    # дождавшийся LOCK_TIMEOUT писатель забирает брошенную блокировку
+    owned = acquired or wait
+    try:
+        yield owned
+    finally:
+        if owned:
+            cache.delete(lock_key)
+
+
+def refresh_order_history(orders, removed=()) -> None:
+    """
+    Обновляет в документах владельцев записи заказов queryset orders.
+
+    removed — пары (user_id, order_id) заказов, которые надо убрать из
+    документа user_id: удалённых или перешедших к другому пользователю.
+    Документ, которого нет в кеше или который устарел по поколению,
+    строится целиком.
+    """
+    changed = defaultdict(dict)
+    for order in _orders().filter(pk__in=orders.values("pk")):
+        changed[order.user_id][order.pk] = _entry(order)
+    dropped = defaultdict(set)
+    for user_id, order_id in removed:
+        dropped[user_id].add(order_id)
+
+    for user_id in changed.keys() | dropped.keys():
+        with _locked(user_id):
+            history, generation = _load(user_id)
+            if history is None:
+                history = build_order_history(user_id)
+                if history is None:
+                    continue
+            else:
+                entries = changed.get(user_id, {})
+                skip = entries.keys() | dropped.get(user_id, set())
+                history = [entry for entry in history if entry["id"] not in skip]
+                history.extend(entries.values())
+                history.sort(key=itemgetter("id"))
+            _store(user_id, generation, history)
@@ -0,0 +1,284 @@
+"""
+Keyset (cursor) пагинация для API магазина.
+
+В отличие от PageNumberPagination не выполняет COUNT(*) и не использует
+OFFSET: следующая страница выбирается условием "строки после последней
+показанной" по полям сортировки с pk в конце для однозначности, поэтому
+глубокие страницы работают так же быстро, как первая.
+"""
+
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+# Всегда ложное условие для Q-выражений
+NOTHING = Q(pk__in=[])
+
+
+def _json_default(value):
+    # DjangoJSONEncoder обрезает микросекунды, а курсору нужна точная граница
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(data) -> str:
+    """Кодирует данные курсора в непрозрачную строку для URL."""
+    raw = json.dumps(data, default=_json_default, separators=(",", ":"))
+    return urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Обратное к encode_cursor; NotFound при повреждённом курсоре."""
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        return json.loads(urlsafe_b64decode(cursor + padding))
+    except (ValueError, TypeError):
+        raise NotFound("Invalid cursor")
+
+
+def _beyond(field: str, descending: bool, nullable: bool, value) -> Q:
+    """Строки строго "после" value по полю field; NULL считается наименьшим."""
+    if descending:
+        if value is None:
+            return NOTHING
+        condition = Q(**{f"{field}__lt": value})
+        if nullable:
+            condition |= Q(**{f"{field}__isnull": True})
+        return condition
+    if value is None:
+        return Q(**{f"{field}__isnull": False})
+    return Q(**{f"{field}__gt": value})
+
+
+def _leading_bound(field: str, descending: bool, nullable: bool, value) -> Q:
+    """
+    Нестрогая граница по первому полю.
+
+    Логически избыточна, но без неё SQLite не использует индекс (поле, id)
+    для диапазона и сканирует его с начала.
+    """
+    if value is None:
+        return Q()
+    if descending:
+        bound = Q(**{f"{field}__lte": value})
+        if nullable:
+            bound |= Q(**{f"{field}__isnull": True})
+        return bound
+    return Q(**{f"{field}__gte": value})
+
+
+def keyset_filter(keys, values) -> Q:
+    """
+    Лексикографическое условие "(f1, f2, ..., pk) после values".
+
+    keys — список (имя поля, по убыванию, допускает NULL), values — значения
+    этих полей у граничной строки.
+    """
+    condition = NOTHING
+    equal = Q()
+    for (field, descending, nullable), value in zip(keys, values):
+        condition |= equal & _beyond(field, descending, nullable, value)
+        if value is None:
+            equal &= Q(**{f"{field}__isnull": True})
+        else:
+            equal &= Q(**{field: value})
+    return _leading_bound(*keys[0], values[0]) & condition
+
+
+def keyset_order_by(keys):
+    """Выражения order_by для keys с тем же положением NULL, что в _beyond."""
+    return [
+        (
+            F(field).desc(nulls_last=True)
+            if descending
+            else F(field).asc(nulls_first=True)
+        )
+        for field, descending, _ in keys
+    ]
+
+
+class KeysetPagination(BasePagination):
+    """
+    Пагинация по курсору: ответ {"next", "previous", "results"} без count.
+
+    Сортировка берётся из параметра ordering (проверяется по ordering_fields
+    view), затем из ordering у queryset или модели; pk всегда добавляется
+    последним полем.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.keys = self.get_keys(queryset, request, view)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        self.reverse = False
+        if cursor:
+            data = decode_cursor(cursor)
+            values = data.get("v") if isinstance(data, dict) else None
+            if not isinstance(values, list) or len(values) != len(self.keys):
+                raise NotFound("Invalid cursor")
+            self.reverse = bool(data.get("r"))
+            queryset = queryset.filter(keyset_filter(self.directed_keys(), values))
+        keys = self.directed_keys()
+
+        rows = list(queryset.order_by(*keyset_order_by(keys))[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, bool(cursor)
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_keys(self, queryset, request, view):
+        ordering = None
+        if view is not None:
+            ordering = OrderingFilter().get_ordering(request, queryset, view)
+        opts = queryset.model._meta
+        ordering = ordering or queryset.query.order_by or opts.ordering
+        keys = []
+        for name in ordering:
+            if not isinstance(name, str):
+                continue
+            descending = name.startswith("-")
+            name = name.lstrip("-")
+            if name in ("pk", opts.pk.name):
+                break
+            field = opts.get_field(name)
+            keys.append((field.attname, descending, field.null))
+        last_descending = keys[-1][1] if keys else False
+        keys.append((opts.pk.attname, last_descending, False))
+        return keys
+
+    def directed_keys(self):
+        """Поля сортировки с учётом направления обхода (назад — инвертированы)."""
+        if not self.reverse:
+            return self.keys
+        return [
+            (field, not descending, nullable)
+            for field, descending, nullable in self.keys
+        ]
+
+    def boundary(self, row, reverse):
+        values = [getattr(row, field) for field, _, _ in self.keys]
+        data = {"v": values}
+        if reverse:
+            data["r"] = 1
+        return encode_cursor(data)
+
+    def get_link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.boundary(row, reverse)
+        )
+
+    def get_next_link(self):
+        if not (self.has_next and self.page):
+            return None
+        return self.get_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # курсор дальше конца данных: ведём на первую keyset-страницу
+            url = self.request.build_absolute_uri()
+            return replace_query_param(url, self.cursor_query_param, "")
+        return self.get_link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Keyset cursor; empty value starts from the first page",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results per keyset page",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class PageNumberOrKeysetPagination(PageNumberPagination):
+    """
+    Обычная постраничная пагинация, а при наличии параметра cursor — keyset.
+
+    Существующие клиенты с ?page=N продолжают работать; глубокий обход
+    больших таблиц делается через ?cursor= (пустое значение — первая страница).
+    """
+
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        names = {parameter["name"] for parameter in parameters}
+        return parameters + [
+            parameter
+            for parameter in self.keyset_class().get_schema_operation_parameters(view)
+            if parameter["name"] not in names
+        ]
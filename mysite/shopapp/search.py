@@ -0,0 +1,117 @@
+"""
+Полнотекстовый поиск товаров на SQLite FTS5.
+
+Индекс shopapp_product_fts хранит только токены name и description
+(external content), а строки берёт из shopapp_product. Синхронизацию
+выполняют триггеры SQLite, поэтому индекс обновляется и при bulk_create
+и QuerySet.update(), которые не шлют сигналы Django.
+На других СУБД поиск откатывается к обычному SearchFilter.
+"""
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+from .models import Product
+
+FTS_TABLE = "shopapp_product_fts"
+
+# Таблица shopapp_product пересоздаётся миграциями SQLite (_remake_table),
+# вместе с ней пропадают триггеры, поэтому они создаются идемпотентно
+TRIGGERS_SQL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON shopapp_product
+    BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON shopapp_product
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF name, description ON shopapp_product
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+
+# Алиасы БД, в которых индекс уже найден: проверка не повторяется на каждый запрос
+_fts_ready = set()
+
+
+def fts_available(connection) -> bool:
+    if connection.alias in _fts_ready:
+        return True
+    if connection.vendor != "sqlite":
+        return False
+    if FTS_TABLE in connection.introspection.table_names():
+        _fts_ready.add(connection.alias)
+        return True
+    return False
+
+
+def ensure_fts_triggers(using="default", **kwargs) -> None:
+    """Обработчик post_migrate: возвращает триггеры, если индекс уже создан."""
+    connection = connections[using]
+    if not fts_available(connection):
+        return
+    with connection.cursor() as cursor:
+        for sql in TRIGGERS_SQL:
+            cursor.execute(sql)
+
+
+def build_match_query(terms) -> str:
+    """
+    Строка запроса FTS5: все термы обязательны, каждый ищется как префикс.
+
+    Термы берутся в кавычки, чтобы пользовательский ввод не разбирался
+    как синтаксис FTS5 (AND, OR, NEAR, *, ...).
+    """
+    return " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+def search_products(queryset, terms):
+    """
+    Фильтрует queryset товаров по FTS-индексу и сортирует по релевантности.
+
+    Совпадения отбираются подзапросом pk IN (SELECT rowid ... MATCH), поэтому
+    время поиска зависит от числа совпадений, а не от размера каталога.
+    Релевантность FTS5 (rank, меньше — лучше) доступна как search_rank: её
+    подзапрос ищет по rowid только среди найденных строк.
+    """
+    table = Product._meta.db_table
+    match = build_match_query(terms)
+    matches = RawSQL(
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+    )
+    rank = RawSQL(
+        f"SELECT rank FROM {FTS_TABLE}"
+        f" WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id",
+        [match],
+    )
+    return (
+        queryset.filter(pk__in=matches)
+        .annotate(search_rank=rank)
+        .order_by("search_rank", "pk")
+    )
+
+
+class ProductFullTextSearchFilter(SearchFilter):
+    """SearchFilter для параметра search, работающий через FTS5-индекс товаров."""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms or not fts_available(connections[queryset.db]):
+            return super().filter_queryset(request, queryset, view)
+        return search_products(queryset, terms)
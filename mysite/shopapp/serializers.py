@@ -1,8 +1,31 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
-from .models import Product, Order
+
+from mysite.renditions import rendition_urls
+from .models import Job, Product, Order
+
+
+class RenditionsField(serializers.Field):
+    """Уменьшенные копии изображения: {"thumb": {"url", "width", "height"}}."""
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs.update(source="*", read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        request = self.context.get("request")
+        return rendition_urls(instance, self.image_field, request)
 
 
 class ProductSerializer(serializers.ModelSerializer):
+    # Для GeneratedField DRF создаёт ModelField, который отдал бы число,
+    # а не строку, как у price
+    discount_price = serializers.DecimalField(
+        max_digits=8, decimal_places=2, read_only=True
+    )
+    preview_renditions = RenditionsField("preview")
+
     class Meta:
         model = Product
         fields = "__all__"
@@ -12,3 +35,34 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = "__all__"
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Подгружает то, что читает сериализатор, чтобы не было N+1 запросов.
+
+        user отдаётся как user_id без JOIN, а для products нужны только id,
+        поэтому они загружаются одним запросом на всю страницу.
+        """
+        return queryset.prefetch_related(
+            Prefetch("products", queryset=Product.objects.only("pk"))
+        )
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = (
+            "id",
+            "kind",
+            "status",
+            "progress",
+            "result",
+            "error",
+            "attempts",
+            "max_attempts",
+            "created_at",
+            "started_at",
+            "finished_at",
+        )
+        read_only_fields = fields
@@ -0,0 +1,184 @@
+"""
+Обработчики сигналов shopapp: инвалидация кешей, сдвиг updated_at,
+пересчёт итогов заказов и снимков истории заказов при изменении данных.
+"""
+
+from functools import partial
+
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from mysite.caching import bump_generation
+from mysite.renditions import renditions_ready
+
+from .models import Order, Product, ProductImage
+from .order_history import refresh_order_history
+from .totals import refresh_order_totals
+
+# Поля товара, от которых зависят итоги заказов
+TOTALS_FIELDS = ("price", "discount")
+# Поля товара, которые входят в снимок истории заказов
+HISTORY_FIELDS = ("name", *TOTALS_FIELDS)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(renditions_ready, sender=Product)
+@receiver(renditions_ready, sender=ProductImage)
+def invalidate_products_cache(sender, **kwargs):
+    bump_generation("products")
+
+
+def touch(queryset) -> None:
+    """
+    Сдвигает updated_at без save(): от него зависят ключи фрагментов
+    шаблонов, а изображения, копии и M2M меняются без сохранения самой строки.
+    """
+    queryset.update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_product_on_image_change(sender, instance, **kwargs):
+    touch(Product.objects.filter(pk=instance.product_id))
+
+
+@receiver(renditions_ready, sender=Product)
+def touch_product_on_renditions(sender, pk, **kwargs):
+    touch(Product.objects.filter(pk=pk))
+
+
+@receiver(renditions_ready, sender=ProductImage)
+def touch_product_on_image_renditions(sender, pk, **kwargs):
+    touch(Product.objects.filter(images=pk))
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_orders_cache(sender, **kwargs):
+    bump_generation("orders")
+
+
+def refresh_history_on_commit(orders, removed=()) -> None:
+    """Обновляет снимки истории после фиксации: до неё данных ещё не видно."""
+    transaction.on_commit(partial(refresh_order_history, orders, removed))
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_owner(sender, instance, update_fields, raw, **kwargs):
+    instance._previous_user_id = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and "user" not in update_fields:
+        return
+    instance._previous_user_id = (
+        sender.objects.filter(pk=instance.pk).values_list("user_id", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Order)
+def refresh_history_on_order_save(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    removed = []
+    previous = getattr(instance, "_previous_user_id", None)
+    if previous not in (None, instance.user_id):
+        # заказ передан другому пользователю: убрать из прежней истории
+        removed.append((previous, instance.pk))
+    refresh_history_on_commit(Order.objects.filter(pk=instance.pk), removed)
+
+
+@receiver(post_delete, sender=Order)
+def refresh_history_on_order_delete(sender, instance, **kwargs):
+    refresh_history_on_commit(Order.objects.none(), [(instance.user_id, instance.pk)])
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def invalidate_order_products_cache(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_generation("orders")
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def update_order_totals(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        # после clear() уже не узнать, в каких заказах был товар
+        instance._cleared_order_ids = list(
+            instance.orders.values_list("pk", flat=True)
+        )
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        orders = Order.objects.filter(pk=instance.pk)
+    else:
+        if action == "post_clear":
+            pk_set = instance.__dict__.pop("_cleared_order_ids", ())
+        if not pk_set:
+            return
+        orders = Order.objects.filter(pk__in=pk_set)
+    touch(orders)
+    refresh_order_totals(orders)
+    refresh_history_on_commit(orders)
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_changes(sender, instance, update_fields, raw, **kwargs):
+    instance._totals_changed = instance._history_changed = False
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(HISTORY_FIELDS):
+        return
+    old = sender.objects.filter(pk=instance.pk).values(*HISTORY_FIELDS).first()
+    if old is None:
+        return
+    changed = {name for name in HISTORY_FIELDS if old[name] != getattr(instance, name)}
+    instance._totals_changed = bool(changed & set(TOTALS_FIELDS))
+    instance._history_changed = bool(changed)
+
+
+@receiver(post_save, sender=Product)
+def update_totals_on_price_change(sender, instance, **kwargs):
+    if getattr(instance, "_totals_changed", False):
+        if refresh_order_totals(Order.objects.filter(products=instance)):
+            bump_generation("orders")
+
+
+@receiver(post_save, sender=Product)
+def refresh_history_on_product_change(sender, instance, **kwargs):
+    if getattr(instance, "_history_changed", False):
+        refresh_history_on_commit(Order.objects.filter(products=instance))
+
+
+@receiver(post_save, sender=Product)
+def touch_orders_on_product_change(sender, instance, **kwargs):
+    # фрагменты order_list выводят названия и цены товаров заказа
+    if getattr(instance, "_history_changed", False):
+        touch(Order.objects.filter(products=instance))
+
+
+@receiver(pre_delete, sender=Product)
+def remember_product_orders(sender, instance, **kwargs):
+    # строки M2M удаляются каскадом без m2m_changed
+    instance._deleted_order_ids = list(instance.orders.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Product)
+def update_totals_on_product_delete(sender, instance, **kwargs):
+    order_ids = getattr(instance, "_deleted_order_ids", ())
+    if order_ids:
+        orders = Order.objects.filter(pk__in=order_ids)
+        touch(orders)
+        refresh_order_totals(orders)
+        bump_generation("orders")
+        refresh_history_on_commit(orders)
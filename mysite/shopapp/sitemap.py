@@ -5,6 +5,8 @@ from .models import Product
 class ProductSitemap(Sitemap):
     changefreq = "monthly"
     priority = 0.5
+    # поле для отпечатков секций в mysite.sitemaps
+    lastmod_field = "created_at"
 
     def items(self):
         return Product.objects.filter(archived=False).order_by("-created_at")
@@ -1,12 +1,65 @@
+import csv
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO, StringIO
+from multiprocessing import get_context
+from time import time
+from threading import Thread
+from unittest import mock
 from string import ascii_letters
 from random import choices
 
+from asgiref.sync import async_to_sync
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.cache import cache, caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone, translation
 
-from shopapp.models import Product
+from blogapp.models import Article, ArticleNews
+from mysite.cache_backends import ShardedDiskCache
+from mysite.caching import (
+    LOCK_KEY,
+    aget_or_compute,
+    bump_generation,
+    get_generation,
+    get_or_compute,
+    versioned_key,
+)
+from mysite.metrics import (
+    JsonFormatter,
+    RequestMetrics,
+    RequestMetricsMiddleware,
+    _current,
+    instrument_cache_backends,
+)
+from mysite.sitemaps import build_sitemaps
+from mysite.testing import LOCMEM_CACHES, QueryBudgetMixin, ViewBudget
+from shopapp.benchmarks import temporary_caches_settings
+from shopapp.command import save_csv_orders, save_csv_products
+from PIL import Image
+
+from myauth.models import Profile
+from shopapp import jobs
+from shopapp.models import Job, Order, Product, ProductImage
+from shopapp.order_history import (
+    HISTORY_GROUP,
+    _store,
+    build_order_history,
+    get_order_history,
+    refresh_order_history,
+)
+from shopapp.totals import stale_order_totals
 from shopapp.utils import add_two_numbers
 
 
@@ -123,3 +176,1483 @@ class ProductsExportViewTestCase(TestCase):
             products_data["products"],
             expected_data,
         )
+
+
+class ProductsCSVDownloadTestCase(TestCase):
+    fixtures = [
+        'products-fixture.json',
+    ]
+
+    def setUp(self) -> None:
+        with translation.override("en"):
+            self.url = reverse("shopapp:product-download-csv")
+
+    def get_rows(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode()
+        return list(csv.reader(StringIO(content)))
+
+    def test_download_csv_is_streamed(self):
+        rows = self.get_rows({"ordering": "price"})
+        self.assertEqual(rows[0], ["name", "description", "price", "discount"])
+        expected = [
+            [p.name, p.description, str(p.price), str(p.discount)]
+            for p in Product.objects.order_by("price")
+        ]
+        self.assertEqual(rows[1:], expected)
+
+    def test_download_csv_honours_filters(self):
+        rows = self.get_rows({"archived": "true"})
+        self.assertEqual(
+            len(rows) - 1, Product.objects.filter(archived=True).count()
+        )
+
+
+class SaveCSVProductsTestCase(TestCase):
+    def make_file(self, text):
+        return BytesIO(text.encode("utf-8"))
+
+    def test_import_in_batches_with_row_errors(self):
+        file = self.make_file(
+            "name,description,price,discount\n"
+            "Chair,Wooden,10.50,5\n"
+            "Table,,oops,0\n"
+            ",No name,1,0\n"
+            "Lamp,Bright,3,\n"
+            "Sofa,Soft,99,10\n"
+        )
+        report = save_csv_products(file, encoding="utf-8", batch_size=2)
+        self.assertEqual(report.rows, 5)
+        self.assertEqual(report.created, 3)
+        self.assertEqual(
+            [(error["line"], list(error["errors"])) for error in report.errors],
+            [(3, ["price"]), (4, ["name"])],
+        )
+        self.assertQuerySetEqual(
+            Product.objects.order_by("name").values_list("name", "discount"),
+            [("Chair", 5), ("Lamp", 0), ("Sofa", 10)],
+        )
+
+    def test_unknown_columns_are_rejected(self):
+        file = self.make_file("name,colour\nChair,red\n")
+        report = save_csv_products(file, encoding="utf-8")
+        self.assertEqual(report.created, 0)
+        self.assertEqual(report.errors[0]["line"], 1)
+        self.assertFalse(Product.objects.exists())
+
+    def test_missing_required_columns_are_rejected(self):
+        file = self.make_file("description,price\nWooden,10\n")
+        report = save_csv_products(file, encoding="utf-8")
+        self.assertEqual(report.rows, 0)
+        self.assertEqual(
+            report.errors[0]["errors"], {"header": ["Missing columns: name"]}
+        )
+        self.assertFalse(Product.objects.exists())
+
+    def test_upload_of_empty_csv_returns_empty_report(self):
+        self.client.force_login(User.objects.create_user(username="csv_empty"))
+        with translation.override("en"):
+            url = reverse("shopapp:product-upload-csv")
+        for content in (b"name,price\n", b""):
+            with self.subTest(content=content):
+                file = SimpleUploadedFile("products.csv", content)
+                response = self.client.post(url, {"file": file})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["rows"], 0)
+                self.assertEqual(response.json()["errors"], [])
+
+        file = SimpleUploadedFile("products.csv", b"name,price\n,oops\n")
+        self.assertEqual(self.client.post(url, {"file": file}).status_code, 400)
+
+
+class SaveCSVOrdersTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="csv_buyer", password="qwerty")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Item {i}") for i in range(3)
+        )
+
+    def test_import_resolves_ids_in_batches(self):
+        first, second, third = (p.pk for p in self.products)
+        file = BytesIO(
+            (
+                "user_id,delivery_address,promocode,product_ids\n"
+                f'{self.user.pk},Street 1,SALE,"{first},{second}"\n'
+                f'{self.user.pk},Street 2,,"{third},999999"\n'
+                "999999,Street 3,,\n"
+                f"{self.user.pk},Street 4,,\n"
+            ).encode()
+        )
+        # 2 пачки: проверка id, вставка заказов и строк Order.products и пересчёт
+        # итогов в savepoint; во второй пачке нет товаров, их запросы пропускаются
+        with self.assertNumQueries(11):
+            report = save_csv_orders(file, encoding="utf-8", batch_size=2)
+
+        self.assertEqual(report.created, 3)
+        self.assertEqual(report.errors[0]["line"], 4)
+        self.assertEqual(report.warnings[0]["line"], 3)
+        orders = Order.objects.order_by("delivery_address")
+        self.assertEqual(
+            [sorted(p.pk for p in order.products.all()) for order in orders],
+            [[first, second], [third], []],
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GenerationCacheInvalidationTestCase(TestCase):
+    fixtures = [
+        'products-fixture.json',
+    ]
+
+    def setUp(self) -> None:
+        cache.clear()
+        with translation.override("en"):
+            self.export_url = reverse("shopapp:products-export")
+            self.api_url = reverse("shopapp:product-list")
+
+    def test_products_export_sees_writes_immediately(self):
+        self.client.get(self.export_url)
+        with self.assertNumQueries(0):
+            self.client.get(self.export_url)
+
+        product = Product.objects.order_by("pk").first()
+        product.name = "Renamed product"
+        product.save()
+
+        response = self.client.get(self.export_url)
+        self.assertEqual(response.json()["products"][0]["name"], "Renamed product")
+
+    def test_products_api_list_invalidated_on_delete(self):
+        count = self.client.get(self.api_url).json()["count"]
+        Product.objects.order_by("pk").first().delete()
+        self.assertEqual(self.client.get(self.api_url).json()["count"], count - 1)
+
+    def test_bump_generation_changes_key(self):
+        key = versioned_key("something", ["products"], 1)
+        self.assertEqual(key, versioned_key("something", ["products"], 1))
+        bump_generation("products")
+        self.assertNotEqual(key, versioned_key("something", ["products"], 1))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GetOrComputeTestCase(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.calls = []
+
+    def compute(self, value="value"):
+        def compute():
+            self.calls.append(value)
+            return value
+
+        return compute
+
+    def get(self, value="value", **kwargs):
+        kwargs.setdefault("beta", 0)
+        return get_or_compute("thing", ["products"], self.compute(value), 1, **kwargs)
+
+    def hold_lock(self):
+        cache.add(LOCK_KEY.format(key="swr:thing:1"), "other", 30)
+
+    def test_fresh_value_is_computed_once(self):
+        self.assertEqual(self.get("first"), "first")
+        self.assertEqual(self.get("second"), "first")
+        self.assertEqual(self.calls, ["first"])
+
+    def test_generation_bump_recomputes(self):
+        self.get("first")
+        bump_generation("products")
+        self.assertEqual(self.get("second"), "second")
+        self.assertEqual(self.get("third"), "second")
+
+    def test_stale_value_served_while_another_request_recomputes(self):
+        self.get("first")
+        bump_generation("products")
+        self.hold_lock()
+        self.assertEqual(self.get("second"), "first")
+        self.assertEqual(self.calls, ["first"])
+
+    def test_expired_value_served_within_stale_timeout(self):
+        with mock.patch("mysite.caching.time.time", return_value=1000.0):
+            self.get("first", timeout=10)
+        self.hold_lock()
+        with mock.patch("mysite.caching.time.time", return_value=1011.0):
+            self.assertEqual(self.get("second", timeout=10), "first")
+        cache.clear()
+        with mock.patch("mysite.caching.time.time", return_value=1011.0):
+            self.assertEqual(self.get("second", timeout=10), "second")
+
+    def test_cold_key_waits_for_lock_holder(self):
+        self.hold_lock()
+
+        def finish_elsewhere(seconds):
+            # другой воркер снял блокировку и записал значение
+            cache.delete(LOCK_KEY.format(key="swr:thing:1"))
+            get_or_compute("thing", ["products"], lambda: "elsewhere", 1, beta=0)
+
+        with mock.patch("mysite.caching.time.sleep", side_effect=finish_elsewhere):
+            self.assertEqual(self.get("mine"), "elsewhere")
+        self.assertEqual(self.calls, [])
+
+    def test_lock_is_released_when_compute_fails(self):
+        def fail():
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            get_or_compute("thing", ["products"], fail, 1)
+        self.assertFalse(cache.has_key(LOCK_KEY.format(key="swr:thing:1")))
+        self.assertEqual(self.get("value"), "value")
+
+    def test_async_variant_shares_entries(self):
+        async def compute():
+            return "async"
+
+        self.get("sync")
+        bump_generation("products")
+        result = async_to_sync(aget_or_compute)(
+            "thing", ["products"], compute, 1, beta=0
+        )
+        self.assertEqual(result, "async")
+        self.assertEqual(self.get("sync"), "async")
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrderHistorySnapshotTestCase(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create_user(username="history")
+        self.other = User.objects.create_user(username="other")
+        self.product = Product.objects.create(name="Lamp", price=10)
+        self.order = Order.objects.create(user=self.user, delivery_address="Street")
+
+    def export(self, user=None):
+        with translation.override("en"):
+            url = reverse(
+                "shopapp:export_user_orders", kwargs={"user_id": (user or self.user).pk}
+            )
+        return self.client.get(url)
+
+    def write(self, action):
+        with self.captureOnCommitCallbacks(execute=True):
+            action()
+
+    def test_snapshot_includes_products_and_totals(self):
+        self.write(lambda: self.order.products.add(self.product))
+        with self.assertNumQueries(0):
+            history = self.export().json()
+        self.assertEqual(
+            history,
+            [
+                {
+                    "id": self.order.pk,
+                    "delivery_address": "Street",
+                    "promocode": "",
+                    "created_at": self.order.created_at.isoformat(),
+                    "products_count": 1,
+                    "total": "10.00",
+                    "discounted_total": "10.00",
+                    "products": [
+                        {
+                            "id": self.product.pk,
+                            "name": "Lamp",
+                            "price": "10.00",
+                            "discount_price": "10.00",
+                        }
+                    ],
+                }
+            ],
+        )
+
+    def test_writes_are_visible_without_queries(self):
+        self.export()
+        second = Order.objects.create(user=self.user, delivery_address="Avenue")
+        self.write(lambda: second.save())
+        self.write(lambda: second.products.add(self.product))
+        self.write(lambda: self.order.delete())
+        with self.assertNumQueries(0):
+            history = self.export().json()
+        self.assertEqual([order["id"] for order in history], [second.pk])
+        self.assertEqual(history[0]["products"][0]["name"], "Lamp")
+
+        self.product.name = "Desk lamp"
+        self.write(self.product.save)
+        with self.assertNumQueries(0):
+            history = self.export().json()
+        self.assertEqual(history[0]["products"][0]["name"], "Desk lamp")
+
+    def test_order_moved_to_another_user(self):
+        self.export()
+        self.export(self.other)
+        self.order.user = self.other
+        self.write(self.order.save)
+        self.assertEqual(self.export().json(), [])
+        self.assertEqual(self.export(self.other).json()[0]["id"], self.order.pk)
+
+    def test_refresh_patches_only_changed_orders(self):
+        for i in range(5):
+            Order.objects.create(user=self.user, delivery_address=f"Street {i}")
+        self.export()
+        # заказы и их товары; остальные заказы пользователя не перечитываются
+        with self.assertNumQueries(2):
+            refresh_order_history(Order.objects.filter(pk=self.order.pk))
+
+    def test_generation_bump_rebuilds_snapshot(self):
+        self.export()
+        Order.objects.bulk_create([Order(user=self.user, delivery_address="Bulk")])
+        self.assertEqual(len(self.export().json()), 1)
+        bump_generation(HISTORY_GROUP)
+        self.assertEqual(len(self.export().json()), 2)
+
+    def test_outdated_snapshot_is_rebuilt_once(self):
+        self.export()
+        bump_generation(HISTORY_GROUP)
+        self.export()
+        with self.assertNumQueries(0):
+            self.export()
+
+    def test_reader_does_not_overwrite_writer_snapshot(self):
+        newer = [{"id": self.order.pk, "written": "by writer"}]
+
+        def build_then_writer_stores(user_id):
+            history = build_order_history(user_id)
+            # писатель успел сохранить документ, пока читатель собирал свой
+            _store(user_id, get_generation(HISTORY_GROUP), newer)
+            return history
+
+        with mock.patch(
+            "shopapp.order_history.build_order_history",
+            side_effect=build_then_writer_stores,
+        ):
+            self.assertEqual(self.export().json(), newer)
+        self.assertEqual(get_order_history(self.user.pk), newer)
+
+    def test_reader_does_not_store_while_writer_holds_lock(self):
+        cache.add(LOCK_KEY.format(key=f"order-history:{self.user.pk}"), True)
+        self.export()
+        with CaptureQueriesContext(connection) as context:
+            self.export()
+        self.assertTrue(context.captured_queries)
+
+    def test_unknown_user_is_not_found(self):
+        with translation.override("en"):
+            url = reverse("shopapp:export_user_orders", kwargs={"user_id": 10**6})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductApiCacheKeyTestCase(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        Product.objects.create(name="Cheap lamp", price=10)
+        Product.objects.create(name="Expensive lamp", price=100)
+
+    def get(self, query, language="en"):
+        with translation.override(language):
+            url = reverse("shopapp:product-list")
+        return self.client.get(f"{url}?{query}")
+
+    def test_equivalent_queries_share_entry(self):
+        first = self.get("search=lamp&ordering=-price&page=1")
+        with self.assertNumQueries(0):
+            permuted = self.get("page=1&ordering=-price&search=lamp")
+            tracked = self.get("utm_source=mail&ordering=-price&search=lamp&page=1")
+        self.assertEqual(permuted.json()["results"], first.json()["results"])
+        self.assertEqual(tracked.json()["results"], first.json()["results"])
+
+    def test_pagination_links_do_not_carry_tracking_parameters(self):
+        for i in range(10):
+            Product.objects.create(name=f"Lamp {i}", price=i)
+        first = self.get("utm_source=mail&search=lamp&page=1").json()
+        self.assertNotIn("utm_source", first["next"])
+        self.assertIn("search=lamp", first["next"])
+        with self.assertNumQueries(0):
+            second = self.get("page=1&search=lamp&utm_campaign=x").json()
+        self.assertEqual(second["next"], first["next"])
+
+    def test_declared_parameters_keep_entries_apart(self):
+        self.get("ordering=price")
+        response = self.get("ordering=-price")
+        self.assertEqual(response.json()["results"][0]["name"], "Expensive lamp")
+        response = self.get("ordering=price&price=100")
+        self.assertEqual(response.json()["count"], 1)
+        response = self.get("cursor=&page_size=1")
+        self.assertEqual(len(response.json()["results"]), 1)
+
+    def test_varies_on_language_and_authentication(self):
+        self.get("ordering=price")
+        with CaptureQueriesContext(connection) as context:
+            self.get("ordering=price", language="ru")
+        self.assertTrue(context.captured_queries)
+        self.client.force_login(User.objects.create_user(username="api"))
+        with CaptureQueriesContext(connection) as context:
+            self.get("ordering=price")
+        self.assertTrue(context.captured_queries)
+        other = User.objects.create_user(username="other")
+        self.client.force_login(other)
+        with CaptureQueriesContext(connection) as context:
+            self.get("ordering=price")
+        # сессия и пользователь читаются, а список товаров — нет
+        self.assertFalse(
+            [q for q in context.captured_queries if "shopapp_product" in q["sql"]]
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LatestProductFeedCacheTestCase(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.product = Product.objects.create(name="First product")
+        with translation.override("en"):
+            self.url = reverse("shopapp:latest-product-feed")
+
+    def test_repeat_poll_is_served_from_cache(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, "First product")
+        self.assertTrue(response.has_header("Last-Modified"))
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached["ETag"], response["ETag"])
+
+    def test_conditional_get_returns_not_modified(self):
+        response = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(
+                self.url, headers={"if-none-match": response["ETag"]}
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b"")
+        not_modified = self.client.get(
+            self.url, headers={"if-modified-since": response["Last-Modified"]}
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_if_modified_since_sees_rename_and_delete(self):
+        newest = Product.objects.create(name="Second product")
+        modified = self.client.get(self.url)["Last-Modified"]
+        self.product.name = "Renamed product"
+        self.product.save()
+        response = self.client.get(self.url, headers={"if-modified-since": modified})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Renamed product")
+
+        modified = response["Last-Modified"]
+        newest.delete()
+        response = self.client.get(self.url, headers={"if-modified-since": modified})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "Second product")
+
+    def test_unchanged_feed_keeps_last_modified(self):
+        modified = self.client.get(self.url)["Last-Modified"]
+        bump_generation("products")
+        with mock.patch("mysite.feeds.time.time", return_value=time() + 3600):
+            response = self.client.get(self.url)
+        self.assertEqual(response["Last-Modified"], modified)
+
+    def test_product_write_invalidates_feed(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.product.name = "Renamed product"
+        self.product.save()
+        response = self.client.get(self.url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Renamed product")
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class KeysetPaginationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(username="keyset", password="qwerty")
+        Order.objects.bulk_create(
+            Order(user=cls.user, promocode=f"CODE{i % 3}", delivery_address=address)
+            for i, address in enumerate(["b", None, "a", "c", None, "a", "b"])
+        )
+
+    def setUp(self) -> None:
+        self.client.force_login(self.user)
+        with translation.override("en"):
+            self.url = reverse("shopapp:order-list")
+
+    def walk(self, params, link="next"):
+        """Проходит все страницы по ссылкам и возвращает pk в порядке выдачи."""
+        response = self.client.get(self.url, {**params, "cursor": "", "page_size": 2})
+        data = response.json()
+        self.assertNotIn("count", data)
+        pks = [order["id"] for order in data["results"]]
+        while data[link]:
+            data = self.client.get(data[link]).json()
+            pks.extend(order["id"] for order in data["results"])
+        return pks, data
+
+    def test_pages_follow_ordering_with_pk_tie_break(self):
+        for ordering in ("promocode", "-promocode", "delivery_address", "-created_at"):
+            with self.subTest(ordering=ordering):
+                pks, _ = self.walk({"ordering": ordering})
+                field = ordering.lstrip("-")
+                descending = ordering.startswith("-")
+
+                def key(order):
+                    value = getattr(order, field)
+                    # NULL идёт первым по возрастанию
+                    return value is not None, value or "", order.pk
+
+                orders = sorted(Order.objects.all(), key=key, reverse=descending)
+                self.assertEqual(pks, [order.pk for order in orders])
+
+    def test_previous_links_walk_back(self):
+        forward, last_page = self.walk({"ordering": "promocode"})
+        self.assertIsNone(last_page["next"])
+        backward = [order["id"] for order in last_page["results"]]
+        data = last_page
+        while data["previous"]:
+            data = self.client.get(data["previous"]).json()
+            backward = [order["id"] for order in data["results"]] + backward
+        self.assertEqual(backward, forward)
+
+    def test_keyset_page_skips_count_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, {"cursor": ""})
+        self.assertFalse(any("COUNT(" in q["sql"] for q in queries))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductFullTextSearchTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.bulk_create(
+            [
+                Product(name="Gaming laptop", description="Fast laptop for games"),
+                Product(name="Office laptop", description="Light"),
+                Product(name="Desk lamp", description="Warm light for a laptop desk"),
+                Product(name="Smartphone", description="Android phone"),
+            ]
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+        with translation.override("en"):
+            self.url = reverse("shopapp:product-list")
+
+    def search(self, term):
+        response = self.client.get(self.url, {"search": term})
+        return [product["name"] for product in response.json()["results"]]
+
+    def test_ranked_prefix_search(self):
+        names = self.search("lapt")
+        self.assertEqual(len(names), 3)
+        self.assertEqual(names[-1], "Desk lamp")
+        self.assertEqual(self.search("smart andr"), ["Smartphone"])
+        self.assertEqual(self.search('"OR laptop'), [])
+
+    def test_index_follows_writes(self):
+        Product.objects.filter(name="Smartphone").update(name="Tablet")
+        self.assertEqual(self.search("smartphone"), [])
+        self.assertEqual(self.search("tablet"), ["Tablet"])
+        Product.objects.filter(name="Tablet").delete()
+        self.assertEqual(self.search("tablet"), [])
+
+
+class OrderViewSetQueryCountTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(username="queries", password="qwerty")
+        products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", price=i) for i in range(5)
+        )
+        orders = Order.objects.bulk_create(
+            Order(user=cls.user, delivery_address=f"Street {i}") for i in range(20)
+        )
+        for order in orders:
+            order.products.set(products[: order.pk % 5 + 1])
+
+    def setUp(self) -> None:
+        self.client.force_login(self.user)
+        with translation.override("en"):
+            self.url = reverse("shopapp:order-list")
+
+    def count_queries(self, page_size):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, {"cursor": "", "page_size": page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), page_size)
+        return len(context.captured_queries)
+
+    def test_queries_do_not_depend_on_page_size(self):
+        self.assertEqual(self.count_queries(2), self.count_queries(20))
+
+    def test_products_are_serialized(self):
+        response = self.client.get(self.url, {"cursor": "", "page_size": 20})
+        for data in response.json()["results"]:
+            order = Order.objects.get(pk=data["id"])
+            self.assertEqual(data["products"], [p.pk for p in order.products.all()])
+
+
+class OrderTotalsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="totals", password="qwerty")
+        cls.cheap = Product.objects.create(name="Cheap", price="10.00", discount=10)
+        cls.dear = Product.objects.create(name="Dear", price="99.99", discount=0)
+
+    def setUp(self) -> None:
+        self.order = Order.objects.create(user=self.user)
+
+    def assertTotals(self, order, count, total, discounted):
+        order.refresh_from_db()
+        self.assertEqual(
+            (order.products_count, str(order.total), str(order.discounted_total)),
+            (count, total, discounted),
+        )
+
+    def test_products_changes(self):
+        self.assertTotals(self.order, 0, "0.00", "0.00")
+        self.order.products.add(self.cheap, self.dear)
+        self.assertTotals(self.order, 2, "109.99", "108.99")
+        self.order.products.remove(self.dear)
+        self.assertTotals(self.order, 1, "10.00", "9.00")
+        self.dear.orders.add(self.order)
+        self.assertTotals(self.order, 2, "109.99", "108.99")
+        self.cheap.orders.clear()
+        self.assertTotals(self.order, 1, "99.99", "99.99")
+        self.order.products.clear()
+        self.assertTotals(self.order, 0, "0.00", "0.00")
+
+    def test_product_price_change_and_delete(self):
+        self.order.products.add(self.cheap, self.dear)
+        self.cheap.price = "20.00"
+        self.cheap.save()
+        self.assertTotals(self.order, 2, "119.99", "117.99")
+        self.dear.discount = 50
+        self.dear.save(update_fields=["discount"])
+        self.assertTotals(self.order, 2, "119.99", "68.00")
+        self.dear.delete()
+        self.assertTotals(self.order, 1, "20.00", "18.00")
+
+    def test_import_fills_totals(self):
+        file = BytesIO(
+            (
+                "user_id,delivery_address,promocode,product_ids\n"
+                f'{self.user.pk},Street,,"{self.cheap.pk},{self.dear.pk}"\n'
+            ).encode()
+        )
+        save_csv_orders(file, encoding="utf-8")
+        order = Order.objects.get(delivery_address="Street")
+        self.assertTotals(order, 2, "109.99", "108.99")
+
+    def test_reconcile_command(self):
+        self.order.products.add(self.cheap)
+        Product.objects.filter(pk=self.cheap.pk).update(price="30.00")
+        self.assertEqual(list(stale_order_totals()), [self.order])
+        call_command("reconcile_order_totals", stdout=StringIO())
+        self.assertFalse(stale_order_totals().exists())
+        self.assertTotals(self.order, 1, "30.00", "27.00")
+
+    def test_api_filters_and_orders_by_total(self):
+        self.order.products.add(self.dear)
+        Order.objects.create(user=self.user).products.add(self.cheap)
+        self.client.force_login(User.objects.create_superuser(username="admin"))
+        with translation.override("en"):
+            url = reverse("shopapp:order-list")
+        response = self.client.get(url, {"total__gte": 50})
+        results = response.json()["results"]
+        self.assertEqual([order["id"] for order in results], [self.order.pk])
+        response = self.client.get(url, {"ordering": "-total", "cursor": ""})
+        totals = [o["total"] for o in response.json()["results"]]
+        self.assertEqual(totals, ["99.99", "10.00"])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductDiscountPriceTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(name=name, price=price, discount=discount)
+            for name, price, discount in [
+                ("A", "10.00", 5),
+                ("B", "19.99", 0),
+                ("C", "50.00", 80),
+                ("D", "33.33", 33),
+            ]
+        ]
+
+    def setUp(self) -> None:
+        cache.clear()
+        with translation.override("en"):
+            self.url = reverse("shopapp:product-list")
+
+    def test_generated_on_write(self):
+        product = Product.objects.get(name="D")
+        self.assertEqual(str(product.discount_price), "22.33")
+        Product.objects.filter(pk=product.pk).update(discount=0)
+        product.refresh_from_db()
+        self.assertEqual(str(product.discount_price), "33.33")
+
+    def test_api_range_filter_and_ordering(self):
+        params = {
+            "discount_price__gte": 9.5,
+            "discount_price__lte": 20,
+            "ordering": "discount_price",
+        }
+        results = self.client.get(self.url, params).json()["results"]
+        self.assertEqual([p["name"] for p in results], ["A", "C", "B"])
+        self.assertEqual(
+            [p["discount_price"] for p in results], ["9.50", "10.00", "19.99"]
+        )
+
+    def test_cheapest_uses_index(self):
+        queryset = Product.objects.order_by("discount_price", "id")[:5]
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + str(queryset.query))
+            plan = " ".join(str(row) for row in cursor.fetchall())
+        self.assertIn("shopapp_pro_discoun_c0f011_idx", plan)
+
+
+def make_image(name="photo.png", size=(1200, 800)):
+    buffer = BytesIO()
+    Image.new("RGB", size, "orange").save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductRenditionsTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(
+            MEDIA_ROOT=cls.media_root, IMAGE_RENDITION_WORKERS=0
+        )
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def create_product(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Product.objects.create(name="Photo", preview=make_image())
+
+    def test_renditions_are_built_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            product = Product.objects.create(name="Photo", preview=make_image())
+        product.refresh_from_db()
+        self.assertEqual(product.preview_renditions, {})
+        self.assertEqual(len(callbacks), 1)
+
+        callbacks[0]()
+        product.refresh_from_db()
+        data = product.preview_renditions
+        self.assertEqual(data["source"], product.preview.name)
+        dimensions = {
+            label: (size["width"], size["height"])
+            for label, size in data["sizes"].items()
+        }
+        self.assertEqual(dimensions, {"thumb": (200, 133), "medium": (500, 333)})
+        for size in data["sizes"].values():
+            with Image.open(product.preview.storage.path(size["name"])) as image:
+                self.assertEqual(image.format, "WEBP")
+                self.assertEqual(image.size, (size["width"], size["height"]))
+
+    def test_replacing_image_removes_old_renditions(self):
+        product = self.create_product()
+        product.refresh_from_db()
+        old = [size["name"] for size in product.preview_renditions["sizes"].values()]
+        with self.captureOnCommitCallbacks(execute=True):
+            product.preview = make_image("other.png", (300, 600))
+            product.save()
+        product.refresh_from_db()
+        self.assertEqual(product.preview_renditions["sizes"]["thumb"]["height"], 200)
+        storage = product.preview.storage
+        self.assertFalse(any(storage.exists(name) for name in old))
+
+    def test_templates_and_api_use_renditions(self):
+        product = self.create_product()
+        with translation.override("en"):
+            details = reverse("shopapp:product_details", kwargs={"pk": product.pk})
+            api = reverse("shopapp:product-detail", kwargs={"pk": product.pk})
+        product.refresh_from_db()
+        thumb = product.preview_renditions["sizes"]["thumb"]
+        response = self.client.get(details)
+        self.assertContains(response, f'{settings.MEDIA_URL}{thumb["name"]}')
+        self.assertContains(response, 'width="200" height="133"')
+
+        data = self.client.get(api).json()["preview_renditions"]
+        self.assertEqual(data["thumb"]["width"], 200)
+        self.assertTrue(data["thumb"]["url"].endswith(thumb["name"]))
+
+    def test_product_images_get_renditions(self):
+        product = Product.objects.create(name="Gallery")
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ProductImage.objects.create(product=product, image=make_image())
+        image.refresh_from_db()
+        self.assertEqual(image.renditions["sizes"]["medium"]["width"], 500)
+
+
+class BackgroundJobsTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username="jobs", password="qwerty")
+        self.client.force_login(self.user)
+        with translation.override("en"):
+            self.upload_url = reverse("shopapp:product-upload-csv")
+
+    def test_background_upload_returns_202_and_worker_imports(self):
+        file = SimpleUploadedFile(
+            "products.csv", b"name,price\nLamp,10\nDesk,20\n", content_type="text/csv"
+        )
+        response = self.client.post(
+            f"{self.upload_url}?background=true", {"file": file}
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], "queued")
+        self.assertFalse(Product.objects.exists())
+        job = Job.objects.get()
+        stored = job.payload["file"]
+        self.assertTrue(jobs.default_storage.exists(stored))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("runworker", workers=0, burst=True, stdout=StringIO())
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertFalse(jobs.default_storage.exists(stored))
+
+        data = self.client.get(response["Location"]).json()
+        self.assertEqual(data["status"], "succeeded")
+        self.assertEqual(data["progress"], 100)
+        self.assertEqual(data["result"]["created"], 2)
+
+    def test_failed_job_is_retried_with_backoff(self):
+        calls = []
+
+        def flaky(context):
+            calls.append(context.job.pk)
+            raise RuntimeError("boom")
+
+        jobs.HANDLERS["flaky"] = (flaky, 2)
+        self.addCleanup(jobs.HANDLERS.pop, "flaky")
+        job = jobs.enqueue("flaky")
+
+        with self.assertLogs("shopapp.jobs", "ERROR"):
+            self.assertEqual(jobs.run_job(jobs.claim_next("test").pk), "queued")
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_after, job.created_at)
+        self.assertIsNone(jobs.claim_next("test"))
+
+        Job.objects.filter(pk=job.pk).update(run_after=job.created_at)
+        with self.assertLogs("shopapp.jobs", "ERROR"):
+            self.assertEqual(jobs.run_job(jobs.claim_next("test").pk), "failed")
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", 2))
+        self.assertIn("RuntimeError: boom", job.error)
+        self.assertEqual(len(calls), 2)
+
+    def test_stale_run_counts_as_attempt(self):
+        stale = timezone.now() - jobs.STALE_AFTER * 2
+        retried = jobs.enqueue("export_products_csv")
+        single = jobs.enqueue(
+            "import_products_csv",
+            {"file": jobs.store_upload(SimpleUploadedFile("p.csv", b"name\n"))},
+        )
+        Job.objects.update(
+            status=Job.Status.RUNNING, heartbeat_at=stale, worker="dead:1"
+        )
+
+        with self.assertLogs("shopapp.jobs", "WARNING"):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(jobs.requeue_stale(), 1)
+        retried.refresh_from_db()
+        self.assertEqual((retried.status, retried.attempts), ("queued", 1))
+        # импорт с max_attempts=1 не повторяется: строки задублировались бы
+        single.refresh_from_db()
+        self.assertEqual((single.status, single.attempts), ("failed", 1))
+        self.assertIn("dead:1", single.error)
+        self.assertFalse(jobs.default_storage.exists(single.payload["file"]))
+
+    def test_crashed_process_job_is_retried_by_a_new_pool(self):
+        def crash(context):
+            os._exit(1)
+
+        jobs.HANDLERS["crash"] = (crash, 2)
+        self.addCleanup(jobs.HANDLERS.pop, "crash")
+        job = jobs.enqueue("crash")
+
+        with self.assertLogs("shopapp.jobs", "WARNING"):
+            call_command(
+                "runworker", workers=1, processes=True, burst=True, stdout=StringIO()
+            )
+        # пул пересоздан, задача повторена и после второй попытки завершена
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", 2))
+        self.assertIn("BrokenProcessPool", job.error)
+
+    def test_background_export_writes_file(self):
+        Product.objects.create(name="Lamp", price=10)
+        with translation.override("en"):
+            url = reverse("shopapp:product-download-csv")
+        response = self.client.get(f"{url}?background=true")
+        self.assertEqual(response.status_code, 202)
+        job = Job.objects.get(kind="export_products_csv")
+        self.assertEqual(job.created_by, self.user)
+
+        call_command("runworker", workers=0, burst=True, stdout=StringIO())
+        result = self.client.get(response["Location"]).json()["result"]
+        with jobs.default_storage.open(result["file"]) as file:
+            self.assertIn(b"Lamp", file.read())
+
+    def test_jobs_are_private(self):
+        job = jobs.enqueue("export_products_csv", user=self.user)
+        with translation.override("en"):
+            url = reverse("shopapp:job-detail", kwargs={"pk": job.pk})
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.force_login(User.objects.create_user(username="other"))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class SitemapSectionsTestCase(TestCase):
+    def setUp(self) -> None:
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_override = override_settings(
+            SITEMAP_ROOT=self.root,
+            SITEMAP_SECTION_SIZE=10,
+            SITEMAP_BASE_URL="https://shop.example.com",
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        Product.objects.bulk_create(
+            Product(pk=pk, name=f"Product {pk}") for pk in range(1, 25)
+        )
+
+    def build(self):
+        return build_sitemaps()
+
+    def test_sections_are_built(self):
+        self.assertEqual(self.build(), {"written": 3, "unchanged": 0, "removed": 0})
+        with open(f"{self.root}/sitemap.xml") as file:
+            index = file.read()
+        for bucket in range(3):
+            self.assertIn(
+                f"https://shop.example.com/sitemap-shopapp-{bucket}.xml", index
+            )
+        with open(f"{self.root}/sitemap-shopapp-1.xml") as file:
+            section = file.read()
+        self.assertEqual(section.count("<url>"), 10)
+        self.assertIn("https://shop.example.com/", section)
+
+    def test_only_changed_sections_are_rewritten(self):
+        self.build()
+        self.assertEqual(self.build(), {"written": 0, "unchanged": 3, "removed": 0})
+
+        Product.objects.filter(pk=15).update(archived=True)
+        self.assertEqual(self.build(), {"written": 1, "unchanged": 2, "removed": 0})
+        with open(f"{self.root}/sitemap-shopapp-1.xml") as file:
+            self.assertEqual(file.read().count("<url>"), 9)
+
+        Product.objects.filter(pk__gte=18).delete()
+        self.assertEqual(self.build(), {"written": 1, "unchanged": 1, "removed": 1})
+        self.assertFalse(os.path.exists(f"{self.root}/sitemap-shopapp-2.xml"))
+
+    def test_views_serve_files_without_queries(self):
+        self.build()
+        with translation.override("en"):
+            index_url = reverse("django.contrib.sitemaps.views")
+            section_url = reverse(
+                "sitemap-section", kwargs={"name": "shopapp", "bucket": 0}
+            )
+            missing_url = reverse(
+                "sitemap-section", kwargs={"name": "shopapp", "bucket": 7}
+            )
+        with self.assertNumQueries(0):
+            response = self.client.get(index_url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b"sitemap-shopapp-0.xml", b"".join(response))
+            response = self.client.get(section_url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b"".join(response).count(b"<url>"), 9)
+            self.assertEqual(self.client.get(missing_url).status_code, 404)
+
+
+class TemporaryCachesSettingsTestCase(TestCase):
+    @override_settings(
+        CACHES={
+            "default": {
+                "BACKEND": "mysite.cache_backends.TwoTierCache",
+                "LOCATION": "shared",
+            },
+            "shared": {
+                "BACKEND": "mysite.cache_backends.ShardedDiskCache",
+                "LOCATION": "/var/tmp/django_cache",
+                "OPTIONS": {"MAX_ENTRIES": 10},
+            },
+            "sessions": {
+                "BACKEND": "django.core.cache.backends.redis.RedisCache",
+                "LOCATION": "redis://localhost:6379",
+            },
+        }
+    )
+    def test_benchmark_caches_do_not_share_site_storage(self):
+        temporary = temporary_caches_settings("/tmp/bench")
+        self.assertEqual(temporary["default"], settings.CACHES["default"])
+        self.assertEqual(
+            temporary["shared"],
+            {
+                "BACKEND": "mysite.cache_backends.ShardedDiskCache",
+                "LOCATION": "/tmp/bench/shared",
+                "OPTIONS": {"MAX_ENTRIES": 10},
+            },
+        )
+        self.assertEqual(
+            temporary["sessions"]["BACKEND"],
+            "django.core.cache.backends.locmem.LocMemCache",
+        )
+
+
+class GenerateDataTestCase(TestCase):
+    def generate(self, **counts):
+        call_command("generate_data", seed=3, stdout=StringIO(), **counts)
+
+    def snapshot(self):
+        return (
+            list(User.objects.values_list("username", "first_name", "last_name")),
+            list(Product.objects.values_list("name", "price", "discount")),
+            list(Order.objects.values_list("user_id", "promocode", "total")),
+            list(Order.products.through.objects.values_list("order_id", "product_id")),
+        )
+
+    def test_generates_related_rows(self):
+        self.generate(users=5, products=20, orders=10, articles=4, news=3)
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Profile.objects.count(), 5)
+        self.assertEqual(Product.objects.count(), 20)
+        self.assertEqual(Order.objects.filter(products_count__gte=1).count(), 10)
+        self.assertFalse(stale_order_totals().exists())
+        self.assertEqual(Article.objects.count(), 4)
+        self.assertEqual(ArticleNews.objects.count(), 3)
+
+    def test_same_seed_gives_same_data(self):
+        snapshots = []
+        for _ in range(2):
+            with transaction.atomic():
+                self.generate(users=5, products=20, orders=10)
+                snapshots.append(self.snapshot())
+                transaction.set_rollback(True)
+        self.assertEqual(snapshots[0], snapshots[1])
+        self.assertTrue(snapshots[0][3])
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    REQUEST_METRICS_ENABLED=True,
+    REQUEST_METRICS_SAMPLE_RATE=1.0,
+    REQUEST_METRICS_SLOW_MS=60_000,
+)
+class RequestMetricsMiddlewareTestCase(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        Product.objects.create(name="Measured product")
+        with translation.override("en"):
+            self.url = reverse("shopapp:products-export")
+
+    def get_metrics(self, url):
+        with self.assertLogs("mysite.metrics", "INFO") as logs:
+            response = self.client.get(url)
+        self.assertEqual(len(logs.records), 1)
+        return response, logs.records[0].metrics
+
+    def test_records_sql_cache_and_size(self):
+        response, metrics = self.get_metrics(self.url)
+        self.assertEqual(metrics["view"], "shopapp:products-export")
+        self.assertEqual(metrics["status"], 200)
+        self.assertEqual(metrics["response_bytes"], len(response.content))
+        self.assertGreaterEqual(metrics["sql_count"], 1)
+        self.assertGreaterEqual(metrics["cache_misses"], 1)
+
+        _, metrics = self.get_metrics(self.url)
+        self.assertEqual(metrics["sql_count"], 0)
+        self.assertEqual(metrics["cache_misses"], 0)
+        self.assertGreaterEqual(metrics["cache_hits"], 2)
+
+    def test_streaming_response_is_reported_after_body(self):
+        self.client.force_login(User.objects.create_superuser(username="stream"))
+        with translation.override("en"):
+            url = reverse("shopapp:product-download-csv")
+        with self.assertNoLogs("mysite.metrics"):
+            response = self.client.get(url)
+        with self.assertLogs("mysite.metrics", "INFO") as logs:
+            body = b"".join(response.streaming_content)
+        self.assertIn(b"Measured product", body)
+        metrics = logs.records[0].metrics
+        self.assertEqual(metrics["response_bytes"], len(body))
+        self.assertGreaterEqual(metrics["sql_count"], 1)
+
+    def test_json_line_and_slow_threshold(self):
+        with override_settings(REQUEST_METRICS_SLOW_MS=0):
+            with self.assertLogs("mysite.metrics", "WARNING") as logs:
+                self.client.get(self.url)
+        line = json.loads(JsonFormatter().format(logs.records[0]))
+        self.assertEqual(line["message"], "slow request")
+        self.assertTrue(line["slow"])
+        self.assertEqual(line["view"], "shopapp:products-export")
+
+    def test_unsampled_requests_are_not_logged(self):
+        with override_settings(REQUEST_METRICS_SAMPLE_RATE=0.0):
+            with self.assertNoLogs("mysite.metrics"):
+                self.client.get(self.url)
+
+    def test_disabled_middleware_is_not_used(self):
+        with override_settings(REQUEST_METRICS_ENABLED=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                RequestMetricsMiddleware(lambda request: None)
+
+
+class ShopQueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    query_budgets = [
+        ViewBudget("shopapp:index", 0),
+        ViewBudget("shopapp:products_list", 1),
+        ViewBudget("shopapp:products-export", 1),
+        ViewBudget("shopapp:product_create", 0),
+        ViewBudget("shopapp:product_details", 2, lambda t: {"pk": t.product.pk}),
+        ViewBudget("shopapp:product_update", 1, lambda t: {"pk": t.product.pk}),
+        ViewBudget("shopapp:product_delete", 1, lambda t: {"pk": t.product.pk}),
+        ViewBudget("shopapp:order_list", 4),
+        ViewBudget("shopapp:order_details", 4, lambda t: {"pk": t.order.pk}),
+        ViewBudget("shopapp:create-order", 2),
+        ViewBudget("shopapp:order_update", 4, lambda t: {"pk": t.order.pk}),
+        ViewBudget("shopapp:order_delete", 1, lambda t: {"pk": t.order.pk}),
+        ViewBudget("shopapp:user_orders", 4, lambda t: {"user_id": t.user.pk}),
+        ViewBudget("shopapp:export_user_orders", 2, lambda t: {"user_id": t.user.pk}),
+        ViewBudget("shopapp:latest-product-feed", 1),
+        ViewBudget("shopapp:api-root", 2),
+        ViewBudget("shopapp:product-list", 4),
+        ViewBudget("shopapp:product-list", 4, query="search=Budget"),
+        ViewBudget("shopapp:product-detail", 3, lambda t: {"pk": t.product.pk}),
+        ViewBudget("shopapp:product-download-csv", 3),
+        ViewBudget("shopapp:order-list", 5),
+        ViewBudget("shopapp:order-detail", 4, lambda t: {"pk": t.order.pk}),
+        ViewBudget("shopapp:job-list", 4),
+        ViewBudget("shopapp:job-detail", 3, lambda t: {"pk": t.job.pk}),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(username="budget", password=None)
+        cls.product = Product.objects.create(name="Budget product", price=10)
+        cls.order = Order.objects.create(user=cls.user, delivery_address="Street")
+        cls.job = Job.objects.create(kind="noop", created_by=cls.user)
+
+    def setUp(self) -> None:
+        self.budget_user = self.user
+
+    def add_rows(self, count):
+        start = Product.objects.count()
+        products = Product.objects.bulk_create(
+            Product(name=f"Budget product {start + i}", price=start + i)
+            for i in range(count)
+        )
+        self.order.products.add(*products)
+        for i in range(count):
+            order = Order.objects.create(user=self.user, delivery_address=f"{i}")
+            order.products.set(products)
+            ProductImage.objects.create(product=self.product, image=f"budget/{i}.png")
+            Job.objects.create(kind="noop", created_by=self.user)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ListFragmentCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(username="fragments", password=None)
+        cls.product = Product.objects.create(name="Cached product", price=10)
+        cls.order = Order.objects.create(user=cls.user, delivery_address="Street")
+        cls.order.products.add(cls.product)
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.client.force_login(self.user)
+        with translation.override("en"):
+            self.products_url = reverse("shopapp:products_list")
+            self.orders_url = reverse("shopapp:order_list")
+            self.user_orders_url = reverse(
+                "shopapp:user_orders", kwargs={"user_id": self.user.pk}
+            )
+
+    def age(self, model, pk):
+        # updated_at в прошлом, чтобы сдвиг был заметен независимо от точности часов
+        model.objects.filter(pk=pk).update(updated_at="2000-01-01T00:00:00Z")
+
+    def test_product_item_rendered_from_cache_until_saved(self):
+        self.assertContains(self.client.get(self.products_url), "Cached product")
+        # update() не сдвигает updated_at: фрагмент остаётся прежним
+        Product.objects.filter(pk=self.product.pk).update(name="Silent rename")
+        self.assertContains(self.client.get(self.products_url), "Cached product")
+
+        self.product.refresh_from_db()
+        self.product.save()
+        self.assertContains(self.client.get(self.products_url), "Silent rename")
+
+    def test_image_changes_move_product_updated_at(self):
+        self.age(Product, self.product.pk)
+        ProductImage.objects.create(product=self.product, image="fragments/1.png")
+        self.product.refresh_from_db()
+        self.assertGreater(self.product.updated_at.year, 2000)
+
+    def test_order_items_follow_products_and_m2m(self):
+        self.assertContains(self.client.get(self.orders_url), "Cached product")
+        self.assertContains(self.client.get(self.user_orders_url), "(1 items)")
+
+        self.age(Order, self.order.pk)
+        other = Product.objects.create(name="Second product", price=5)
+        self.order.products.add(other)
+        self.order.refresh_from_db()
+        self.assertGreater(self.order.updated_at.year, 2000)
+        self.assertContains(self.client.get(self.orders_url), "Second product")
+        self.assertContains(self.client.get(self.user_orders_url), "(2 items)")
+
+        self.product.name = "Renamed product"
+        self.product.save()
+        self.assertContains(self.client.get(self.orders_url), "Renamed product")
+
+    def test_cached_order_items_skip_products(self):
+        self.client.get(self.orders_url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.orders_url)
+        self.assertContains(response, "Cached product")
+        sql = " ".join(query["sql"] for query in context.captured_queries)
+        self.assertNotIn("shopapp_order_products", sql)
+
+        # изображения товара заказ не выводит: фрагмент остаётся прежним
+        Product.objects.filter(pk=self.product.pk).update(name="Silent rename")
+        ProductImage.objects.create(product=self.product, image="fragments/2.png")
+        self.assertContains(self.client.get(self.orders_url), "Cached product")
+
+    def test_order_item_follows_owner_rename(self):
+        self.assertContains(self.client.get(self.orders_url), "Order by: fragments")
+        self.user.first_name = "Renamed"
+        self.user.save()
+        self.assertContains(self.client.get(self.orders_url), "Order by: Renamed")
+
+    def test_bulk_discount_refreshes_items_and_totals(self):
+        phone = Product.objects.create(name="Smartphone X", price=100)
+        self.order.products.add(phone)
+        self.assertContains(self.client.get(self.orders_url), "for $100.00")
+        self.age(Product, phone.pk)
+        call_command("bulk_actions", stdout=StringIO())
+        phone.refresh_from_db()
+        self.assertGreater(phone.updated_at.year, 2000)
+        self.assertContains(self.client.get(self.orders_url), "for $90.00")
+        self.order.refresh_from_db()
+        self.assertEqual(str(self.order.discounted_total), "100.00")
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "mysite.cache_backends.TwoTierCache",
+            "LOCATION": "tier2",
+            "OPTIONS": {"L1_MAX_ENTRIES": 2, "L1_TIMEOUT": 60},
+        },
+        "tier2": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "tier2",
+        },
+    }
+)
+class TwoTierCacheTestCase(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.l2 = caches["tier2"]
+        self.before = cache.stats()
+
+    def delta(self) -> dict:
+        after = cache.stats()
+        return {key: after[key] - self.before[key] for key in self.before}
+
+    def test_hot_key_served_from_memory(self):
+        cache.set("hot", {"value": 1})
+        # удаление только из L2: L1 этого процесса ещё держит копию
+        self.l2.delete("hot")
+        self.assertEqual(cache.get("hot"), {"value": 1})
+        self.assertEqual(self.delta()["l1_hits"], 1)
+
+        cache.get("hot")["value"] = 2
+        self.assertEqual(cache.get("hot"), {"value": 1})
+
+    def test_l2_hit_fills_l1_and_lru_is_bounded(self):
+        self.l2.set("shared", "from another worker")
+        self.assertEqual(cache.get("shared"), "from another worker")
+        self.assertEqual(cache.get("shared"), "from another worker")
+        delta = self.delta()
+        self.assertEqual((delta["l2_hits"], delta["l1_hits"]), (1, 1))
+
+        cache.set_many({"a": 1, "b": 2})
+        self.assertEqual(cache.stats()["l1_entries"], 2)
+        self.l2.delete("shared")
+        self.assertIsNone(cache.get("shared"))
+
+    def test_generation_keys_bypass_l1(self):
+        key = versioned_key("export", ["products"])
+        # другой воркер сдвигает поколение прямо в общем кеше
+        self.l2.incr("generation:products")
+        self.assertNotEqual(versioned_key("export", ["products"]), key)
+
+    def test_l1_copy_expires(self):
+        cache.set("short", "value")
+        self.l2.delete("short")
+        with mock.patch("mysite.cache_backends.time.time", return_value=time() + 61):
+            self.assertIsNone(cache.get("short"))
+
+    def test_metrics_count_one_lookup_per_get(self):
+        metrics = RequestMetrics()
+        instrument_cache_backends()
+        token = _current.set(metrics)
+        try:
+            cache.get("missing")
+            self.l2.set("present", 1)
+            cache.get("present")
+        finally:
+            _current.reset(token)
+        self.assertEqual((metrics.cache_hits, metrics.cache_misses), (1, 1))
+
+
+DISK_CACHE_WORKER_INCRS = 100
+DISK_CACHE_WORKER_KEYS = 100
+
+
+def _disk_cache_worker(directory) -> int:
+    # свой экземпляр: соединение с индексом не переживает fork
+    disk_cache = ShardedDiskCache(directory, {})
+    for _ in range(DISK_CACHE_WORKER_INCRS):
+        disk_cache.incr("counter")
+    return sum(
+        disk_cache.add(f"key-{i}", os.getpid())
+        for i in range(DISK_CACHE_WORKER_KEYS)
+    )
+
+
+class ShardedDiskCacheTestCase(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def make_cache(self, **options):
+        return ShardedDiskCache(
+            self.directory,
+            {"OPTIONS": {"COMPRESS_MIN_SIZE": 1024, **options}},
+        )
+
+    def entries(self, disk_cache) -> int:
+        index = disk_cache._index
+        count = index.execute("SELECT value FROM counters").fetchone()[0]
+        self.assertEqual(
+            count, index.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        )
+        return count
+
+    def test_basic_operations(self):
+        disk_cache = self.make_cache()
+        disk_cache.set("key", {"value": 1})
+        disk_cache.set("key", {"value": 2})
+        self.assertEqual(disk_cache.get("key"), {"value": 2})
+        self.assertFalse(disk_cache.add("key", "other"))
+        self.assertTrue(disk_cache.add("new", "other"))
+        disk_cache.set("counter", 1)
+        self.assertEqual(disk_cache.incr("counter"), 2)
+        self.assertEqual(self.entries(disk_cache), 3)
+
+        self.assertTrue(disk_cache.delete("key"))
+        self.assertIsNone(disk_cache.get("key"))
+        self.assertEqual(self.entries(disk_cache), 2)
+
+        disk_cache.set("short", 1, timeout=10)
+        self.assertTrue(disk_cache.touch("short", timeout=-1))
+        self.assertFalse(disk_cache.has_key("short"))
+
+        disk_cache.clear()
+        self.assertIsNone(disk_cache.get("new"))
+        self.assertEqual(self.entries(disk_cache), 0)
+
+    def test_files_are_sharded_and_large_values_compressed(self):
+        disk_cache = self.make_cache()
+        payload = [{"pk": i, "name": "Product"} for i in range(1000)]
+        disk_cache.set("export", payload)
+        name = disk_cache._name("export", None)
+        path = os.path.join(self.directory, name[:2], name[2:4], name + ".djcache")
+        self.assertLess(os.path.getsize(path), len(pickle.dumps(payload)) / 4)
+        self.assertEqual(disk_cache.get("export"), payload)
+
+    def test_add_and_incr_are_atomic_across_processes(self):
+        disk_cache = self.make_cache()
+        disk_cache.set("counter", 0)
+        with ProcessPoolExecutor(
+            max_workers=4, mp_context=get_context("fork")
+        ) as executor:
+            added = sum(executor.map(_disk_cache_worker, [self.directory] * 4))
+        self.assertEqual(disk_cache.get("counter"), 4 * DISK_CACHE_WORKER_INCRS)
+        # каждый ключ add() создал ровно один процесс
+        self.assertEqual(added, DISK_CACHE_WORKER_KEYS)
+
+    def test_expired_entry_is_dropped_from_index_on_read(self):
+        disk_cache = self.make_cache()
+        disk_cache.set("expired", 1, timeout=-1)
+        disk_cache.set("fresh", 2)
+        self.assertEqual(self.entries(disk_cache), 2)
+        self.assertIsNone(disk_cache.get("expired"))
+        self.assertEqual(self.entries(disk_cache), 1)
+        name = disk_cache._name("expired", None)
+        self.assertFalse(os.path.exists(disk_cache._path(name)))
+
+    def test_cull_does_not_delete_file_of_concurrent_set(self):
+        disk_cache = self.make_cache(MAX_ENTRIES=2, CULL_FREQUENCY=10)
+        disk_cache.set("victim", "old")
+        disk_cache.set("keeper", "kept")
+        other = self.make_cache()
+        writer = Thread(target=other.set, args=("victim", "new"))
+        unlink = disk_cache._unlink
+
+        def unlink_during_set(name):
+            # другой процесс пишет вытесняемый ключ, пока идёт вытеснение
+            writer.start()
+            writer.join(timeout=0.2)
+            unlink(name)
+
+        with mock.patch.object(disk_cache, "_unlink", unlink_during_set):
+            disk_cache.set("newcomer", 1)
+        writer.join()
+        self.assertEqual(disk_cache.get("victim"), "new")
+
+    def test_cull_evicts_expired_then_least_recently_read(self):
+        disk_cache = self.make_cache(MAX_ENTRIES=4, CULL_FREQUENCY=4)
+        disk_cache.set("expired", 1, timeout=-1)
+        for key in ("old", "read", "new"):
+            disk_cache.set(key, key)
+        disk_cache.get("read")
+        # пятая запись: вытесняются истёкшая и давно не читавшаяся "old"
+        disk_cache.set("fifth", 5)
+        self.assertEqual(self.entries(disk_cache), 3)
+        self.assertIsNone(disk_cache.get("old"))
+        for key in ("read", "new"):
+            self.assertEqual(disk_cache.get(key), key)
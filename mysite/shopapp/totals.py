@@ -0,0 +1,70 @@
+"""
+Денормализованные итоги заказов: products_count, total, discounted_total.
+
+Итоги хранятся в самой таблице заказов, чтобы списки можно было сортировать
+и фильтровать по сумме без JOIN с товарами и GROUP BY. Пересчёт выполняется
+одним UPDATE с коррелированными подзапросами для любого набора заказов;
+вызывают его сигналы (shopapp.signals), импорт CSV и команда
+reconcile_order_totals.
+"""
+
+from django.db.models import (
+    Count,
+    DecimalField,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce, Round
+
+from .models import Order
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def _aggregate(expression, output_field):
+    rows = (
+        Order.products.through.objects.filter(order_id=OuterRef("pk"))
+        .order_by()
+        .values("order_id")
+        .annotate(value=expression)
+        .values("value")
+    )
+    return Coalesce(
+        Subquery(rows, output_field=output_field),
+        Value(0),
+        output_field=output_field,
+    )
+
+
+def order_totals_expressions() -> dict:
+    """Выражения с актуальными итогами заказа (для update() или alias())."""
+    # Round: на SQLite суммы считаются в float, а сравнение в stale_order_totals
+    # не должно зависеть от погрешности последнего знака
+    return {
+        "products_count": _aggregate(Count("product_id"), IntegerField()),
+        "total": _aggregate(Round(Sum("product__price"), 2), MONEY),
+        "discounted_total": _aggregate(
+            Round(Sum("product__discount_price"), 2), MONEY
+        ),
+    }
+
+
+def refresh_order_totals(queryset) -> int:
+    """Пересчитывает итоги заказов queryset одним UPDATE, возвращает их число."""
+    return queryset.update(**order_totals_expressions())
+
+
+def stale_order_totals(queryset=None):
+    """Заказы, у которых сохранённые итоги расходятся с товарами."""
+    queryset = Order.objects.all() if queryset is None else queryset
+    expressions = order_totals_expressions()
+    expected = {f"expected_{name}": value for name, value in expressions.items()}
+    stale = Q()
+    for name in expressions:
+        stale |= ~Q(**{name: F(f"expected_{name}")})
+    return queryset.alias(**expected).filter(stale)
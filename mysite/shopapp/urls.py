@@ -17,6 +17,7 @@ from .views import (
     ProductsDataExportView,
     ProductViewSet,
     OrderViewSet,
+    JobViewSet,
     LatestProductFeed,
     UserOrdersListView,
     export_user_orders,
@@ -27,6 +28,7 @@ app_name = "shopapp"
 router = DefaultRouter()
 router.register("products", ProductViewSet)
 router.register("orders", OrderViewSet)
+router.register("jobs", JobViewSet)
 urlpatterns = [
     # path("", cache_page(60 * 2)(ShopIndexView.as_view()), name="index"),
     path("", ShopIndexView.as_view(), name="index"),
@@ -2,7 +2,6 @@
 
 import logging
 from timeit import default_timer
-from csv import DictWriter
 
 from django.contrib.auth.mixins import (
     LoginRequiredMixin,
@@ -10,19 +9,20 @@ from django.contrib.auth.mixins import (
 )
 from django.contrib.auth.models import User
 from django.contrib.gis.feeds import Feed
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models import prefetch_related_objects
 from django.http import (
     HttpRequest,
     HttpResponse,
     HttpResponseRedirect,
     JsonResponse,
     Http404,
+    StreamingHttpResponse,
 )
-from django.shortcuts import render, reverse, get_object_or_404
+from django.shortcuts import render, reverse
 from django.urls import reverse_lazy
-from django.utils.decorators import method_decorator
+from django.utils import translation
 from django.views import View
-from django.core.cache import cache
-from django.views.decorators.cache import cache_page
 from django.views.generic import (
     CreateView,
     DeleteView,
@@ -35,53 +35,43 @@ from drf_spectacular.utils import OpenApiResponse, extend_schema
 from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 from rest_framework.decorators import action
 from rest_framework.request import Request
 
+from mysite.cache_keys import api_cache_key_parts, canonical_request
+from mysite.caching import aget_or_compute, fragment_cache, get_or_compute
+from mysite.feeds import CachedFeedMixin
+
 from .forms import OrderForm, ProductForm
-from .models import Order, Product, ProductImage
-from .serializers import OrderSerializer, ProductSerializer
-from .command import save_csv_products
+from .jobs import enqueue, store_upload
+from .models import Job, Order, Product, ProductImage
+from .order_history import aget_order_history
+from .filters import ProductFilter
+from .pagination import PageNumberOrKeysetPagination
+from .search import ProductFullTextSearchFilter
+from .serializers import JobSerializer, OrderSerializer, ProductSerializer
+from .command import PRODUCT_CSV_FIELDS, iter_csv_products, save_csv_products
 
 
 log = logging.getLogger(__name__)
 
+ORDER_LIST_FRAGMENT = "order-list-item"
+
 
-def export_user_orders(request, user_id: int):
+async def export_user_orders(request, user_id: int):
     """
     Для экспорта заказов конкретного пользователя в JSON.
-    Результат кешируется для ускорения повторных запросов.
-    """
-
-    # Генерируем уникальный ключ кеша для пользователя
-    cache_key = f"user_orders_export_{user_id}"
-
-    # Пытаемся загрузить данные из кеша
-    cached_data = cache.get(cache_key)
-    if cached_data:
-        # Данные найдены в кеше → возвращаем их сразу
-        return JsonResponse(cached_data, safe=False)
-
-    user = get_object_or_404(User, pk=user_id)
 
-    orders = Order.objects.filter(user=user).order_by("pk")
-
-    # список словарей с нужными полями
-    data = [
-        {
-            "id": order.id,
-            "delivery_address": order.delivery_address,
-            "promocode": order.promocode,
-            "created_at": order.created_at.isoformat(),
-        }
-        for order in orders
-    ]
-
-    cache.set(cache_key, data, timeout=300)
-
-    # Возвращаем JSON-ответ
-    return JsonResponse(data, safe=False)
+    Отдаёт снимок истории заказов (shopapp.order_history): он обновляется
+    при каждой записи в заказы пользователя, поэтому всегда актуален, а
+    чтение обходится одним обращением к кешу без запросов к БД.
+    """
+    history = await aget_order_history(user_id)
+    if history is None:
+        raise Http404("No User matches the given query.")
+    return JsonResponse(history, safe=False)
 
 
 class UserOrdersListView(LoginRequiredMixin, ListView):
@@ -105,10 +95,11 @@ class UserOrdersListView(LoginRequiredMixin, ListView):
         return context
 
 
-class LatestProductFeed(Feed):
+class LatestProductFeed(CachedFeedMixin, Feed):
     title = "Product Feed"
     description = "Update product"
     link = reverse_lazy("shopapp:product-list")
+    cache_groups = ("products",)
 
     def items(self):
         return Product.objects.order_by("-created_at")[:5]
@@ -119,53 +110,112 @@ class LatestProductFeed(Feed):
     def item_description(self, item: Product):
         return item.description[:200]
 
+    def item_pubdate(self, item: Product):
+        return item.created_at
+
 
 @extend_schema(description="Products Views CRUD")
 class ProductViewSet(ModelViewSet):
     """
     ViewSet обеспечивает CRUD-операции для модели Product.
 
-    Включает функции фильтрации, поиска и упорядочивания.
+    Включает функции фильтрации, полнотекстового поиска (FTS5, параметр search)
+    и упорядочивания.
     """
 
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
-    filter_backends = (SearchFilter, DjangoFilterBackend, OrderingFilter)
+    pagination_class = PageNumberOrKeysetPagination
+    filter_backends = (
+        ProductFullTextSearchFilter,
+        DjangoFilterBackend,
+        OrderingFilter,
+    )
     search_fields = ("name", "description")
-    filterset_fields = ["name", "description", "price", "discount", "archived"]
-    ordering_fields = ["name", "price", "discount"]
-
-    @method_decorator(cache_page(60 * 2))
-    def list(self, *args, **kwargs):
-        return super().list(*args, **kwargs)
+    filterset_class = ProductFilter
+    ordering_fields = ["name", "price", "discount", "discount_price"]
+
+    def list(self, request: Request, *args, **kwargs):
+        """
+        Список товаров; кешируется до первого изменения товаров.
+
+        Ключ канонический (mysite.cache_keys): порядок параметров, лишние
+        параметры и префикс языка в URL не дробят кеш.
+        """
+        parent_list = super().list
+
+        def compute():
+            # ответ общий для всех вариантов URL: ссылки — по каноническому
+            with canonical_request(request, self):
+                return parent_list(request, *args, **kwargs).data
+
+        data = get_or_compute(
+            "products-api-list",
+            ["products"],
+            compute,
+            *api_cache_key_parts(request, self),
+        )
+        return Response(data)
+
+    def job_accepted(self, request: Request, job) -> Response:
+        """Ответ 202 на задачу в очереди; статус — по ссылке из Location."""
+        location = reverse("shopapp:job-detail", kwargs={"pk": job.pk})
+        return Response(
+            JobSerializer(job).data,
+            status=202,
+            headers={"Location": request.build_absolute_uri(location)},
+        )
 
     @action(detail=False, methods=["get"])
     def download_csv(self, request: Request):
-        response = HttpResponse(content_type="text/csv")
-        filename = f"products-export.csv"
-        response["Content-Disposition"] = f"attachment; filename={filename}"
+        """
+        Потоковый экспорт товаров в CSV.
+
+        Учитывает поиск, фильтры и сортировку из filter_queryset; строки читаются
+        из БД порциями, поэтому память не зависит от размера каталога.
+        С ?background=true весь каталог (без фильтров) выгружает в файл
+        runworker: ответ 202 с задачей, ссылка на файл — в её result.
+        """
+        if request.query_params.get("background") in ("1", "true"):
+            return self.job_accepted(
+                request, enqueue("export_products_csv", user=request.user)
+            )
         queryset = self.filter_queryset(self.get_queryset())
-        fields = [
-            "name",
-            "description",
-            "price",
-            "discount",
-        ]
-        queryset = queryset.only(*fields)
-        writer = DictWriter(response, fieldnames=fields)
-        writer.writeheader()
-
-        for product in queryset:
-            writer.writerow({field: getattr(product, field) for field in fields})
+        response = StreamingHttpResponse(
+            iter_csv_products(queryset, fields=PRODUCT_CSV_FIELDS),
+            content_type="text/csv",
+        )
+        filename = "products-export.csv"
+        response["Content-Disposition"] = f"attachment; filename={filename}"
         return response
 
     @action(detail=False, methods=["post"], parser_classes=[MultiPartParser])
     def upload_csv(self, request: Request):
-        products = save_csv_products(
+        """
+        Импорт товаров из CSV; возвращает отчёт с ошибками по строкам.
+
+        С ?background=true файл только сохраняется и ставится в очередь
+        runworker: ответ 202 с задачей, статус — по ссылке из Location.
+        """
+        if request.query_params.get("background") in ("1", "true"):
+            job = enqueue(
+                "import_products_csv",
+                {
+                    "file": store_upload(request.FILES["file"]),
+                    "encoding": request.encoding,
+                },
+                user=request.user,
+            )
+            return self.job_accepted(request, job)
+        report = save_csv_products(
             file=request.FILES["file"].file, encoding=request.encoding
         )
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        if report.created:
+            status = 201
+        else:
+            # пустой файл — не ошибка: 200 с пустым отчётом
+            status = 400 if report.failed else 200
+        return Response(report.as_dict(), status=status)
 
     @extend_schema(
         summary="Get one product by ID",
@@ -183,24 +233,46 @@ class ProductViewSet(ModelViewSet):
 class OrderViewSet(ModelViewSet):
     """CRUD ViewSet для модели Order."""
 
-    queryset = Order.objects.all()
+    queryset = OrderSerializer.setup_eager_loading(Order.objects.all())
     serializer_class = OrderSerializer
+    pagination_class = PageNumberOrKeysetPagination
     search_fields = ("user", "delivery_address")
     filter_backends = (SearchFilter, DjangoFilterBackend, OrderingFilter)
-    filterset_fields = [
-        "user",
-        "delivery_address",
-        "promocode",
-        "created_at",
-    ]
+    filterset_fields = {
+        "user": ["exact"],
+        "delivery_address": ["exact"],
+        "promocode": ["exact"],
+        "created_at": ["exact"],
+        "total": ["exact", "gte", "lte"],
+        "discounted_total": ["exact", "gte", "lte"],
+        "products_count": ["exact", "gte", "lte"],
+    }
     ordering_fields = [
         "user",
         "delivery_address",
         "promocode",
         "created_at",
+        "total",
+        "discounted_total",
+        "products_count",
     ]
 
 
+class JobViewSet(ReadOnlyModelViewSet):
+    """Статус фоновых задач: пользователь видит свои, staff — все."""
+
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+    filterset_fields = ["kind", "status"]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.user.is_staff:
+            return queryset
+        return queryset.filter(created_by=self.request.user)
+
+
 class ShopIndexView(View):
     """Главная страница магазина."""
 
@@ -300,9 +372,46 @@ class ProductDeleteView(DeleteView):
 
 
 class OrdersListView(LoginRequiredMixin, ListView):
-    """Список заказов пользователя."""
+    """
+    Список заказов пользователя.
 
-    queryset = Order.objects.select_related("user").prefetch_related("products")
+    Каждый заказ выводится фрагментом шаблона order-list-item под ключом
+    order.fragment_version. Изменения товаров заказа сдвигают
+    order.updated_at (shopapp.signals). Товары загружаются только для
+    заказов, чьих фрагментов нет в кеше, поэтому на тёплом кеше страница —
+    один запрос заказов и get_many() фрагментов.
+    """
+
+    queryset = Order.objects.select_related("user")
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        language = translation.get_language()
+        fragments = {}
+        for order in context["object_list"]:
+            # всё, что выводит фрагмент заказа, кроме товаров
+            order.fragment_version = ":".join(
+                map(
+                    str,
+                    (
+                        order.pk,
+                        order.updated_at.isoformat(),
+                        order.user.username,
+                        order.user.first_name,
+                        language,
+                    ),
+                )
+            )
+            key = make_template_fragment_key(
+                ORDER_LIST_FRAGMENT, [order.fragment_version]
+            )
+            fragments[key] = order
+        cached = fragment_cache().get_many(fragments)
+        prefetch_related_objects(
+            [order for key, order in fragments.items() if key not in cached],
+            "products",
+        )
+        return context
 
 
 class OrderCreateView(CreateView):
@@ -346,20 +455,24 @@ class OrderDeleteView(DeleteView):
 class ProductsDataExportView(View):
     """Экспорт списка продуктов в формате JSON."""
 
-    def get(self, request: HttpRequest) -> JsonResponse:
-        """Возврат список JSON для всех товаров."""
-        cache_key = f"product_data_cache_key"
-        products_data = cache.get(cache_key)
-        if products_data is None:
-            products = Product.objects.order_by("pk").all()
-            products_data = [
+    async def get(self, request: HttpRequest) -> JsonResponse:
+        """Возврат список JSON для всех товаров (асинхронный ORM и кеш)."""
+
+        async def compute():
+            products = Product.objects.order_by("pk").only(
+                "pk", "name", "price", "archived"
+            )
+            return [
                 {
                     "pk": product.pk,
                     "name": product.name,
                     "price": product.price,
                     "archived": product.archived,
                 }
-                for product in products
+                async for product in products
             ]
-            cache.set(cache_key, products_data, 300)
+
+        products_data = await aget_or_compute(
+            "product_data_cache_key", ["products"], compute
+        )
         return JsonResponse({"products": products_data})